@@ -0,0 +1,179 @@
+"""
+Планировщик запросов к DeepSeek
+Ограничивает число одновременных запросов (AI_MAX_CONCURRENCY), чтобы
+всплеск пользователей в режиме чата не приводил к 429 и таймаутам у всех.
+Ожидающие запросы обслуживаются по классам приоритета (сначала кризисные),
+внутри класса - по кругу между пользователями: активный пользователь с
+несколькими запросами не задерживает остальных больше чем на один запрос.
+Если оценка ожидания больше AI_BUSY_WAIT, запрос сразу отклоняется
+(SchedulerBusy), чтобы пользователь получил ответ "занято", а не тишину.
+Кризисные запросы не отклоняются.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from typing import Deque, Dict, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    AI_MAX_CONCURRENCY = settings.AI_MAX_CONCURRENCY
+    AI_BUSY_WAIT = settings.AI_BUSY_WAIT
+except Exception:
+    AI_MAX_CONCURRENCY = int(os.getenv("AI_MAX_CONCURRENCY", "8"))
+    AI_BUSY_WAIT = float(os.getenv("AI_BUSY_WAIT", "20"))
+
+# Классы приоритета: меньше - раньше
+PRIORITY_CRISIS = 0
+PRIORITY_NORMAL = 1
+PRIORITY_NAMES = {PRIORITY_CRISIS: 'crisis', PRIORITY_NORMAL: 'normal'}
+
+# Начальная оценка длительности запроса (сек) и сглаживание EWMA
+INITIAL_SERVICE_TIME = 5.0
+SERVICE_TIME_ALPHA = 0.2
+
+# Корзины гистограммы ожидания в очереди (секунды)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+
+
+class SchedulerBusy(Exception):
+    """Ожидание в очереди превысило бы AI_BUSY_WAIT"""
+
+    def __init__(self, estimated_wait: float):
+        super().__init__(f"Оценка ожидания {estimated_wait:.1f} с")
+        self.estimated_wait = estimated_wait
+
+
+class FairScheduler:
+    """Ограничитель одновременных запросов с очередями по пользователям"""
+
+    def __init__(self, max_concurrency: int = AI_MAX_CONCURRENCY, busy_wait: float = AI_BUSY_WAIT):
+        self.max_concurrency = max(1, max_concurrency)
+        self.busy_wait = busy_wait
+        self.service_time = INITIAL_SERVICE_TIME
+        self._active = 0
+        self._waiting = 0
+        # приоритет -> пользователь -> ожидающие запросы; порядок пользователей - очередь круга
+        self._queues: Dict[int, "OrderedDict[int, Deque[asyncio.Future]]"] = {
+            priority: OrderedDict() for priority in sorted(PRIORITY_NAMES)
+        }
+        metrics.histogram("ai_scheduler.wait_time", buckets=WAIT_BUCKETS)
+        metrics.gauge("ai_scheduler.active", lambda: self._active)
+        metrics.gauge("ai_scheduler.queue_depth", lambda: self._waiting)
+
+    @property
+    def active(self) -> int:
+        return self._active
+
+    @property
+    def queue_depth(self) -> int:
+        return self._waiting
+
+    def estimated_wait(self, priority: int = PRIORITY_NORMAL) -> float:
+        """Оценка ожидания нового запроса: очередь не ниже его приоритета / пропускная способность"""
+        ahead = sum(
+            len(waiters)
+            for level, users in self._queues.items() if level <= priority
+            for waiters in users.values()
+        )
+        if ahead == 0 and self._active < self.max_concurrency:
+            return 0.0
+        return (ahead + 1) / self.max_concurrency * self.service_time
+
+    @asynccontextmanager
+    async def slot(self, user_id: int, priority: int = PRIORITY_NORMAL):
+        """
+        Занять место для запроса на время блока with.
+        Возвращает время ожидания в очереди; SchedulerBusy - если ждать слишком долго.
+        """
+        waited = await self._acquire(user_id, priority)
+        started = time.perf_counter()
+        try:
+            yield waited
+        finally:
+            elapsed = time.perf_counter() - started
+            self.service_time += SERVICE_TIME_ALPHA * (elapsed - self.service_time)
+            self._release()
+
+    async def _acquire(self, user_id: int, priority: int) -> float:
+        name = PRIORITY_NAMES.get(priority, str(priority))
+        if self._waiting == 0 and self._active < self.max_concurrency:
+            self._active += 1
+            metrics.observe("ai_scheduler.wait_time", 0.0)
+            metrics.inc(f"ai_scheduler.granted.{name}")
+            return 0.0
+
+        estimate = self.estimated_wait(priority)
+        if priority != PRIORITY_CRISIS and estimate > self.busy_wait:
+            metrics.inc("ai_scheduler.rejected_busy")
+            raise SchedulerBusy(estimate)
+
+        started = time.perf_counter()
+        waiter = asyncio.get_running_loop().create_future()
+        self._queues[priority].setdefault(user_id, deque()).append(waiter)
+        self._waiting += 1
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # Место уже передано этому запросу - возвращаем его следующему
+                self._release()
+            else:
+                self._discard(priority, user_id, waiter)
+            raise
+
+        waited = time.perf_counter() - started
+        metrics.observe("ai_scheduler.wait_time", waited)
+        metrics.inc(f"ai_scheduler.granted.{name}")
+        return waited
+
+    def _release(self):
+        self._active -= 1
+        # Место передается следующему ожидающему без промежуточного освобождения
+        while self._active < self.max_concurrency:
+            waiter = self._next_waiter()
+            if waiter is None:
+                return
+            if waiter.done():
+                continue
+            self._active += 1
+            waiter.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        """Первый пользователь старшего непустого класса; затем он уходит в конец круга"""
+        for users in self._queues.values():
+            if not users:
+                continue
+            user_id, waiters = next(iter(users.items()))
+            waiter = waiters.popleft()
+            self._waiting -= 1
+            if waiters:
+                users.move_to_end(user_id)
+            else:
+                del users[user_id]
+            return waiter
+        return None
+
+    def _discard(self, priority: int, user_id: int, waiter: asyncio.Future):
+        """Убрать отмененный запрос из очереди"""
+        users = self._queues[priority]
+        waiters = users.get(user_id)
+        if waiters is None or waiter not in waiters:
+            return
+        waiters.remove(waiter)
+        self._waiting -= 1
+        if not waiters:
+            del users[user_id]
+
+
+# Создаем глобальный экземпляр
+ai_scheduler = FairScheduler()
+
+__all__ = ['FairScheduler', 'SchedulerBusy', 'ai_scheduler', 'PRIORITY_CRISIS', 'PRIORITY_NORMAL']
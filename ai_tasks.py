@@ -0,0 +1,121 @@
+"""
+Фоновые задачи ответов ИИ
+Обработчик обновления только ставит задачу и сразу возвращается, поэтому
+медленный ответ модели не задерживает обработку других сообщений. Пока
+задача выполняется, в чате показывается "печатает...". У пользователя одна
+активная задача; при выходе из режима чата она отменяется.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Dict, Optional
+
+from telegram.constants import ChatAction
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    AI_RESPONSE_BUDGET = settings.AI_RESPONSE_BUDGET
+    AI_TYPING_INTERVAL = settings.AI_TYPING_INTERVAL
+except Exception:
+    AI_RESPONSE_BUDGET = float(os.getenv("AI_RESPONSE_BUDGET", "45"))
+    AI_TYPING_INTERVAL = float(os.getenv("AI_TYPING_INTERVAL", "4"))
+
+# Корзины гистограммы полного времени ответа (секунды)
+RESPONSE_BUCKETS = (0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 45.0, 60.0)
+
+
+class AITaskManager:
+    """Реестр фоновых задач ответов ИИ (по одной на пользователя)"""
+
+    def __init__(self, typing_interval: float = AI_TYPING_INTERVAL):
+        self.typing_interval = typing_interval
+        self._tasks: Dict[int, asyncio.Task] = {}
+        metrics.histogram("ai.response_time", buckets=RESPONSE_BUCKETS)
+        metrics.gauge("ai.tasks_active", lambda: len(self._tasks))
+
+    def is_busy(self, user_id: int) -> bool:
+        """Есть ли у пользователя незавершенный ответ"""
+        task = self._tasks.get(user_id)
+        return task is not None and not task.done()
+
+    def submit(self, user_id: int, job: Awaitable, bot=None, chat_id: Optional[int] = None) -> Optional[asyncio.Task]:
+        """
+        Запустить ответ в фоне. Возвращает задачу или None, если у пользователя
+        уже есть активный ответ (корутина job тогда закрывается без запуска).
+        """
+        if self.is_busy(user_id):
+            if asyncio.iscoroutine(job):
+                job.close()
+            metrics.inc("ai.tasks_rejected")
+            return None
+
+        task = asyncio.get_running_loop().create_task(self._run(job, bot, chat_id))
+        self._tasks[user_id] = task
+        task.add_done_callback(lambda done: self._forget(user_id, done))
+        metrics.inc("ai.tasks_started")
+        return task
+
+    def cancel(self, user_id: int) -> bool:
+        """Отменить ответ пользователя (выход из режима чата)"""
+        task = self._tasks.get(user_id)
+        if task is None or task.done():
+            return False
+        task.cancel()
+        metrics.inc("ai.tasks_cancelled")
+        logger.info(f"⏹ Ответ ИИ отменен: user={user_id}")
+        return True
+
+    async def shutdown(self):
+        """Отменить все задачи и дождаться их завершения (при остановке бота)"""
+        tasks = [task for task in self._tasks.values() if not task.done()]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.info(f"⏹ Отменено ответов ИИ при остановке: {len(tasks)}")
+        self._tasks.clear()
+
+    async def _run(self, job: Awaitable, bot, chat_id: Optional[int]):
+        """Выполнение ответа с индикатором набора текста"""
+        started = time.perf_counter()
+        typing = None
+        if bot is not None and chat_id is not None:
+            typing = asyncio.get_running_loop().create_task(self._keep_typing(bot, chat_id))
+        try:
+            await job
+            metrics.observe("ai.response_time", time.perf_counter() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            metrics.inc("ai.tasks_failed")
+            logger.error(f"❌ Ошибка фонового ответа ИИ: {e}")
+        finally:
+            if typing is not None:
+                typing.cancel()
+
+    async def _keep_typing(self, bot, chat_id: int):
+        """Статус "печатает..." держится ~5 с, поэтому повторяется до конца ответа"""
+        while True:
+            try:
+                await bot.send_chat_action(chat_id=chat_id, action=ChatAction.TYPING)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Не удалось отправить статус набора: {e}")
+            await asyncio.sleep(self.typing_interval)
+
+    def _forget(self, user_id: int, task: asyncio.Task):
+        if self._tasks.get(user_id) is task:
+            del self._tasks[user_id]
+
+
+# Создаем глобальный экземпляр
+ai_tasks = AITaskManager()
+
+__all__ = ['AITaskManager', 'ai_tasks', 'AI_RESPONSE_BUDGET']
@@ -0,0 +1,133 @@
+"""
+Бенчмарк экстренной проверки кризисных сообщений под нагрузкой
+Одновременно обрабатывается поток обычных сообщений (анализ настроения,
+запись в БД) и редкие кризисные сообщения. Все сообщения поступают сразу и
+проходят через PerUserUpdateProcessor, как в боте: время считается от
+получения обновления (включая ожидание в очереди пользователя и лимита) до
+отправки помощи и сравнивается с CRISIS_SLO_SECONDS.
+Отправка в Telegram имитируется задержкой, БД - временный SQLite.
+
+Запуск: python benchmarks/bench_crisis.py [--messages 2000] [--crisis-every 50] [--concurrency 100]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+_db_dir = tempfile.mkdtemp(prefix="bench_crisis_")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(_db_dir, 'bench.db')}")
+
+from telegram.ext import ApplicationHandlerStop  # noqa: E402
+
+from crisis_detector import crisis_detector  # noqa: E402
+from database import db_manager  # noqa: E402
+from message_handlers import handle_crisis_fast_lane, handle_text_message, is_crisis_update  # noqa: E402
+from metrics import metrics  # noqa: E402
+from update_processor import PerUserUpdateProcessor  # noqa: E402
+
+NORMAL_TEXTS = [
+    'сегодня все хорошо, погуляли в парке',
+    'на работе стресс, начальник опять недоволен',
+    'так себе день, ничего особенного',
+    'устал после экзамена, но рад что сдал',
+    'наконец-то выходные, отлично',
+    'грустно и одиноко вечером',
+]
+CRISIS_TEXTS = [
+    'не хочу жить, все бессмысленно',
+    'думаю о самоубийстве',
+    'хочется покончить со всем этим',
+    'устала от жизни',
+]
+
+
+def make_update(user_id, text, send_delay, sent):
+    """Минимальный Update: reply_text фиксирует время отправки"""
+    async def reply_text(*args, **kwargs):
+        sent.append(time.perf_counter())
+        await asyncio.sleep(send_delay)
+
+    message = SimpleNamespace(text=text, reply_text=reply_text)
+    return SimpleNamespace(
+        message=message,
+        effective_message=message,
+        effective_user=SimpleNamespace(id=user_id, username=f"user{user_id}", first_name="Bench")
+    )
+
+
+async def dispatch(update, context):
+    """Порядок как в PTB: группа -1 (экстренная проверка), затем основной обработчик"""
+    try:
+        await handle_crisis_fast_lane(update, context)
+    except ApplicationHandlerStop:
+        return
+    await handle_text_message(update, context)
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+async def run(messages, crisis_every, concurrency, send_delay, seed=42):
+    rng = random.Random(seed)
+    processor = PerUserUpdateProcessor(concurrency, is_urgent=is_crisis_update)
+    context = SimpleNamespace(user_data={}, application=SimpleNamespace(update_processor=processor))
+    crisis_latency, normal_latency = [], []
+
+    async def one(index):
+        is_crisis = index % crisis_every == 0
+        text = rng.choice(CRISIS_TEXTS if is_crisis else NORMAL_TEXTS)
+        sent = []
+        update = make_update(1000 + index % 200, text, send_delay, sent)
+        started = time.perf_counter()
+        await processor.process_update(update, dispatch(update, context))
+        if sent:
+            (crisis_latency if is_crisis else normal_latency).append(sent[0] - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(messages)))
+    return crisis_latency, normal_latency, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Время ответа на кризисные сообщения под нагрузкой")
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--crisis-every", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--send-delay-ms", type=float, default=20.0)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.ERROR)
+
+    if not db_manager.init_db():
+        print("❌ Не удалось инициализировать БД")
+        return 1
+
+    crisis, normal, elapsed = asyncio.run(
+        run(args.messages, args.crisis_every, args.concurrency, args.send_delay_ms / 1000)
+    )
+    slo = crisis_detector.slo_seconds
+    print(f"Сообщений: {args.messages} за {elapsed:.2f} с ({args.messages / elapsed:.0f}/с), "
+          f"параллельно {args.concurrency}")
+    for name, values in (("кризисные", crisis), ("обычные", normal)):
+        if values:
+            print(f"  {name:<10} n={len(values):<5} p50={percentile(values, 0.5) * 1000:7.2f} мс  "
+                  f"p95={percentile(values, 0.95) * 1000:7.2f} мс  p99={percentile(values, 0.99) * 1000:7.2f} мс")
+
+    snapshot = metrics.snapshot()
+    violations = snapshot['counters'].get('crisis.slo_violations', 0)
+    print(f"SLO {slo * 1000:.0f} мс: нарушений {violations} из {len(crisis)}")
+    print(f"crisis.time_to_response: {snapshot['histograms'].get('crisis.time_to_response')}")
+    return 1 if violations or len(crisis) != len(range(0, args.messages, args.crisis_every)) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,123 @@
+"""
+Бенчмарк NLP анализатора
+Сравнивает поиск по индексу основ слов с прежней схемой, где каждое
+слово каждого словаря искалось в тексте отдельной проверкой `in`,
+пакетный analyze_many с построчным analyze_text и работу кэша анализа.
+
+Запуск: python benchmarks/bench_nlp.py [--messages 5000] [--max-words 40] [--repeat 3]
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nlp_analyzer import SimpleNLPAnalyzer  # noqa: E402
+
+FILLER = [
+    'сегодня', 'вчера', 'утром', 'вечером', 'опять', 'снова', 'немного', 'очень',
+    'кажется', 'почему-то', 'вообще', 'просто', 'дома', 'на', 'и', 'но', 'что', 'я'
+]
+
+
+class LegacyNLPAnalyzer(SimpleNLPAnalyzer):
+    """Прежняя схема: отдельный поиск подстроки для каждого слова словарей"""
+
+    def _match_lexicons(self, text):
+        hits = {'positive': [], 'negative': [], 'topic': {}, 'crisis': [], 'emotion': {}}
+        hits['positive'] = [w for w in self.positive_words if w in text]
+        hits['negative'] = [w for w in self.negative_words if w in text]
+        for name, keywords in self.topics.items():
+            found = [w for w in keywords if w in text]
+            if found:
+                hits['topic'][name] = found
+        hits['crisis'] = [w for w in self.crisis_keywords if w in text]
+        # Кризисные слова раньше проверялись дважды (второй раз - в расчете стресса)
+        [w for w in self.crisis_keywords if w in text]
+        for emotion, keywords in self.emotions_map.items():
+            found = [w for w in keywords if w in text]
+            if found:
+                hits['emotion'][emotion] = found
+        return hits
+
+
+def make_corpus(analyzer, count, max_words=40, seed=42):
+    """Синтетические сообщения из слов словарей и нейтральных слов"""
+    rng = random.Random(seed)
+    vocabulary = (
+        analyzer.positive_words + analyzer.negative_words + analyzer.crisis_keywords
+        + [w for words in analyzer.topics.values() for w in words]
+        + [w for words in analyzer.emotions_map.values() for w in words]
+    )
+    corpus = []
+    for _ in range(count):
+        words = [rng.choice(FILLER) for _ in range(rng.randint(5, max_words))]
+        for _ in range(rng.randint(0, 4)):
+            words.insert(rng.randrange(len(words) + 1), rng.choice(vocabulary))
+        text = ' '.join(words)
+        if rng.random() < 0.2:
+            text += '!!!'
+        corpus.append(text.capitalize())
+    return corpus
+
+
+def run(analyzer, corpus, repeat, batch=False):
+    """Лучшее время из нескольких прогонов"""
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        if batch:
+            for _ in analyzer.analyze_many(iter(corpus)):
+                pass
+        else:
+            for text in corpus:
+                analyzer.analyze_text(text)
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--messages', type=int, default=5000)
+    parser.add_argument('--max-words', type=int, default=40)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    # Без кэша, чтобы сравнивать сам анализ
+    current = SimpleNLPAnalyzer(cache_size=0)
+    legacy = LegacyNLPAnalyzer(cache_size=0)
+    cached = SimpleNLPAnalyzer()
+    corpus = make_corpus(current, args.messages, args.max_words)
+
+    # Поиск по границам слов намеренно отличается от поиска подстрок ('рад' в 'радио')
+    differences = sum(
+        current.analyze_text(t) != legacy.analyze_text(t)
+        for t in corpus
+    )
+    mismatches = sum(
+        current.analyze_text(t) != r
+        for t, r in zip(corpus, current.analyze_many(corpus))
+    )
+    print(f"Сообщений: {len(corpus)}, отличий от поиска подстрок: {differences}, "
+          f"расхождений analyze_many с analyze_text: {mismatches}")
+
+    cases = (
+        ('прежняя схема', legacy, False),
+        ('индекс основ', current, False),
+        ('analyze_many', current, True),
+        ('с кэшем', cached, False),
+    )
+    for name, analyzer, batch in cases:
+        elapsed = run(analyzer, corpus, args.repeat, batch)
+        print(f"{name:>15}: {len(corpus) / elapsed:10.0f} сообщ/с  ({elapsed * 1000:.1f} мс)")
+    print(f"Кэш анализа: {cached.get_cache_stats()}")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -8,128 +8,169 @@ import os
 import sys
 import logging
 from datetime import datetime
+from functools import partial
 
 # Добавляем путь для импортов
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
-# НАСТРОЙКА ЛОГГИРОВАНИЯ
-logging.basicConfig(
-    level=logging.INFO,
-    format='[%(asctime)s] [%(levelname)s] %(name)s: %(message)s',
-    datefmt='%Y-%m-%d %H:%M:%S',
-    handlers=[
-        logging.StreamHandler(sys.stdout)
-    ]
-)
 logger = logging.getLogger(__name__)
 
-# ============ ПРОВЕРКА ТОКЕНА ПЕРЕД ИМПОРТАМИ ============
-TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
-if not TOKEN:
-    logger.error("❌ TELEGRAM_BOT_TOKEN не найден!")
-    logger.error("Добавьте TELEGRAM_BOT_TOKEN в Environment Variables на Render")
-    logger.info("Render Dashboard → Ваш сервис → Environment → Add Environment Variable")
-    logger.info("Имя: TELEGRAM_BOT_TOKEN")
-    logger.info("Значение: ваш_токен_от_BotFather")
-    sys.exit(1)
+# Процессы пула NLP запускаются через spawn и импортируют этот файл как
+# __mp_main__: настройка логов, проверка токена и импорт модулей бота
+# выполняются только при запуске скрипта, а не в каждом процессе пула
+if __name__ == "__main__":
+    # НАСТРОЙКА ЛОГГИРОВАНИЯ
+    logging.basicConfig(
+        level=logging.INFO,
+        format='[%(asctime)s] [%(levelname)s] %(name)s: %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S',
+        handlers=[
+            logging.StreamHandler(sys.stdout)
+        ]
+    )
 
-logger.info(f"✅ Токен найден (первые 10 символов): {TOKEN[:10]}...")
+    # ============ ПРОВЕРКА ТОКЕНА ПЕРЕД ИМПОРТАМИ ============
+    TOKEN = os.environ.get('TELEGRAM_BOT_TOKEN')
+    if not TOKEN:
+        logger.error("❌ TELEGRAM_BOT_TOKEN не найден!")
+        logger.error("Добавьте TELEGRAM_BOT_TOKEN в Environment Variables на Render")
+        logger.info("Render Dashboard → Ваш сервис → Environment → Add Environment Variable")
+        logger.info("Имя: TELEGRAM_BOT_TOKEN")
+        logger.info("Значение: ваш_токен_от_BotFather")
+        sys.exit(1)
 
-# ============ ИМПОРТЫ С ЗАЩИТОЙ ОТ ОШИБОК ============
+    logger.info(f"✅ Токен найден (первые 10 символов): {TOKEN[:10]}...")
 
-# 1. Импортируем Telegram
-try:
-    from telegram import Update, ReplyKeyboardMarkup
-    from telegram.ext import (
-        Application, 
-        CommandHandler, 
-        MessageHandler, 
-        filters,
-        ContextTypes
-    )
-    logger.info("✅ Telegram библиотеки импортированы")
-except ImportError as e:
-    logger.error(f"❌ Не удалось импортировать telegram библиотеки: {e}")
-    sys.exit(1)
+    # ============ ИМПОРТЫ С ЗАЩИТОЙ ОТ ОШИБОК ============
 
-# 2. Импортируем наши модули с защитой
-try:
-    # Сначала database - у него теперь есть заглушка
-    from database import db_manager
-    logger.info("✅ Модуль database импортирован")
-except Exception as e:
-    logger.error(f"❌ Критическая ошибка импорта database: {e}")
-    sys.exit(1)
+    # 1. Импортируем Telegram
+    try:
+        from telegram import Update, ReplyKeyboardMarkup
+        from telegram.ext import (
+            Application, 
+            CommandHandler, 
+            MessageHandler, 
+            CallbackQueryHandler,
+            filters,
+            ContextTypes
+        )
+        logger.info("✅ Telegram библиотеки импортированы")
+    except ImportError as e:
+        logger.error(f"❌ Не удалось импортировать telegram библиотеки: {e}")
+        sys.exit(1)
 
-# 3. Импортируем обработчики
-try:
-    from message_handlers import (
-        start,
-        show_help,
-        handle_text_message,
-        handle_mood_button,
-        handle_ai_chat_button,
-        handle_exercises_button,
-        handle_stats_button,
-        handle_settings_button,
-        handle_back_button,
-        log_mood_command,
-        start_chat,
-        show_stats,
-        handle_crisis_situation,
-        handle_unknown
-    )
-    logger.info("✅ Все обработчики импортированы")
-except ImportError as e:
-    logger.error(f"❌ Ошибка импорта обработчиков: {e}")
-    # Создаем простые заглушки
-    async def start(update, context):
-        await update.message.reply_text("✅ MindMate Bot запущен! Используйте /help")
-    async def show_help(update, context):
-        await update.message.reply_text("Помощь: /start, /help, /mood, /stats, /chat, /crisis")
-    async def handle_text_message(update, context):
-        await update.message.reply_text(f"Сообщение получено: {update.message.text[:50]}...")
-    
-    # Заглушки для обработчиков кнопок
-    async def handle_mood_button(update, context):
-        await update.message.reply_text("📊 Нажмите кнопку настроения или напишите цифру от 1 до 10")
-    async def handle_ai_chat_button(update, context):
-        await update.message.reply_text("💬 Напишите ваш вопрос для ИИ")
-    async def handle_exercises_button(update, context):
-        await update.message.reply_text("🧘 Выберите упражнение для релаксации")
-    async def handle_stats_button(update, context):
-        await update.message.reply_text("📈 Статистика будет доступна после нескольких записей")
-    async def handle_settings_button(update, context):
-        await update.message.reply_text("⚙️ Настройки будут доступны в следующих версиях")
-    async def handle_back_button(update, context):
-        await update.message.reply_text("↩️ Возвращаемся в главное меню")
-    async def log_mood_command(update, context):
-        await update.message.reply_text("Напишите цифру от 1 до 10")
-    async def start_chat(update, context):
-        await update.message.reply_text("💬 Напишите ваш вопрос")
-    async def show_stats(update, context):
-        await update.message.reply_text("📊 Статистика")
-    async def handle_crisis_situation(update, context):
-        await update.message.reply_text("🚨 Телефон доверия: 8-800-2000-122")
-    async def handle_unknown(update, context):
-        await update.message.reply_text("Используйте /help для списка команд")
+    # 2. Импортируем наши модули с защитой
+    try:
+        # Сначала database - у него теперь есть заглушка
+        from database import db_manager
+        logger.info("✅ Модуль database импортирован")
+    except Exception as e:
+        logger.error(f"❌ Критическая ошибка импорта database: {e}")
+        sys.exit(1)
+
+    from metrics import metrics
+    from trends import register_drop_hook, clear_drop_hooks
+    from ai_tasks import ai_tasks
+    from update_processor import PerUserUpdateProcessor
+
+    try:
+        from db_executor import async_db
+        logger.info("✅ Асинхронный слой БД импортирован")
+    except Exception as e:
+        async_db = None
+        logger.warning(f"⚠️ Асинхронный слой БД недоступен: {e}")
+
+    # 3. Импортируем обработчики
+    try:
+        from message_handlers import (
+            start,
+            show_help,
+            handle_text_message,
+            handle_mood_button,
+            handle_ai_chat_button,
+            handle_exercises_button,
+            handle_stats_button,
+            handle_stats_period,
+            set_timezone_command,
+            show_history,
+            handle_history_more,
+            handle_settings_button,
+            handle_back_button,
+            log_mood_command,
+            start_chat,
+            show_stats,
+            handle_crisis_situation,
+            handle_crisis_fast_lane,
+            is_crisis_update,
+            handle_mood_drop,
+            handle_unknown
+        )
+        logger.info("✅ Все обработчики импортированы")
+    except ImportError as e:
+        logger.error(f"❌ Ошибка импорта обработчиков: {e}")
+        # Создаем простые заглушки
+        async def start(update, context):
+            await update.message.reply_text("✅ MindMate Bot запущен! Используйте /help")
+        async def show_help(update, context):
+            await update.message.reply_text("Помощь: /start, /help, /mood, /stats, /chat, /crisis")
+        async def handle_text_message(update, context):
+            await update.message.reply_text(f"Сообщение получено: {update.message.text[:50]}...")
+        
+        # Заглушки для обработчиков кнопок
+        async def handle_mood_button(update, context):
+            await update.message.reply_text("📊 Нажмите кнопку настроения или напишите цифру от 1 до 10")
+        async def handle_ai_chat_button(update, context):
+            await update.message.reply_text("💬 Напишите ваш вопрос для ИИ")
+        async def handle_exercises_button(update, context):
+            await update.message.reply_text("🧘 Выберите упражнение для релаксации")
+        async def handle_stats_button(update, context):
+            await update.message.reply_text("📈 Статистика будет доступна после нескольких записей")
+        async def handle_stats_period(update, context):
+            await update.message.reply_text("📈 Статистика будет доступна после нескольких записей")
+        async def set_timezone_command(update, context):
+            await update.message.reply_text("🕒 Настройка часового пояса временно недоступна")
+        async def show_history(update, context):
+            await update.message.reply_text("📜 История временно недоступна")
+        async def handle_history_more(update, context):
+            await update.callback_query.answer()
+        async def handle_settings_button(update, context):
+            await update.message.reply_text("⚙️ Настройки будут доступны в следующих версиях")
+        async def handle_back_button(update, context):
+            await update.message.reply_text("↩️ Возвращаемся в главное меню")
+        async def log_mood_command(update, context):
+            await update.message.reply_text("Напишите цифру от 1 до 10")
+        async def start_chat(update, context):
+            await update.message.reply_text("💬 Напишите ваш вопрос")
+        async def show_stats(update, context):
+            await update.message.reply_text("📊 Статистика")
+        async def handle_crisis_situation(update, context):
+            await update.message.reply_text("🚨 Телефон доверия: 8-800-2000-122")
+        async def handle_crisis_fast_lane(update, context):
+            return
+        def is_crisis_update(update):
+            return False
+        async def handle_mood_drop(bot, event):
+            return
+        async def handle_unknown(update, context):
+            await update.message.reply_text("Используйте /help для списка команд")
 
-# 4. Опциональные модули
-try:
-    from nlp_analyzer import nlp_analyzer
-    NLP_AVAILABLE = True
-    logger.info("✅ NLP анализатор импортирован")
-except ImportError:
-    NLP_AVAILABLE = False
-    logger.warning("⚠️ NLP анализатор недоступен")
+    # 4. Опциональные модули
+    try:
+        from nlp_analyzer import nlp_analyzer
+        from nlp_pool import get_pool, shutdown_pools
+        NLP_AVAILABLE = True
+        logger.info("✅ NLP анализатор импортирован")
+    except ImportError:
+        NLP_AVAILABLE = False
+        logger.warning("⚠️ NLP анализатор недоступен")
 
-try:
-    from deepseek_chat import deepseek_chat
-    DEEPSEEK_AVAILABLE = True
-    logger.info("✅ DeepSeek импортирован")
-except ImportError:
-    DEEPSEEK_AVAILABLE = False
-    logger.warning("⚠️ DeepSeek недоступен")
+    try:
+        from deepseek_chat import deepseek_chat
+        DEEPSEEK_AVAILABLE = True
+        logger.info("✅ DeepSeek импортирован")
+    except ImportError:
+        DEEPSEEK_AVAILABLE = False
+        logger.warning("⚠️ DeepSeek недоступен")
 
 
 # ============ КЛАСС БОТА ============
@@ -144,7 +185,10 @@ class MindMateBot:
     async def init_database(self):
         """Инициализация базы данных (не ломает бота при ошибке)"""
         try:
-            success = db_manager.init_db()
+            if async_db is not None:
+                success = await async_db.init_db()
+            else:
+                success = db_manager.init_db()
             if success:
                 logger.info("✅ База данных инициализирована")
             else:
@@ -159,6 +203,14 @@ class MindMateBot:
         """Настройка ВСЕХ обработчиков - КОМАНДЫ И КНОПКИ"""
         logger.info("🔄 Настройка обработчиков...")
         
+        # ===== ЭКСТРЕННАЯ ПРОВЕРКА (раньше всех остальных групп) =====
+        
+        self.application.add_handler(MessageHandler(
+            filters.TEXT & ~filters.COMMAND,
+            handle_crisis_fast_lane
+        ), group=-1)
+        logger.info("  ✅ Экстренная проверка кризисных сообщений добавлена")
+        
         # ===== КОМАНДЫ =====
         
         # /start - главная команда
@@ -177,6 +229,14 @@ class MindMateBot:
         self.application.add_handler(CommandHandler("stats", show_stats))
         logger.info("  ✅ Команда /stats добавлена")
         
+        # /timezone - часовой пояс для дневной статистики
+        self.application.add_handler(CommandHandler("timezone", set_timezone_command))
+        logger.info("  ✅ Команда /timezone добавлена")
+        
+        # /history - история записей настроения
+        self.application.add_handler(CommandHandler("history", show_history))
+        logger.info("  ✅ Команда /history добавлена")
+        
         # /mood - запись настроения
         self.application.add_handler(CommandHandler("mood", log_mood_command))
         logger.info("  ✅ Команда /mood добавлена")
@@ -216,6 +276,21 @@ class MindMateBot:
         ))
         logger.info("  ✅ Обработчик кнопки 'Статистика' добавлен")
         
+        # 📅 Периоды статистики
+        self.application.add_handler(MessageHandler(
+            filters.Regex("^(📅 Сегодня|📆 Неделя|🗓️ Месяц|📊 Все время)$"),
+            handle_stats_period
+        ))
+        logger.info("  ✅ Обработчик периодов статистики добавлен")
+        
+        # 📜 История записей и кнопка «Показать еще»
+        self.application.add_handler(MessageHandler(
+            filters.Regex("^(📜 История записей|История записей)$"),
+            show_history
+        ))
+        self.application.add_handler(CallbackQueryHandler(handle_history_more, pattern="^history_more:"))
+        logger.info("  ✅ Обработчики истории записей добавлены")
+        
         # ⚙️ Настройки
         self.application.add_handler(MessageHandler(
             filters.Regex("^(⚙️ Настройки|Настройки|Настройки бота)$"),
@@ -314,6 +389,17 @@ class MindMateBot:
         # Инициализация БД
         await self.init_database()
         
+        # Спад настроения (EWMA в агрегатах) - бережное сообщение пользователю
+        register_drop_hook(partial(handle_mood_drop, application.bot))
+        
+        # Прогрев процессов анализа текста
+        if NLP_AVAILABLE:
+            await get_pool(nlp_analyzer).start()
+        
+        # Общая сессия DeepSeek: соединения переиспользуются между ответами
+        if DEEPSEEK_AVAILABLE:
+            await deepseek_chat.start()
+        
         logger.info("✅ Бот готов к приему сообщений")
         logger.info("=" * 60)
     
@@ -322,13 +408,61 @@ class MindMateBot:
         logger.info("=" * 60)
         logger.info("🛑 MindMate Bot останавливается...")
         logger.info("=" * 60)
+        
+        # Сначала отменяем незавершенные ответы ИИ: они еще пишут в БД и
+        # используют сессию DeepSeek, которые закрываются ниже
+        try:
+            await ai_tasks.shutdown()
+        except Exception as e:
+            logger.error(f"❌ Ошибка отмены ответов ИИ: {e}")
+        
+        # Дописываем очередь записей настроения и останавливаем БД.
+        # Каждый шаг выполняется даже при ошибке предыдущего
+        if async_db is not None:
+            try:
+                written = await async_db.flush()
+                logger.info(f"💾 Записи настроения сохранены перед остановкой: {written}")
+            except Exception as e:
+                logger.error(f"❌ Ошибка сброса очереди записей: {e}")
+            try:
+                await async_db.close()
+            except Exception as e:
+                logger.error(f"❌ Ошибка закрытия БД: {e}")
+        try:
+            clear_drop_hooks()
+        except Exception as e:
+            logger.error(f"❌ Ошибка снятия обработчиков спада настроения: {e}")
+        
+        if NLP_AVAILABLE:
+            try:
+                shutdown_pools()
+            except Exception as e:
+                logger.error(f"❌ Ошибка остановки пулов NLP: {e}")
+        
+        if DEEPSEEK_AVAILABLE:
+            try:
+                await deepseek_chat.close()
+            except Exception as e:
+                logger.error(f"❌ Ошибка закрытия сессии DeepSeek: {e}")
+        
+        try:
+            metrics.log_summary()
+        except Exception as e:
+            logger.error(f"❌ Ошибка вывода метрик: {e}")
     
     def run(self):
         """Запуск бота"""
         try:
             # Создаем приложение
             logger.info("🛠️ Создание Application...")
-            self.application = Application.builder().token(TOKEN).build()
+            # Пользователи обрабатываются параллельно, сообщения одного - по порядку;
+            # кризисные сообщения не ждут ни очереди пользователя, ни лимита
+            self.application = (
+                Application.builder()
+                .token(TOKEN)
+                .concurrent_updates(PerUserUpdateProcessor(is_urgent=is_crisis_update))
+                .build()
+            )
             
             # Настраиваем обработчики
             self.setup_handlers()
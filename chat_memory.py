@@ -0,0 +1,204 @@
+"""
+Память диалога с ИИ
+У каждого пользователя - кольцевой буфер последних реплик (хранятся в
+chat_history). Перед запросом буфер обрезается по оценке числа токенов, а
+вытесненные реплики сворачиваются в короткое резюме: из каждой остается
+главное предложение вопроса и начало ответа. Резюме тоже ограничено по
+токенам (старые пункты отбрасываются), поэтому размер запроса - а с ним
+задержка и стоимость - не растет с длиной разговора.
+"""
+
+import os
+import re
+import logging
+from collections import deque
+from typing import Dict, List, NamedTuple
+
+from metrics import metrics
+from tokenizer import stem_tokens
+from utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    CHAT_MEMORY_TURNS = settings.CHAT_MEMORY_TURNS
+    CHAT_CONTEXT_TOKENS = settings.CHAT_CONTEXT_TOKENS
+    CHAT_SUMMARY_TOKENS = settings.CHAT_SUMMARY_TOKENS
+    CHAT_MEMORY_USERS = settings.CHAT_MEMORY_USERS
+except Exception:
+    CHAT_MEMORY_TURNS = int(os.getenv("CHAT_MEMORY_TURNS", "20"))
+    CHAT_CONTEXT_TOKENS = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))
+    CHAT_SUMMARY_TOKENS = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))
+    CHAT_MEMORY_USERS = int(os.getenv("CHAT_MEMORY_USERS", "2000"))
+
+try:
+    from db_executor import async_db
+except ImportError:
+    async_db = None
+
+# Оценка токенов без токенизатора модели: кириллица ~3 символа на токен,
+# плюс служебные токены роли на каждое сообщение
+CHARS_PER_TOKEN = 3
+MESSAGE_OVERHEAD = 4
+
+# Длина пункта резюме (символы): вопрос пользователя и начало ответа
+SUMMARY_QUESTION_CHARS = 160
+SUMMARY_ANSWER_CHARS = 100
+
+SUMMARY_PREFIX = "Краткое содержание предыдущего разговора с пользователем:\n"
+
+SENTENCE_RE = re.compile(r"(?<=[.!?…])\s+|\n+")
+
+# Корзины гистограммы размера контекста (токены)
+CONTEXT_BUCKETS = (100, 250, 500, 750, 1000, 1500, 2000, 3000)
+
+
+def estimate_tokens(text: str) -> int:
+    """Приблизительное число токенов сообщения"""
+    return len(text) // CHARS_PER_TOKEN + MESSAGE_OVERHEAD
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 1].rstrip() + "…"
+
+
+def key_sentence(text: str) -> str:
+    """Самое содержательное предложение: больше всего разных основ значимых слов"""
+    sentences = [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+    if not sentences:
+        return ""
+    return max(sentences, key=lambda s: len({w for w in stem_tokens(s) if len(w) >= 4}))
+
+
+def first_sentence(text: str) -> str:
+    sentences = [s.strip() for s in SENTENCE_RE.split(text) if s.strip()]
+    return sentences[0] if sentences else ""
+
+
+class Turn(NamedTuple):
+    """Реплика: вопрос, ответ и оценка токенов обоих сообщений"""
+    user_message: str
+    ai_response: str
+    tokens: int
+
+
+def make_turn(user_message: str, ai_response: str) -> Turn:
+    return Turn(user_message, ai_response, estimate_tokens(user_message) + estimate_tokens(ai_response))
+
+
+class Conversation:
+    """Буфер последних реплик и резюме более ранних"""
+
+    __slots__ = ('turns', 'points', 'summary', 'summary_tokens')
+
+    def __init__(self, max_turns: int = CHAT_MEMORY_TURNS):
+        self.turns = deque(maxlen=max_turns)
+        self.points = deque()
+        self.summary = ""  # кэш текста резюме, пересобирается при изменении пунктов
+        self.summary_tokens = 0
+
+    def append(self, turn: Turn):
+        """Добавить реплику; вытесненная из буфера уходит в резюме"""
+        if len(self.turns) == self.turns.maxlen:
+            self.fold(self.turns.popleft())
+        self.turns.append(turn)
+
+    def fold(self, turn: Turn):
+        """Свернуть реплику в пункт резюме"""
+        point = f"— {_clip(key_sentence(turn.user_message), SUMMARY_QUESTION_CHARS)}"
+        answer = _clip(first_sentence(turn.ai_response), SUMMARY_ANSWER_CHARS)
+        if answer:
+            point += f" → {answer}"
+        self.points.append(point)
+        # Резюме скользящее: при превышении лимита отбрасываются самые старые пункты
+        while len(self.points) > 1 and self._points_tokens() > CHAT_SUMMARY_TOKENS:
+            self.points.popleft()
+        self.summary = SUMMARY_PREFIX + "\n".join(self.points)
+        self.summary_tokens = estimate_tokens(self.summary)
+        metrics.inc("chat_memory.turns_folded")
+
+    def trim(self, budget: int):
+        """Оставить в буфере только последние реплики, укладывающиеся в budget токенов"""
+        used = 0
+        keep = 0
+        for turn in reversed(self.turns):
+            if used + turn.tokens > budget:
+                break
+            used += turn.tokens
+            keep += 1
+        while len(self.turns) > keep:
+            self.fold(self.turns.popleft())
+
+    def messages(self) -> List[Dict[str, str]]:
+        """Контекст для запроса: резюме и последние реплики"""
+        messages = []
+        if self.summary:
+            messages.append({"role": "system", "content": self.summary})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn.user_message})
+            messages.append({"role": "assistant", "content": turn.ai_response})
+        return messages
+
+    def _points_tokens(self) -> int:
+        return estimate_tokens(SUMMARY_PREFIX + "\n".join(self.points))
+
+
+class ChatMemory:
+    """Память диалогов: горячие разговоры в памяти, реплики сохраняются в БД"""
+
+    def __init__(self, store=None, max_users: int = CHAT_MEMORY_USERS,
+                 max_turns: int = CHAT_MEMORY_TURNS, context_tokens: int = CHAT_CONTEXT_TOKENS):
+        self.store = store
+        self.max_turns = max_turns
+        self.context_tokens = context_tokens
+        self._conversations = LRUCache(maxsize=max_users)
+        metrics.histogram("chat_memory.context_tokens", buckets=CONTEXT_BUCKETS)
+        metrics.gauge("chat_memory.users", lambda: len(self._conversations))
+        metrics.gauge("chat_memory.hit_rate", lambda: self._conversations.get_stats()['hit_rate'])
+
+    async def context(self, user_id: int) -> List[Dict[str, str]]:
+        """История для запроса к модели в пределах бюджета токенов"""
+        conversation = await self._get(user_id)
+        # Резюме ограничено отдельно, остаток бюджета - последним репликам
+        conversation.trim(max(0, self.context_tokens - CHAT_SUMMARY_TOKENS))
+        messages = conversation.messages()
+        metrics.observe("chat_memory.context_tokens",
+                        conversation.summary_tokens + sum(t.tokens for t in conversation.turns))
+        return messages
+
+    async def add_turn(self, user_id: int, user_message: str, ai_response: str):
+        """Запомнить реплику и сохранить ее в chat_history"""
+        conversation = await self._get(user_id)
+        conversation.append(make_turn(user_message, ai_response))
+        if self.store is not None:
+            await self.store.add_chat_turn(user_id, user_message, ai_response)
+
+    def forget(self, user_id: int):
+        """Убрать разговор из памяти (в БД история остается)"""
+        self._conversations.pop(user_id)
+
+    async def _get(self, user_id: int) -> Conversation:
+        conversation = self._conversations.get(user_id)
+        if conversation is not None:
+            return conversation
+
+        conversation = Conversation(self.max_turns)
+        if self.store is not None:
+            # Вдвое больше буфера: более ранние реплики сразу попадают в резюме
+            try:
+                rows = await self.store.get_chat_history(user_id, limit=self.max_turns * 2)
+            except Exception as e:
+                logger.error(f"❌ Ошибка загрузки истории чата: {e}")
+                rows = []
+            for row in rows:
+                conversation.append(make_turn(row["user_message"], row["ai_response"]))
+        self._conversations.set(user_id, conversation)
+        return conversation
+
+
+# Создаем глобальный экземпляр
+chat_memory = ChatMemory(store=async_db)
+
+__all__ = ['ChatMemory', 'Conversation', 'chat_memory', 'estimate_tokens']
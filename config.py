@@ -7,13 +7,48 @@ class Settings(BaseSettings):
     
     # Telegram Bot
     TELEGRAM_BOT_TOKEN: str = os.getenv("TELEGRAM_BOT_TOKEN", "")
+    UPDATE_CONCURRENCY: int = int(os.getenv("UPDATE_CONCURRENCY", "64"))  # Обновлений в обработке одновременно (одного пользователя - по очереди)
     
     # DeepSeek API
     DEEPSEEK_API_KEY: Optional[str] = os.getenv("DEEPSEEK_API_KEY", "")
     DEEPSEEK_API_URL: str = "https://api.deepseek.com/v1/chat/completions"
+    DEEPSEEK_TIMEOUT: float = float(os.getenv("DEEPSEEK_TIMEOUT", "30"))  # Таймаут запроса, сек
+    DEEPSEEK_POOL_LIMIT: int = int(os.getenv("DEEPSEEK_POOL_LIMIT", "20"))  # Макс. одновременных соединений
+    DEEPSEEK_KEEPALIVE: float = float(os.getenv("DEEPSEEK_KEEPALIVE", "60"))  # Сколько держать простаивающее соединение, сек
+    DEEPSEEK_DNS_TTL: int = int(os.getenv("DEEPSEEK_DNS_TTL", "300"))  # Кэш DNS, сек
+    STREAM_EDIT_INTERVAL: float = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))  # Мин. пауза между правками потокового ответа, сек
+    STREAM_FIRST_CHARS: int = int(os.getenv("STREAM_FIRST_CHARS", "20"))  # Символов до отправки первого сообщения
+    AI_RESPONSE_BUDGET: float = float(os.getenv("AI_RESPONSE_BUDGET", "45"))  # Макс. время ответа ИИ, сек
+    AI_TYPING_INTERVAL: float = float(os.getenv("AI_TYPING_INTERVAL", "4"))  # Повтор статуса "печатает...", сек
+    CHAT_MEMORY_TURNS: int = int(os.getenv("CHAT_MEMORY_TURNS", "20"))  # Реплик в буфере пользователя
+    CHAT_CONTEXT_TOKENS: int = int(os.getenv("CHAT_CONTEXT_TOKENS", "1500"))  # Бюджет истории в запросе (оценка токенов)
+    CHAT_SUMMARY_TOKENS: int = int(os.getenv("CHAT_SUMMARY_TOKENS", "300"))  # Из них на резюме ранних реплик
+    CHAT_MEMORY_USERS: int = int(os.getenv("CHAT_MEMORY_USERS", "2000"))  # Разговоров в памяти
+    AI_MAX_CONCURRENCY: int = int(os.getenv("AI_MAX_CONCURRENCY", "8"))  # Одновременных запросов к DeepSeek
+    AI_BUSY_WAIT: float = float(os.getenv("AI_BUSY_WAIT", "20"))  # Ожидание в очереди, после которого ответ "занято", сек
+    AI_CRISIS_PRIORITY_WINDOW: float = float(os.getenv("AI_CRISIS_PRIORITY_WINDOW", "3600"))  # Сколько после кризисного сообщения ответы ИИ идут вне очереди, сек
     
     # Database
-    DATABASE_URL: str = os.getenv("DATABASE_URL", "sqlite:///mindmate.db")
+    DATABASE_URL: str = os.getenv("DATABASE_URL", "")  # Пусто - встроенная SQLite (SQLITE_PATH)
+    DB_EXECUTOR_WORKERS: int = int(os.getenv("DB_EXECUTOR_WORKERS", "4"))  # Потоки для запросов к БД
+    DB_CALL_TIMEOUT: float = float(os.getenv("DB_CALL_TIMEOUT", "10"))  # Таймаут одного запроса, сек
+    DB_ENGINE_MODE: str = os.getenv("DB_ENGINE_MODE", "sync")  # "sync" или "async"
+    DB_ASYNC_POOL_SIZE: int = int(os.getenv("DB_ASYNC_POOL_SIZE", "20"))  # Соединений асинхронного движка
+    DB_ASYNC_MAX_OVERFLOW: int = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "80"))  # Сверх пула при пиках
+    KNOWN_USERS_CACHE_SIZE: int = int(os.getenv("KNOWN_USERS_CACHE_SIZE", "10000"))
+    USER_TOUCH_INTERVAL: float = float(os.getenv("USER_TOUCH_INTERVAL", "300"))  # Как часто обновлять last_active, сек
+    MOOD_WRITE_BEHIND: bool = os.getenv("MOOD_WRITE_BEHIND", "true").lower() == "true"
+    MOOD_BATCH_SIZE: int = int(os.getenv("MOOD_BATCH_SIZE", "100"))  # Записей в одной пачке
+    MOOD_FLUSH_INTERVAL: float = float(os.getenv("MOOD_FLUSH_INTERVAL", "1.0"))  # Макс. задержка записи, сек
+    MOOD_QUEUE_MAX: int = int(os.getenv("MOOD_QUEUE_MAX", "10000"))
+    AGG_RECENT_SIZE: int = int(os.getenv("AGG_RECENT_SIZE", "5"))  # Последних записей в агрегатах
+    DEFAULT_TIMEZONE: str = os.getenv("DEFAULT_TIMEZONE", "Europe/Moscow")  # Для дневной статистики
+    STATS_CACHE_SIZE: int = int(os.getenv("STATS_CACHE_SIZE", "5000"))
+    STATS_CACHE_TTL: float = float(os.getenv("STATS_CACHE_TTL", "300"))  # Время жизни статистики в кэше, сек
+    SQLITE_PATH: str = os.getenv("SQLITE_PATH", "mindmate.db")  # Встроенная БД, если DATABASE_URL пуст
+    SQLITE_MMAP_SIZE: int = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+    SQLITE_CACHE_KB: int = int(os.getenv("SQLITE_CACHE_KB", "65536"))  # Кэш страниц на соединение, КБ
+    SQLITE_STATEMENT_CACHE: int = int(os.getenv("SQLITE_STATEMENT_CACHE", "256"))  # Подготовленных выражений на соединение
     
     # App Settings
     APP_NAME: str = "MindMate Bot"
@@ -21,7 +56,23 @@ class Settings(BaseSettings):
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     
     # NLP Settings
-    NLP_MODEL: str = "simple"  # Используем простую NLP модель для Render
+    NLP_MODEL: str = os.getenv("NLP_MODEL", "simple")  # "simple" или "hashed_linear" (см. nlp_backends)
+    NLP_WEIGHTS_PATH: str = os.getenv("NLP_WEIGHTS_PATH", "")  # Веса hashed_linear (memmap); пусто - nlp_weights.npy рядом с nlp_hashed.py
+    NLP_HASH_DIM: int = int(os.getenv("NLP_HASH_DIM", str(2 ** 18)))  # Размер пространства хэшей n-грамм
+    NLP_POOL_WORKERS: int = int(os.getenv("NLP_POOL_WORKERS", "2"))  # Процессы для анализа текста, 0 = в основном процессе
+    NLP_BATCH_WINDOW_MS: float = float(os.getenv("NLP_BATCH_WINDOW_MS", "5"))  # Окно сбора пачки запросов, мс
+    NLP_BATCH_MAX: int = int(os.getenv("NLP_BATCH_MAX", "64"))  # Макс. текстов в одной пачке
+    NLP_POOL_MAX_INFLIGHT: int = int(os.getenv("NLP_POOL_MAX_INFLIGHT", "0"))  # Пачек в работе, 0 = 2 x процессы
+    NLP_CACHE_SIZE: int = int(os.getenv("NLP_CACHE_SIZE", "10000"))  # Результатов анализа в кэше, 0 = выключен
+    CRISIS_SLO_SECONDS: float = float(os.getenv("CRISIS_SLO_SECONDS", "0.5"))  # Цель по времени ответа на кризисное сообщение
+    
+    # Mood Trends (EWMA, см. trends.py)
+    MOOD_EWMA_ALPHA: float = float(os.getenv("MOOD_EWMA_ALPHA", "0.3"))  # Вес новой записи в текущем среднем
+    MOOD_BASELINE_ALPHA: float = float(os.getenv("MOOD_BASELINE_ALPHA", "0.05"))  # Вес в медленной базовой линии
+    MOOD_DROP_Z: float = float(os.getenv("MOOD_DROP_Z", "2.0"))  # Резкий спад: отклонений ниже среднего
+    MOOD_DROP_DELTA: float = float(os.getenv("MOOD_DROP_DELTA", "1.5"))  # Устойчивый спад: баллов ниже базовой линии
+    MOOD_DROP_MIN_SAMPLES: int = int(os.getenv("MOOD_DROP_MIN_SAMPLES", "5"))  # Оценок до начала проверки спада
+    MOOD_DROP_NOTIFY_INTERVAL: float = float(os.getenv("MOOD_DROP_NOTIFY_INTERVAL", "21600"))  # Не чаще раза в N секунд
     
     # Security
     ALLOWED_USERS: list = []  # Пустой список = разрешены все
@@ -0,0 +1,76 @@
+"""
+Быстрое обнаружение кризисных сообщений
+Детектор компилируется один раз при импорте и проверяет каждый входящий текст
+до любой другой обработки за один проход по тексту: корни ищутся как подстроки
+(ловят 'суицидальные'), фразы - по основам слов ('покончу' для 'покончить').
+"""
+
+import os
+import logging
+from typing import List
+
+from metrics import metrics
+from text_matcher import LexiconMatcher, StemIndex
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    CRISIS_SLO_SECONDS = settings.CRISIS_SLO_SECONDS
+except Exception:
+    CRISIS_SLO_SECONDS = float(os.getenv("CRISIS_SLO_SECONDS", "0.5"))
+
+# Кризисные слова (триггеры)
+CRISIS_KEYWORDS = (
+    'суицид', 'самоубийство', 'покончить', 'свести счеты', 'не хочу жить',
+    'все бессмысленно', 'конец', 'надоело жить', 'устал от жизни'
+)
+
+# Корни, которые ищутся как подстроки: для них полнота важнее точности
+CRISIS_ROOTS = ('суицид', 'самоубий')
+
+# Слишком частые слова не включают экстренный режим сами по себе
+# ('наконец', 'конец рабочего дня'), их по-прежнему учитывает NLP анализ
+FAST_LANE_EXCLUDED = frozenset({'конец'})
+
+# Корзины гистограммы времени ответа на кризисное сообщение (секунды)
+CRISIS_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+
+class CrisisDetector:
+    """Предкомпилированный детектор кризисных слов"""
+
+    def __init__(self, keywords=CRISIS_KEYWORDS, slo_seconds: float = CRISIS_SLO_SECONDS):
+        self.keywords = tuple(keywords)
+        self.slo_seconds = slo_seconds
+        self._matcher = LexiconMatcher(
+            (root, word) for word in self.keywords for root in CRISIS_ROOTS if root in word
+        ).compile()
+        self._stem_index = StemIndex(
+            (word, word) for word in self.keywords if word not in FAST_LANE_EXCLUDED
+        ).compile()
+        metrics.histogram("crisis.time_to_response", buckets=CRISIS_LATENCY_BUCKETS)
+
+    def detect(self, text: str) -> List[str]:
+        """Найденные кризисные слова в порядке словаря (пустой список - кризиса нет)"""
+        if not text:
+            return []
+        lowered = text.lower()
+        found = set(self._matcher.match(lowered))
+        found.update(self._stem_index.match(lowered))
+        return [word for word in self.keywords if word in found]
+
+    def record_response(self, seconds: float):
+        """Учесть время от получения сообщения до отправки помощи"""
+        metrics.observe("crisis.time_to_response", seconds)
+        metrics.inc("crisis.responses")
+        if seconds > self.slo_seconds:
+            metrics.inc("crisis.slo_violations")
+            logger.warning(f"⏱️ Ответ на кризисное сообщение: {seconds * 1000:.0f} мс "
+                           f"(SLO {self.slo_seconds * 1000:.0f} мс)")
+
+
+# Создаем глобальный экземпляр
+crisis_detector = CrisisDetector()
+
+__all__ = ['CrisisDetector', 'crisis_detector', 'CRISIS_KEYWORDS']
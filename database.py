@@ -1,97 +1,318 @@
 """
 Файл для работы с базой данных
-Безопасная версия для Render - не ломает бот при отсутствии DATABASE_URL
+Безопасная версия для Render - не ломает бот при отсутствии DATABASE_URL:
+без него используется встроенная SQLite (WAL), заглушка - только если
+SQLAlchemy недоступна
 """
 
 import os
+import time
+import asyncio
 import logging
-from contextlib import contextmanager
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager, asynccontextmanager
+
+from metrics import metrics
+from utils import LRUCache
 
 logger = logging.getLogger(__name__)
 
 # ============ ПРОВЕРКА DATABASE_URL С ЗАЩИТОЙ ============
-DATABASE_URL = os.environ.get('DATABASE_URL')
+# Настройки берутся из config.settings (переменные окружения и .env);
+# без config - напрямую из окружения
+try:
+    from config import settings
+    DATABASE_URL = settings.DATABASE_URL
+    DB_ENGINE_MODE = settings.DB_ENGINE_MODE.lower()
+    DB_ASYNC_POOL_SIZE = settings.DB_ASYNC_POOL_SIZE
+    DB_ASYNC_MAX_OVERFLOW = settings.DB_ASYNC_MAX_OVERFLOW
+    DB_CALL_TIMEOUT = settings.DB_CALL_TIMEOUT
+    DB_EXECUTOR_WORKERS = settings.DB_EXECUTOR_WORKERS
+    KNOWN_USERS_CACHE_SIZE = settings.KNOWN_USERS_CACHE_SIZE
+    USER_TOUCH_INTERVAL = settings.USER_TOUCH_INTERVAL
+    MOOD_WRITE_BEHIND = settings.MOOD_WRITE_BEHIND
+    MOOD_BATCH_SIZE = settings.MOOD_BATCH_SIZE
+    MOOD_FLUSH_INTERVAL = settings.MOOD_FLUSH_INTERVAL
+    MOOD_QUEUE_MAX = settings.MOOD_QUEUE_MAX
+    AGG_RECENT_SIZE = settings.AGG_RECENT_SIZE
+    DEFAULT_TIMEZONE = settings.DEFAULT_TIMEZONE
+    STATS_CACHE_SIZE = settings.STATS_CACHE_SIZE
+    STATS_CACHE_TTL = settings.STATS_CACHE_TTL
+    SQLITE_PATH = settings.SQLITE_PATH
+    SQLITE_MMAP_SIZE = settings.SQLITE_MMAP_SIZE
+    SQLITE_CACHE_KB = settings.SQLITE_CACHE_KB
+    SQLITE_STATEMENT_CACHE = settings.SQLITE_STATEMENT_CACHE
+except Exception:
+    DATABASE_URL = os.environ.get('DATABASE_URL')
+    
+    # Режим движка: "sync" (пул потоков) или "async" (asyncpg/aiosqlite)
+    DB_ENGINE_MODE = os.environ.get('DB_ENGINE_MODE', 'sync').lower()
+    DB_ASYNC_POOL_SIZE = int(os.environ.get('DB_ASYNC_POOL_SIZE', '20'))
+    DB_ASYNC_MAX_OVERFLOW = int(os.environ.get('DB_ASYNC_MAX_OVERFLOW', '80'))
+    DB_CALL_TIMEOUT = float(os.environ.get('DB_CALL_TIMEOUT', '10'))
+    DB_EXECUTOR_WORKERS = int(os.environ.get('DB_EXECUTOR_WORKERS', '4'))
+    
+    # Кэш известных пользователей и интервал записи last_active (сек)
+    KNOWN_USERS_CACHE_SIZE = int(os.environ.get('KNOWN_USERS_CACHE_SIZE', '10000'))
+    USER_TOUCH_INTERVAL = float(os.environ.get('USER_TOUCH_INTERVAL', '300'))
+    
+    # Отложенная пакетная запись mood_logs: размер пачки, интервал (сек), предел очереди
+    MOOD_WRITE_BEHIND = os.environ.get('MOOD_WRITE_BEHIND', 'true').lower() == 'true'
+    MOOD_BATCH_SIZE = int(os.environ.get('MOOD_BATCH_SIZE', '100'))
+    MOOD_FLUSH_INTERVAL = float(os.environ.get('MOOD_FLUSH_INTERVAL', '1.0'))
+    MOOD_QUEUE_MAX = int(os.environ.get('MOOD_QUEUE_MAX', '10000'))
+    
+    # Сколько последних записей хранить в агрегатах пользователя
+    AGG_RECENT_SIZE = int(os.environ.get('AGG_RECENT_SIZE', '5'))
+    
+    # Часовой пояс по умолчанию для дневной статистики
+    DEFAULT_TIMEZONE = os.environ.get('DEFAULT_TIMEZONE', 'Europe/Moscow')
+    
+    # Кэш ответов статистики: размер и время жизни (сек)
+    STATS_CACHE_SIZE = int(os.environ.get('STATS_CACHE_SIZE', '5000'))
+    STATS_CACHE_TTL = float(os.environ.get('STATS_CACHE_TTL', '300'))
+    
+    # Встроенная SQLite: файл, размер mmap (байт), кэш страниц (КБ), кэш выражений
+    SQLITE_PATH = os.environ.get('SQLITE_PATH', 'mindmate.db')
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
+    SQLITE_CACHE_KB = int(os.environ.get('SQLITE_CACHE_KB', '65536'))
+    SQLITE_STATEMENT_CACHE = int(os.environ.get('SQLITE_STATEMENT_CACHE', '256'))
+
+# Длины периодов статистики (дней)
+STATS_PERIOD_DAYS = {"today": 1, "week": 7, "month": 30}
+
+# Максимальный размер страницы истории настроения
+HISTORY_PAGE_MAX = 50
 
+# Соединений SQLite в пуле: по одному на поток пула БД + фоновый сброс очереди
+SQLITE_POOL_SIZE = DB_EXECUTOR_WORKERS + 1
+
+# Асинхронный менеджер создается только в режиме "async"
+async_db_manager = None
+
+# ============ КЭШ СТАТИСТИКИ (общий для всех менеджеров) ============
+
+class StatsCache:
+    """TTL+LRU кэш get_user_stats, сбрасываемый записью настроения пользователя"""
+    
+    def __init__(self, maxsize, ttl):
+        self._cache = LRUCache(maxsize=maxsize, ttl=ttl)
+        # user_id -> номер последней инвалидации: не даем медленному чтению
+        # положить в кэш данные, устаревшие из-за параллельной записи
+        self._invalidated = OrderedDict()
+        self._maxsize = maxsize
+        # Номер самой свежей вытесненной инвалидации: пользователь без записи
+        # мог быть вытеснен, поэтому считается сброшенным не раньше нее
+        self._evicted_seq = 0
+        self._seq = 0
+        self._lock = threading.Lock()
+        
+        metrics.gauge("stats_cache.hits", lambda: self._cache.hits)
+        metrics.gauge("stats_cache.misses", lambda: self._cache.misses)
+        metrics.gauge("stats_cache.size", lambda: len(self._cache))
+    
+    def get(self, user_id):
+        """Закэшированная статистика или None"""
+        return self._cache.get(user_id)
+    
+    def token(self):
+        """Метка начала чтения из БД"""
+        return self._seq
+    
+    def put(self, user_id, stats, token):
+        """Сохранить результат, если после начала чтения не было записи"""
+        # Проверка и запись под одной блокировкой с invalidate: иначе сброс
+        # между ними потеряется и в кэше останутся данные до записи
+        with self._lock:
+            if self._invalidated.get(user_id, self._evicted_seq) > token:
+                return
+            self._cache.set(user_id, stats)
+    
+    def invalidate(self, user_id):
+        """Сбросить статистику пользователя после новой записи"""
+        with self._lock:
+            self._seq += 1
+            self._invalidated[user_id] = self._seq
+            self._invalidated.move_to_end(user_id)
+            while len(self._invalidated) > self._maxsize:
+                _, seq = self._invalidated.popitem(last=False)
+                self._evicted_seq = max(self._evicted_seq, seq)
+            self._cache.pop(user_id)
+    
+    def clear(self):
+        self._cache.clear()
+    
+    def get_stats(self):
+        return self._cache.get_stats()
+
+stats_cache = StatsCache(STATS_CACHE_SIZE, STATS_CACHE_TTL)
+
+# Без DATABASE_URL используется встроенная SQLite (данные сохраняются в файл)
 if not DATABASE_URL:
-    logger.warning("⚠️ DATABASE_URL не найден! Будет использован режим без БД.")
-    USE_REAL_DB = False
+    DATABASE_URL = f"sqlite:///{SQLITE_PATH}"
+    logger.info(f"💾 DATABASE_URL не задан - встроенная SQLite: {SQLITE_PATH}")
 else:
     logger.info(f"✅ DATABASE_URL найден: {DATABASE_URL[:50]}...")
-    USE_REAL_DB = True
+USE_REAL_DB = True
 
-# ============ РЕЖИМ БЕЗ БАЗЫ ДАННЫХ (ЗАГЛУШКА) ============
-if not USE_REAL_DB:
-    logger.info("🔧 Используется заглушка базы данных")
-    
-    class DummySession:
-        def query(self, *args, **kwargs):
-            return self
-        def filter(self, *args, **kwargs):
-            return self
-        def first(self):
-            return None
-        def all(self):
-            return []
-        def count(self):
-            return 0
-        def commit(self):
-            pass
-        def rollback(self):
-            pass
-        def close(self):
-            pass
+# ============ ЗАГЛУШКА (если SQLAlchemy недоступна или БД не поднялась) ============
+
+class DummySession:
+    def query(self, *args, **kwargs):
+        return self
+    def filter(self, *args, **kwargs):
+        return self
+    def first(self):
+        return None
+    def all(self):
+        return []
+    def count(self):
+        return 0
+    def commit(self):
+        pass
+    def rollback(self):
+        pass
+    def close(self):
+        pass
+
+class DummyDBManager:
+    """Заглушка для работы без реальной базы данных"""
+    def init_db(self):
+        logger.info("✅ Заглушка БД инициализирована")
+        return True
     
-    class DummyDBManager:
-        """Заглушка для работы без реальной базы данных"""
-        def init_db(self):
-            logger.info("✅ Заглушка БД инициализирована")
-            return True
-        
-        def add_user(self, telegram_id, username=None, first_name=None):
-            logger.info(f"📝 Пользователь добавлен (заглушка): ID={telegram_id}, Имя={first_name}")
-            return {"id": telegram_id, "telegram_id": telegram_id}
-        
-        def add_mood_log(self, user_id, mood_score=None, message=None):
-            logger.info(f"📊 Запись настроения (заглушка): user={user_id}, score={mood_score}")
-            return {"id": 1, "user_id": user_id}
-        
-        def get_user_stats(self, user_id):
-            return {
-                "total_records": 0,
-                "avg_mood": None,
-                "recent_logs": []
-            }
-        
-        @contextmanager
-        def get_db_session(self):
-            """Контекстный менеджер для сессий-заглушек"""
-            session = DummySession()
-            try:
-                yield session
-                session.commit()
-            except Exception as e:
-                session.rollback()
-                logger.error(f"Ошибка в заглушке БД: {e}")
-            finally:
-                session.close()
+    def add_user(self, telegram_id, username=None, first_name=None):
+        logger.info(f"📝 Пользователь добавлен (заглушка): ID={telegram_id}, Имя={first_name}")
+        return {"id": telegram_id, "telegram_id": telegram_id}
     
-    db_manager = DummyDBManager()
+    def get_user_id(self, telegram_id):
+        return telegram_id
+    
+    def add_mood_log(self, user_id, mood_score=None, message=None, analysis=None):
+        logger.info(f"📊 Запись настроения (заглушка): user={user_id}, score={mood_score}")
+        stats_cache.invalidate(user_id)
+        return {"id": 1, "user_id": user_id}
+    
+    def record_mood(self, telegram_user, mood_score=None, message=None, analysis=None):
+        logger.info(f"📊 Запись настроения (заглушка): user={telegram_user.id}, score={mood_score}")
+        stats_cache.invalidate(telegram_user.id)
+        return {"user_id": telegram_user.id, "telegram_id": telegram_user.id, "log_id": None, "queued": False}
+    
+    def flush(self):
+        return 0
+    
+    def close(self):
+        pass
+    
+    def get_user_stats(self, user_id):
+        cached = stats_cache.get(user_id)
+        if cached is not None:
+            return cached
+        token = stats_cache.token()
+        stats = {
+            "total_records": 0,
+            "avg_mood": None,
+            "recent_logs": [],
+            "trend": None
+        }
+        stats_cache.put(user_id, stats, token)
+        return stats
+    
+    def get_period_stats(self, user_id, period="all"):
+        return {
+            "period": period,
+            "total_records": 0,
+            "avg_mood": None,
+            "min_mood": None,
+            "max_mood": None,
+            "days": []
+        }
+    
+    def get_topic_stats(self, user_id, period="month"):
+        return {"period": period, "analyzed_records": 0, "topics": [], "emotions": []}
+    
+    def get_stress_trend(self, user_id, period="month"):
+        return {"period": period, "avg_stress": None, "days": []}
+    
+    def set_user_timezone(self, telegram_id, tz_name):
+        return False
+    
+    def iter_mood_history(self, user_id, before=None, limit=10):
+        return {"items": [], "next_before": None}
+    
+    def add_chat_turn(self, user_id, user_message, ai_response, message_type="text"):
+        return None
+    
+    def get_chat_history(self, user_id, limit=20):
+        return []
+    
+    @contextmanager
+    def get_db_session(self):
+        """Контекстный менеджер для сессий-заглушек"""
+        session = DummySession()
+        try:
+            yield session
+            session.commit()
+        except Exception as e:
+            session.rollback()
+            logger.error(f"Ошибка в заглушке БД: {e}")
+        finally:
+            session.close()
+
 
 # ============ РЕЖИМ С РЕАЛЬНОЙ БАЗОЙ ДАННЫХ ============
-else:
-    try:
-        # Импортируем SQLAlchemy только если нужна реальная БД
-        from sqlalchemy import create_engine, Column, Integer, String, DateTime, Text, func
-        from sqlalchemy.ext.declarative import declarative_base
-        from sqlalchemy.orm import sessionmaker
-        from datetime import datetime
-        
-        # Исправляем URL для SQLAlchemy
-        if DATABASE_URL.startswith("postgres://"):
-            DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
-            logger.info("✅ URL базы данных исправлен для SQLAlchemy")
-        
-        # Создаем движок
+try:
+    # Импортируем SQLAlchemy только если нужна реальная БД
+    from sqlalchemy import (
+        create_engine, event, insert, inspect, text, tuple_, func, case,
+        Column, Index, Integer, SmallInteger, Float, String, Date, DateTime, Text, JSON
+    )
+    from sqlalchemy.ext.declarative import declarative_base
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.dialects.postgresql import insert as pg_insert
+    from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+    from write_behind import WriteBehindQueue
+    from nlp_features import TOPIC_BITS, EMOTION_BITS, mood_features
+    from trends import new_trend_state, update_trend, describe_trend, emit_drops
+    from datetime import datetime, timedelta, timezone as dt_timezone
+    from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+    
+    # Исправляем URL для SQLAlchemy
+    if DATABASE_URL.startswith("postgres://"):
+        DATABASE_URL = DATABASE_URL.replace("postgres://", "postgresql://", 1)
+        logger.info("✅ URL базы данных исправлен для SQLAlchemy")
+    
+    IS_SQLITE = DATABASE_URL.startswith("sqlite")
+    
+    def _sqlite_pragmas(dbapi_connection, connection_record):
+        """Настройки встроенной SQLite для каждого нового соединения"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")  # Читатели не блокируют писателя
+        cursor.execute("PRAGMA synchronous=NORMAL")  # fsync только на checkpoint (безопасно в WAL)
+        cursor.execute(f"PRAGMA mmap_size={SQLITE_MMAP_SIZE}")
+        cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.execute(f"PRAGMA busy_timeout={int(DB_CALL_TIMEOUT * 1000)}")
+        cursor.close()
+    
+    # Создаем движок
+    if IS_SQLITE:
+        engine = create_engine(
+            DATABASE_URL,
+            pool_size=SQLITE_POOL_SIZE,
+            max_overflow=0,
+            pool_pre_ping=True,
+            echo=False,
+            connect_args={
+                "check_same_thread": False,
+                "timeout": DB_CALL_TIMEOUT,
+                # Кэш подготовленных выражений sqlite3 на соединение
+                "cached_statements": SQLITE_STATEMENT_CACHE
+            }
+        )
+        event.listen(engine, "connect", _sqlite_pragmas)
+    else:
         engine = create_engine(
             DATABASE_URL,
             pool_size=5,
@@ -100,202 +321,1375 @@ else:
             pool_recycle=300,
             echo=False
         )
+    
+    SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    Base = declarative_base()
+    
+    logger.info(f"✅ Движок БД создан: {engine.dialect.name}")
+    
+    # ============ МОДЕЛИ ============
+    
+    class User(Base):
+        __tablename__ = "users"
         
-        SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-        Base = declarative_base()
+        id = Column(Integer, primary_key=True, index=True)
+        telegram_id = Column(Integer, unique=True, index=True, nullable=False)
+        username = Column(String(100))
+        first_name = Column(String(100))
+        created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+        last_active = Column(DateTime, default=datetime.utcnow, nullable=False)
+        timezone = Column(String(64))  # IANA, например "Europe/Moscow"; NULL = DEFAULT_TIMEZONE
+    
+    class MoodLog(Base):
+        __tablename__ = "mood_logs"
         
-        logger.info("✅ Движок PostgreSQL создан")
+        id = Column(Integer, primary_key=True, index=True)
+        user_id = Column(Integer, nullable=False)
+        mood_score = Column(Integer)
+        user_message = Column(Text)
+        created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
         
-        # ============ МОДЕЛИ ============
+        # Признаки NLP анализа (см. nlp_features); NULL - запись без анализа текста
+        sentiment = Column(SmallInteger)  # -1 / 0 / 1
+        stress_level = Column(SmallInteger)  # 1..10
+        topic_mask = Column(Integer)  # биты TOPIC_BITS
+        emotion_mask = Column(Integer)  # биты EMOTION_BITS
         
-        class User(Base):
-            __tablename__ = "users"
-            
-            id = Column(Integer, primary_key=True, index=True)
-            telegram_id = Column(Integer, unique=True, index=True, nullable=False)
-            username = Column(String(100))
-            first_name = Column(String(100))
-            created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-            last_active = Column(DateTime, default=datetime.utcnow, nullable=False)
-        
-        class MoodLog(Base):
-            __tablename__ = "mood_logs"
+        __table_args__ = (
+            # Единственный индекс по пользователю: история (ORDER BY created_at, keyset-пагинация),
+            # статистика и отчеты за период читают только строки пользователя в диапазоне дат
+            Index("ix_mood_logs_user_created", "user_id", "created_at"),
+        )
+    
+    class UserMoodAggregate(Base):
+        """Агрегаты настроения пользователя, обновляются вместе с mood_logs"""
+        __tablename__ = "user_mood_aggregates"
+        
+        user_id = Column(Integer, primary_key=True)
+        total_records = Column(Integer, default=0, nullable=False)
+        scored_count = Column(Integer, default=0, nullable=False)
+        score_sum = Column(Integer, default=0, nullable=False)
+        score_min = Column(Integer)
+        score_max = Column(Integer)
+        recent_logs = Column(JSON, default=list, nullable=False)
+        updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+        
+        # Динамика (см. trends): EWMA и дисперсия настроения и стресса, медленная базовая линия
+        mood_ewma = Column(Float)
+        mood_ewvar = Column(Float)
+        mood_baseline = Column(Float)
+        mood_samples = Column(Integer)
+        stress_ewma = Column(Float)
+        stress_ewvar = Column(Float)
+    
+    class DailyMoodStats(Base):
+        """Дневные итоги настроения (день - по часовому поясу пользователя)"""
+        __tablename__ = "daily_mood_stats"
+        
+        user_id = Column(Integer, primary_key=True)
+        day = Column(Date, primary_key=True)
+        message_count = Column(Integer, default=0, nullable=False)
+        scored_count = Column(Integer, default=0, nullable=False)
+        score_sum = Column(Integer, default=0, nullable=False)
+        score_min = Column(Integer)
+        score_max = Column(Integer)
+    
+    class ChatHistory(Base):
+        """Реплики диалога с ИИ: вопрос пользователя и ответ (см. chat_memory)"""
+        __tablename__ = "chat_history"
+        
+        id = Column(Integer, primary_key=True, index=True)
+        user_id = Column(Integer, nullable=False)
+        user_message = Column(Text, nullable=False)
+        ai_response = Column(Text, nullable=False)
+        message_type = Column(String(20), default="text", nullable=False)
+        created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+        
+        __table_args__ = (
+            # Последние реплики пользователя: ORDER BY created_at DESC LIMIT n по индексу
+            Index("ix_chat_history_user_created", "user_id", "created_at"),
+        )
+    
+    # Колонки, добавленные после первого релиза: create_all не меняет существующие таблицы
+    SCHEMA_MIGRATIONS = [
+        ("users", "timezone", "VARCHAR(64)"),
+        ("mood_logs", "sentiment", "SMALLINT"),
+        ("mood_logs", "stress_level", "SMALLINT"),
+        ("mood_logs", "topic_mask", "INTEGER"),
+        ("mood_logs", "emotion_mask", "INTEGER"),
+        ("user_mood_aggregates", "mood_ewma", "FLOAT"),
+        ("user_mood_aggregates", "mood_ewvar", "FLOAT"),
+        ("user_mood_aggregates", "mood_baseline", "FLOAT"),
+        ("user_mood_aggregates", "mood_samples", "INTEGER"),
+        ("user_mood_aggregates", "stress_ewma", "FLOAT"),
+        ("user_mood_aggregates", "stress_ewvar", "FLOAT"),
+    ]
+    
+    # Индексы прежних версий, которые перекрывает ix_mood_logs_user_created
+    OBSOLETE_INDEXES = [
+        ("mood_logs", "ix_mood_logs_user_id"),
+        ("mood_logs", "ix_mood_logs_user_features"),
+    ]
+    
+    # Поля состояния тренда в user_mood_aggregates
+    TREND_FIELDS = tuple(new_trend_state())
+    
+    def _migrate_schema(conn):
+        """Добавить недостающие колонки и индексы в существующие таблицы"""
+        inspector = inspect(conn)
+        for table, column, ddl in SCHEMA_MIGRATIONS:
+            existing = {c["name"] for c in inspector.get_columns(table)}
+            if column not in existing:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+                logger.info(f"✅ Миграция: {table}.{column} добавлена")
+        
+        for table in Base.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in existing:
+                    index.create(conn)
+                    logger.info(f"✅ Миграция: индекс {index.name} создан")
+        
+        for table, name in OBSOLETE_INDEXES:
+            if name in {ix["name"] for ix in inspector.get_indexes(table)}:
+                conn.execute(text(f"DROP INDEX {name}"))
+                logger.info(f"✅ Миграция: индекс {name} удален")
+    
+    # ============ КЭШ ИЗВЕСТНЫХ ПОЛЬЗОВАТЕЛЕЙ ============
+    # telegram_id -> (users.id, время последней записи last_active)
+    known_users = LRUCache(maxsize=KNOWN_USERS_CACHE_SIZE)
+    
+    # users.id -> часовой пояс пользователя
+    user_timezones = LRUCache(maxsize=KNOWN_USERS_CACHE_SIZE)
+    
+    def _after_commit(session, callback):
+        """
+        Выполнить callback после коммита сессии (get_db_session).
+        Кэши процесса заполняются только зафиксированными данными: при откате
+        транзакции id нового пользователя не должен остаться в known_users.
+        """
+        session.info.setdefault("after_commit", []).append(callback)
+    
+    def _run_after_commit(session):
+        for callback in session.info.pop("after_commit", ()):
+            try:
+                callback()
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика после коммита: {e}")
+    
+    def _remember_user(telegram_id, user_id, tz_name):
+        known_users.set(telegram_id, (user_id, time.monotonic()))
+        user_timezones.set(user_id, tz_name or DEFAULT_TIMEZONE)
+    
+    # INSERT ... ON CONFLICT DO UPDATE поддерживают PostgreSQL и SQLite 3.24+
+    UPSERT_DIALECTS = {"postgresql": pg_insert, "sqlite": sqlite_insert}
+    
+    # ============ ОПЕРАЦИИ В РАМКАХ СЕССИИ ============
+    # Общие для синхронного и асинхронного менеджеров:
+    # асинхронный выполняет их через AsyncSession.run_sync
+    
+    def _empty_stats():
+        return {
+            "total_records": 0,
+            "avg_mood": None,
+            "recent_logs": [],
+            "trend": None
+        }
+    
+    def _empty_period_stats(period):
+        return {
+            "period": period,
+            "total_records": 0,
+            "avg_mood": None,
+            "min_mood": None,
+            "max_mood": None,
+            "days": []
+        }
+    
+    def _empty_topic_stats(period):
+        return {
+            "period": period,
+            "analyzed_records": 0,
+            "topics": [],
+            "emotions": []
+        }
+    
+    def _empty_stress_trend(period):
+        return {
+            "period": period,
+            "avg_stress": None,
+            "days": []
+        }
+    
+    def _telegram_identity(telegram_user):
+        """(telegram_id, username, first_name) из telegram.User или словаря"""
+        if isinstance(telegram_user, dict):
+            return telegram_user["id"], telegram_user.get("username"), telegram_user.get("first_name")
+        return telegram_user.id, telegram_user.username, telegram_user.first_name
+    
+    def _cached_user(telegram_id):
+        """Пользователь из кэша, если last_active обновлялся недавно"""
+        entry = known_users.get(telegram_id)
+        if entry is None:
+            return None
+        user_id, touched_at = entry
+        if time.monotonic() - touched_at >= USER_TOUCH_INTERVAL:
+            return None
+        return {"id": user_id, "telegram_id": telegram_id}
+    
+    def _known_user_id(telegram_id):
+        """users.id из кэша независимо от давности last_active"""
+        entry = known_users.get(telegram_id)
+        return entry[0] if entry is not None else None
+    
+    def _get_user_id_tx(session, telegram_id):
+        """users.id по telegram_id без записи; None - пользователя еще нет"""
+        user_id = session.query(User.id).filter(User.telegram_id == telegram_id).scalar()
+        if user_id is not None:
+            # last_active не обновлялся: первая запись пользователя все равно выполнит upsert
+            _after_commit(session, lambda: known_users.set(telegram_id, (user_id, float("-inf"))))
+        return user_id
+    
+    def _add_user_tx(session, telegram_id, username=None, first_name=None):
+        """Создать пользователя или обновить last_active одним запросом"""
+        now = datetime.utcnow()
+        dialect = session.get_bind().dialect.name
+        
+        if dialect in UPSERT_DIALECTS:
+            stmt = UPSERT_DIALECTS[dialect](User).values(
+                telegram_id=telegram_id,
+                username=username,
+                first_name=first_name,
+                created_at=now,
+                last_active=now
+            )
+            stmt = stmt.on_conflict_do_update(
+                index_elements=[User.telegram_id],
+                set_={"last_active": stmt.excluded.last_active}
+            ).returning(User.id, User.timezone)
+            user_id, tz_name = session.execute(stmt).one()
+        else:
+            # Прочие СУБД: SELECT + UPDATE/INSERT
+            existing = session.query(User).filter(
+                User.telegram_id == telegram_id
+            ).first()
+            if existing:
+                existing.last_active = now
+                user_id, tz_name = existing.id, existing.timezone
+            else:
+                user = User(telegram_id=telegram_id, username=username, first_name=first_name)
+                session.add(user)
+                session.flush()
+                user_id, tz_name = user.id, None
+        
+        _after_commit(session, lambda: _remember_user(telegram_id, user_id, tz_name))
+        logger.debug(f"👤 Пользователь сохранен: {telegram_id} ({first_name})")
+        return {"id": user_id, "telegram_id": telegram_id}
+    
+    def _mood_log_row(user_id, mood_score=None, message=None, analysis=None):
+        """Строка mood_logs; время фиксируется в момент записи, а не сброса"""
+        return {
+            "user_id": user_id,
+            "mood_score": mood_score,
+            "user_message": message,
+            "created_at": datetime.utcnow(),
+            **mood_features(analysis)
+        }
+    
+    def _recent_entry(mood_score, message, created_at):
+        """Элемент списка последних записей в формате get_user_stats"""
+        return {
+            "mood_score": mood_score,
+            "message": message[:50] + "..." if message and len(message) > 50 else message,
+            "created_at": created_at.isoformat() if created_at else None
+        }
+    
+    def _get_zone(tz_name):
+        try:
+            return ZoneInfo(tz_name or DEFAULT_TIMEZONE)
+        except (ZoneInfoNotFoundError, ValueError):
+            return ZoneInfo("UTC")
+    
+    def _user_timezone(session, user_id):
+        """Часовой пояс пользователя (из кэша или из users)"""
+        tz_name = user_timezones.get(user_id)
+        if tz_name is None:
+            tz_name = session.query(User.timezone).filter(User.id == user_id).scalar() or DEFAULT_TIMEZONE
+            _after_commit(session, lambda: user_timezones.set(user_id, tz_name))
+        return _get_zone(tz_name)
+    
+    def _local_day(created_at, zone):
+        """Локальная дата пользователя для времени в UTC"""
+        return created_at.replace(tzinfo=dt_timezone.utc).astimezone(zone).date()
+    
+    def _merge_extremes(obj, scores):
+        """Добавить оценки к счетчикам, сумме, минимуму и максимуму"""
+        if not scores:
+            return
+        obj.scored_count += len(scores)
+        obj.score_sum += sum(scores)
+        obj.score_min = min(scores + ([obj.score_min] if obj.score_min is not None else []))
+        obj.score_max = max(scores + ([obj.score_max] if obj.score_max is not None else []))
+    
+    def _apply_daily_stats(session, by_user):
+        """Обновить дневные итоги (user_id, day) по новым строкам"""
+        by_day = {}
+        for uid, user_rows in by_user.items():
+            zone = _user_timezone(session, uid)
+            for row in user_rows:
+                by_day.setdefault((uid, _local_day(row["created_at"], zone)), []).append(row)
+        
+        dialect = session.get_bind().dialect.name
+        if dialect in UPSERT_DIALECTS:
+            session.execute(
+                UPSERT_DIALECTS[dialect](DailyMoodStats)
+                .values([{"user_id": uid, "day": day} for uid, day in by_day])
+                .on_conflict_do_nothing(index_elements=[DailyMoodStats.user_id, DailyMoodStats.day])
+            )
+        existing = {
+            (d.user_id, d.day): d
+            for d in session.query(DailyMoodStats).filter(
+                tuple_(DailyMoodStats.user_id, DailyMoodStats.day).in_(list(by_day))
+            ).with_for_update()
+        }
+        
+        for key, day_rows in by_day.items():
+            daily = existing.get(key)
+            if daily is None:
+                daily = DailyMoodStats(user_id=key[0], day=key[1], message_count=0,
+                                       scored_count=0, score_sum=0)
+                session.add(daily)
+            daily.message_count += len(day_rows)
+            _merge_extremes(daily, [r["mood_score"] for r in day_rows if r["mood_score"] is not None])
+    
+    def _apply_trends(session, agg, user_rows):
+        """Шаг EWMA по новым строкам пользователя; возвращает события спада настроения"""
+        state = {field: getattr(agg, field) for field in TREND_FIELDS}
+        drops = []
+        for row in user_rows:
+            drop = update_trend(state, row["mood_score"], row.get("stress_level"))
+            if drop:
+                drop.update(user_id=agg.user_id, created_at=row["created_at"].isoformat())
+                drops.append(drop)
+        for field, value in state.items():
+            setattr(agg, field, value)
+        return drops
+    
+    def _resolve_drop_targets(session, drops):
+        """Добавить telegram_id к событиям спада (их мало, один запрос)"""
+        if not drops:
+            return drops
+        telegram_ids = dict(session.query(User.id, User.telegram_id).filter(
+            User.id.in_({d["user_id"] for d in drops})
+        ))
+        for drop in drops:
+            drop["telegram_id"] = telegram_ids.get(drop["user_id"])
+        return drops
+    
+    def _apply_mood_aggregates(session, rows):
+        """
+        Обновить агрегаты пользователей по новым строкам mood_logs.
+        Возвращает события спада настроения для emit_drops после фиксации транзакции.
+        """
+        by_user = {}
+        for row in rows:
+            by_user.setdefault(row["user_id"], []).append(row)
+        
+        # Гарантируем наличие строк агрегатов, затем блокируем их на время обновления
+        dialect = session.get_bind().dialect.name
+        if dialect in UPSERT_DIALECTS:
+            session.execute(
+                UPSERT_DIALECTS[dialect](UserMoodAggregate)
+                .values([{"user_id": uid, "recent_logs": []} for uid in by_user])
+                .on_conflict_do_nothing(index_elements=[UserMoodAggregate.user_id])
+            )
+        aggregates = {
+            agg.user_id: agg
+            for agg in session.query(UserMoodAggregate)
+            .filter(UserMoodAggregate.user_id.in_(list(by_user)))
+            .with_for_update()
+        }
+        
+        drops = []
+        for uid, user_rows in by_user.items():
+            agg = aggregates.get(uid)
+            if agg is None:
+                agg = UserMoodAggregate(user_id=uid, total_records=0, scored_count=0,
+                                        score_sum=0, recent_logs=[])
+                session.add(agg)
+            drops += _apply_trends(session, agg, user_rows)
             
-            id = Column(Integer, primary_key=True, index=True)
-            user_id = Column(Integer, index=True, nullable=False)
-            mood_score = Column(Integer)
-            user_message = Column(Text)
-            created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
-        
-        # ============ МЕНЕДЖЕР БАЗЫ ДАННЫХ ============
-        
-        class DatabaseManager:
-            def __init__(self):
-                self.engine = engine
-                self.Base = Base
+            agg.total_records += len(user_rows)
+            _merge_extremes(agg, [r["mood_score"] for r in user_rows if r["mood_score"] is not None])
             
-            def init_db(self):
-                """Создание таблиц с защитой от ошибок"""
+            fresh = [
+                _recent_entry(r["mood_score"], r["user_message"], r["created_at"])
+                for r in user_rows
+            ]
+            recent = sorted(fresh + list(agg.recent_logs or []),
+                            key=lambda e: e["created_at"] or "", reverse=True)
+            agg.recent_logs = recent[:AGG_RECENT_SIZE]
+            agg.updated_at = datetime.utcnow()
+        
+        _apply_daily_stats(session, by_user)
+        return _resolve_drop_targets(session, drops)
+    
+    def _add_mood_log_tx(session, user_id, mood_score=None, message=None, analysis=None):
+        """Добавить запись настроения в открытой сессии"""
+        row = _mood_log_row(user_id, mood_score, message, analysis)
+        log = MoodLog(**row)
+        session.add(log)
+        session.flush()
+        drops = _apply_mood_aggregates(session, [row])
+        
+        logger.info(f"📊 Запись настроения: user={user_id}, score={mood_score}")
+        return {"id": log.id, "user_id": log.user_id, "mood_drops": drops}
+    
+    def _record_mood_tx(session, telegram_id, username, first_name, mood_score, message,
+                        analysis=None, user_id=None):
+        """Пользователь и запись настроения в одной транзакции"""
+        if user_id is None:
+            user_id = _add_user_tx(session, telegram_id, username, first_name)["id"]
+        log = _add_mood_log_tx(session, user_id, mood_score, message, analysis)
+        return {"user_id": user_id, "telegram_id": telegram_id, "log_id": log["id"], "queued": False,
+                "mood_drops": log["mood_drops"]}
+    
+    def _flush_mood_logs_tx(session, rows):
+        """Пакетная вставка накопленных записей настроения (executemany); возвращает события спада"""
+        session.execute(insert(MoodLog), rows)
+        return _apply_mood_aggregates(session, rows)
+    
+    def _invalidate_flushed(rows):
+        """
+        Сбросить статистику авторов записанной пачки (после коммита).
+        Пока пачка пишется, очередь уже пуста: чтение в этот момент не видит
+        ни очереди, ни новых строк и может положить в кэш старую статистику.
+        """
+        for user_id in {row["user_id"] for row in rows}:
+            stats_cache.invalidate(user_id)
+    
+    def _get_user_stats_tx(session, user_id):
+        """Статистика пользователя: одно чтение по первичному ключу агрегатов"""
+        agg = session.get(UserMoodAggregate, user_id)
+        if agg is None:
+            # Агрегаты еще не построены (старые данные до rebuild) - считаем по логам
+            return _scan_user_stats_tx(session, user_id)
+        
+        return {
+            "total_records": agg.total_records,
+            "avg_mood": agg.score_sum / agg.scored_count if agg.scored_count else None,
+            "min_mood": agg.score_min,
+            "max_mood": agg.score_max,
+            "recent_logs": list(agg.recent_logs or []),
+            "trend": describe_trend({field: getattr(agg, field) for field in TREND_FIELDS})
+        }
+    
+    def _scan_user_stats_tx(session, user_id):
+        """Статистика пользователя по полной истории mood_logs"""
+        # Количество записей
+        count = session.query(MoodLog).filter(
+            MoodLog.user_id == user_id
+        ).count()
+        
+        # Среднее настроение
+        avg_mood = session.query(func.avg(MoodLog.mood_score)).filter(
+            MoodLog.user_id == user_id,
+            MoodLog.mood_score.isnot(None)
+        ).scalar()
+        
+        # Последние записи
+        recent = session.query(MoodLog).filter(
+            MoodLog.user_id == user_id
+        ).order_by(MoodLog.created_at.desc()).limit(5).all()
+        
+        return {
+            "total_records": count,
+            "avg_mood": float(avg_mood) if avg_mood else None,
+            "recent_logs": [
+                _recent_entry(log.mood_score, log.user_message, log.created_at)
+                for log in recent
+            ],
+            "trend": None
+        }
+    
+    def _get_period_stats_tx(session, user_id, period):
+        """Статистика за период: сумма не более ~31 строки daily_mood_stats"""
+        if period == "all":
+            stats = _get_user_stats_tx(session, user_id)
+            stats["period"] = period
+            stats["days"] = []
+            return stats
+        
+        zone = _user_timezone(session, user_id)
+        today = datetime.now(zone).date()
+        first_day = today - timedelta(days=STATS_PERIOD_DAYS[period] - 1)
+        
+        days = session.query(DailyMoodStats).filter(
+            DailyMoodStats.user_id == user_id,
+            DailyMoodStats.day >= first_day,
+            DailyMoodStats.day <= today
+        ).order_by(DailyMoodStats.day).all()
+        
+        scored = sum(d.scored_count for d in days)
+        mins = [d.score_min for d in days if d.score_min is not None]
+        maxs = [d.score_max for d in days if d.score_max is not None]
+        return {
+            "period": period,
+            "total_records": sum(d.message_count for d in days),
+            "avg_mood": sum(d.score_sum for d in days) / scored if scored else None,
+            "min_mood": min(mins) if mins else None,
+            "max_mood": max(maxs) if maxs else None,
+            # Формат models_user.DailyStats
+            "days": [
+                {
+                    "date": d.day.isoformat(),
+                    "avg_mood": d.score_sum / d.scored_count if d.scored_count else None,
+                    "message_count": d.message_count
+                }
+                for d in days
+            ]
+        }
+    
+    def _period_start(session, user_id, period):
+        """Начало периода в UTC по локальной дате пользователя (None - вся история)"""
+        if period == "all":
+            return None
+        zone = _user_timezone(session, user_id)
+        first_day = datetime.now(zone).date() - timedelta(days=STATS_PERIOD_DAYS[period] - 1)
+        local_start = datetime.combine(first_day, datetime.min.time(), zone)
+        return local_start.astimezone(dt_timezone.utc).replace(tzinfo=None)
+    
+    def _local_date_expr(session, zone):
+        """Локальная дата created_at в SQL (сдвиг на текущее смещение пояса пользователя)"""
+        offset = datetime.now(zone).utcoffset() or timedelta(0)
+        if session.get_bind().dialect.name == "sqlite":
+            return func.date(MoodLog.created_at, f"{int(offset.total_seconds()):+d} seconds")
+        return func.date(MoodLog.created_at + offset)
+    
+    def _bit_count(column, bit):
+        """Число записей с установленным битом маски (побитовое И в SQL)"""
+        return func.sum(case((column.op("&")(bit) != 0, 1), else_=0))
+    
+    def _ranked_bits(names, counts, total):
+        """Ненулевые счетчики битов по убыванию частоты"""
+        ranked = sorted(
+            ((name, int(count or 0)) for name, count in zip(names, counts)),
+            key=lambda item: item[1], reverse=True
+        )
+        return [
+            {"name": name, "count": count, "share": round(count / total, 3)}
+            for name, count in ranked if count
+        ]
+    
+    def _get_topic_stats_tx(session, user_id, period):
+        """Частота тем и эмоций за период: один агрегирующий запрос по индексу (user_id, created_at)"""
+        query = session.query(
+            func.count(MoodLog.id),
+            *(_bit_count(MoodLog.topic_mask, 1 << bit) for bit in range(len(TOPIC_BITS))),
+            *(_bit_count(MoodLog.emotion_mask, 1 << bit) for bit in range(len(EMOTION_BITS)))
+        ).filter(
+            MoodLog.user_id == user_id,
+            MoodLog.topic_mask.isnot(None)
+        )
+        start = _period_start(session, user_id, period)
+        if start is not None:
+            query = query.filter(MoodLog.created_at >= start)
+        
+        total, *counts = query.one()
+        if not total:
+            return _empty_topic_stats(period)
+        return {
+            "period": period,
+            "analyzed_records": total,
+            "topics": _ranked_bits(TOPIC_BITS, counts[:len(TOPIC_BITS)], total),
+            "emotions": _ranked_bits(EMOTION_BITS, counts[len(TOPIC_BITS):], total)
+        }
+    
+    def _get_stress_trend_tx(session, user_id, period):
+        """Стресс по дням за период: GROUP BY по локальной дате, без чтения текста записей"""
+        day = _local_date_expr(session, _user_timezone(session, user_id)).label("day")
+        query = session.query(
+            day,
+            func.count(MoodLog.stress_level),
+            func.sum(MoodLog.stress_level),
+            func.max(MoodLog.stress_level),
+            func.sum(case((MoodLog.sentiment < 0, 1), else_=0))
+        ).filter(
+            MoodLog.user_id == user_id,
+            MoodLog.stress_level.isnot(None)
+        )
+        start = _period_start(session, user_id, period)
+        if start is not None:
+            query = query.filter(MoodLog.created_at >= start)
+        
+        rows = query.group_by(day).order_by(day).all()
+        if not rows:
+            return _empty_stress_trend(period)
+        count = sum(r[1] for r in rows)
+        return {
+            "period": period,
+            "avg_stress": round(sum(r[2] for r in rows) / count, 2),
+            "days": [
+                {
+                    "date": d if isinstance(d, str) else d.isoformat(),
+                    "avg_stress": round(stress_sum / n, 2),
+                    "max_stress": max_stress,
+                    "message_count": n,
+                    "negative_count": int(negative or 0)
+                }
+                for d, n, stress_sum, max_stress, negative in rows
+            ]
+        }
+    
+    def _encode_cursor(created_at, log_id):
+        return f"{created_at.isoformat()}|{log_id}"
+    
+    def _decode_cursor(cursor):
+        """(created_at, id) из курсора; None - курсор поврежден (callback_data приходит от клиента)"""
+        try:
+            created_at, log_id = cursor.rsplit("|", 1)
+            created_at = datetime.fromisoformat(created_at)
+            if created_at.tzinfo is not None:
+                created_at = created_at.astimezone(dt_timezone.utc).replace(tzinfo=None)
+            return created_at, int(log_id)
+        except (AttributeError, TypeError, ValueError):
+            return None
+    
+    def _iter_mood_history_tx(session, user_id, before=None, limit=10):
+        """Страница истории (новые сверху) с keyset-пагинацией по (created_at, id)"""
+        limit = max(1, min(limit, HISTORY_PAGE_MAX))
+        query = session.query(MoodLog).filter(MoodLog.user_id == user_id)
+        if before:
+            decoded = _decode_cursor(before)
+            if decoded is None:
+                logger.warning(f"⚠️ Некорректный курсор истории: {str(before)[:64]}")
+                return {"items": [], "next_before": None}
+            before_at, before_id = decoded
+            query = query.filter(
+                tuple_(MoodLog.created_at, MoodLog.id) < tuple_(before_at, before_id)
+            )
+        # Берем на одну строку больше, чтобы узнать, есть ли следующая страница
+        logs = query.order_by(MoodLog.created_at.desc(), MoodLog.id.desc()).limit(limit + 1).all()
+        
+        page = logs[:limit]
+        return {
+            "items": [
+                {
+                    "id": log.id,
+                    "mood_score": log.mood_score,
+                    "message": log.user_message,
+                    "created_at": log.created_at.isoformat() if log.created_at else None
+                }
+                for log in page
+            ],
+            "next_before": _encode_cursor(page[-1].created_at, page[-1].id) if len(logs) > limit else None
+        }
+    
+    def _add_chat_turn_tx(session, user_id, user_message, ai_response, message_type="text"):
+        """Сохранить реплику диалога с ИИ"""
+        turn = ChatHistory(
+            user_id=user_id,
+            user_message=user_message,
+            ai_response=ai_response,
+            message_type=message_type
+        )
+        session.add(turn)
+        session.flush()
+        return turn.id
+    
+    def _get_chat_history_tx(session, user_id, limit=20):
+        """Последние реплики пользователя (старые первыми)"""
+        rows = (
+            session.query(ChatHistory.user_message, ChatHistory.ai_response, ChatHistory.created_at)
+            .filter(ChatHistory.user_id == user_id)
+            .order_by(ChatHistory.created_at.desc(), ChatHistory.id.desc())
+            .limit(max(1, limit))
+            .all()
+        )
+        return [
+            {
+                "user_message": user_message,
+                "ai_response": ai_response,
+                "created_at": created_at.isoformat() if created_at else None
+            }
+            for user_message, ai_response, created_at in reversed(rows)
+        ]
+    
+    def _set_user_timezone_tx(session, telegram_id, tz_name):
+        """Сохранить часовой пояс пользователя"""
+        user = session.query(User).filter(User.telegram_id == telegram_id).first()
+        if user is None:
+            return False
+        user.timezone = tz_name
+        user_id = user.id
+        _after_commit(session, lambda: user_timezones.set(user_id, tz_name))
+        return True
+    
+    def _rebuild_daily_stats_tx(session):
+        """Пересчитать daily_mood_stats по mood_logs (по часовым поясам пользователей)"""
+        zones = {
+            uid: _get_zone(tz_name)
+            for uid, tz_name in session.query(User.id, User.timezone)
+        }
+        default_zone = _get_zone(DEFAULT_TIMEZONE)
+        
+        totals = {}
+        logs = session.query(MoodLog.user_id, MoodLog.mood_score, MoodLog.created_at).yield_per(5000)
+        for user_id, mood_score, created_at in logs:
+            key = (user_id, _local_day(created_at, zones.get(user_id, default_zone)))
+            entry = totals.setdefault(key, [0, 0, 0, None, None])
+            entry[0] += 1
+            if mood_score is not None:
+                entry[1] += 1
+                entry[2] += mood_score
+                entry[3] = mood_score if entry[3] is None else min(entry[3], mood_score)
+                entry[4] = mood_score if entry[4] is None else max(entry[4], mood_score)
+        
+        session.query(DailyMoodStats).delete()
+        if totals:
+            session.execute(insert(DailyMoodStats), [
+                {
+                    "user_id": user_id, "day": day, "message_count": count,
+                    "scored_count": scored, "score_sum": score_sum,
+                    "score_min": score_min, "score_max": score_max
+                }
+                for (user_id, day), (count, scored, score_sum, score_min, score_max) in totals.items()
+            ])
+        return len(totals)
+    
+    def _rebuild_mood_aggregates_tx(session):
+        """Пересчитать агрегаты всех пользователей по mood_logs"""
+        totals = session.query(
+            MoodLog.user_id,
+            func.count(MoodLog.id),
+            func.count(MoodLog.mood_score),
+            func.coalesce(func.sum(MoodLog.mood_score), 0),
+            func.min(MoodLog.mood_score),
+            func.max(MoodLog.mood_score)
+        ).group_by(MoodLog.user_id).all()
+        
+        # Последние N записей каждого пользователя одним проходом (оконная функция)
+        ranked = session.query(
+            MoodLog.user_id,
+            MoodLog.mood_score,
+            MoodLog.user_message,
+            MoodLog.created_at,
+            func.row_number().over(
+                partition_by=MoodLog.user_id,
+                order_by=(MoodLog.created_at.desc(), MoodLog.id.desc())
+            ).label("rn")
+        ).subquery()
+        recent = {}
+        for row in session.query(ranked).filter(ranked.c.rn <= AGG_RECENT_SIZE).order_by(
+            ranked.c.user_id, ranked.c.rn
+        ):
+            recent.setdefault(row.user_id, []).append(
+                _recent_entry(row.mood_score, row.user_message, row.created_at)
+            )
+        
+        # Динамика: EWMA по всей истории в порядке времени (потоково)
+        trends = {}
+        for user_id, mood_score, stress_level in session.query(
+            MoodLog.user_id, MoodLog.mood_score, MoodLog.stress_level
+        ).order_by(MoodLog.user_id, MoodLog.created_at, MoodLog.id).yield_per(10000):
+            update_trend(trends.setdefault(user_id, new_trend_state()), mood_score, stress_level)
+        
+        session.query(UserMoodAggregate).delete()
+        if not totals:
+            return 0
+        now = datetime.utcnow()
+        session.execute(insert(UserMoodAggregate), [
+            {
+                "user_id": user_id,
+                "total_records": total,
+                "scored_count": scored,
+                "score_sum": int(score_sum),
+                "score_min": score_min,
+                "score_max": score_max,
+                "recent_logs": recent.get(user_id, []),
+                "updated_at": now,
+                **trends.get(user_id, new_trend_state())
+            }
+            for user_id, total, scored, score_sum, score_min, score_max in totals
+        ])
+        return len(totals)
+    
+    # ============ МЕНЕДЖЕР БАЗЫ ДАННЫХ ============
+    
+    class DatabaseManager:
+        def __init__(self):
+            self.engine = engine
+            self.Base = Base
+            self.mood_queue = WriteBehindQueue(
+                "mood_logs",
+                batch_size=MOOD_BATCH_SIZE,
+                flush_interval=MOOD_FLUSH_INTERVAL,
+                max_size=MOOD_QUEUE_MAX
+            )
+            self._flusher = None
+            self._stop_flusher = threading.Event()
+        
+        def init_db(self):
+            """Создание таблиц с защитой от ошибок"""
+            try:
+                self.Base.metadata.create_all(bind=self.engine)
+                with self.engine.begin() as conn:
+                    _migrate_schema(conn)
+                logger.info("✅ Таблицы БД созданы/проверены")
+                return True
+            except Exception as e:
+                logger.error(f"❌ Ошибка создания таблиц: {e}")
+                # Пробуем создать через raw SQL
                 try:
-                    self.Base.metadata.create_all(bind=self.engine)
-                    logger.info("✅ Таблицы БД созданы/проверены")
+                    with self.engine.connect() as conn:
+                        # Создаем таблицу users
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS users (
+                                id SERIAL PRIMARY KEY,
+                                telegram_id INTEGER UNIQUE NOT NULL,
+                                username VARCHAR(100),
+                                first_name VARCHAR(100),
+                                created_at TIMESTAMP DEFAULT NOW(),
+                                last_active TIMESTAMP DEFAULT NOW()
+                            )
+                        """)
+                        # Создаем таблицу mood_logs
+                        conn.execute("""
+                            CREATE TABLE IF NOT EXISTS mood_logs (
+                                id SERIAL PRIMARY KEY,
+                                user_id INTEGER NOT NULL,
+                                mood_score INTEGER,
+                                user_message TEXT,
+                                created_at TIMESTAMP DEFAULT NOW()
+                            )
+                        """)
+                        conn.commit()
+                    logger.info("✅ Таблицы созданы через raw SQL")
                     return True
+                except Exception as e2:
+                    logger.error(f"❌ Ошибка создания таблиц raw SQL: {e2}")
+                    return False
+        
+        @contextmanager
+        def get_db_session(self):
+            """Контекстный менеджер для сессий"""
+            session = SessionLocal()
+            try:
+                yield session
+                session.commit()
+                _run_after_commit(session)
+            except Exception as e:
+                session.rollback()
+                logger.error(f"Ошибка БД: {e}")
+                raise
+            finally:
+                session.close()
+        
+        def add_user(self, telegram_id, username=None, first_name=None):
+            """Добавить пользователя"""
+            cached = _cached_user(telegram_id)
+            if cached:
+                return cached
+            try:
+                with self.get_db_session() as session:
+                    return _add_user_tx(session, telegram_id, username, first_name)
+            except Exception as e:
+                logger.error(f"❌ Ошибка добавления пользователя: {e}")
+                # Возвращаем заглушку, чтобы бот продолжал работу
+                return {"id": telegram_id, "telegram_id": telegram_id}
+        
+        def get_user_id(self, telegram_id):
+            """
+            users.id пользователя Telegram для чтения (статистика, история).
+            В отличие от add_user не пишет в БД; None - пользователя еще нет.
+            """
+            user_id = _known_user_id(telegram_id)
+            if user_id is not None:
+                return user_id
+            try:
+                with self.get_db_session() as session:
+                    return _get_user_id_tx(session, telegram_id)
+            except Exception as e:
+                logger.error(f"❌ Ошибка поиска пользователя: {e}")
+                return None
+        
+        def add_mood_log(self, user_id, mood_score=None, message=None, analysis=None):
+            """Добавить запись настроения (через очередь отложенной записи)"""
+            stats_cache.invalidate(user_id)
+            if not MOOD_WRITE_BEHIND:
+                try:
+                    with self.get_db_session() as session:
+                        result = _add_mood_log_tx(session, user_id, mood_score, message, analysis)
+                    emit_drops(result.pop("mood_drops"))
+                    return result
                 except Exception as e:
-                    logger.error(f"❌ Ошибка создания таблиц: {e}")
-                    # Пробуем создать через raw SQL
-                    try:
-                        with self.engine.connect() as conn:
-                            # Создаем таблицу users
-                            conn.execute("""
-                                CREATE TABLE IF NOT EXISTS users (
-                                    id SERIAL PRIMARY KEY,
-                                    telegram_id INTEGER UNIQUE NOT NULL,
-                                    username VARCHAR(100),
-                                    first_name VARCHAR(100),
-                                    created_at TIMESTAMP DEFAULT NOW(),
-                                    last_active TIMESTAMP DEFAULT NOW()
-                                )
-                            """)
-                            # Создаем таблицу mood_logs
-                            conn.execute("""
-                                CREATE TABLE IF NOT EXISTS mood_logs (
-                                    id SERIAL PRIMARY KEY,
-                                    user_id INTEGER NOT NULL,
-                                    mood_score INTEGER,
-                                    user_message TEXT,
-                                    created_at TIMESTAMP DEFAULT NOW()
-                                )
-                            """)
-                            conn.commit()
-                        logger.info("✅ Таблицы созданы через raw SQL")
-                        return True
-                    except Exception as e2:
-                        logger.error(f"❌ Ошибка создания таблиц raw SQL: {e2}")
-                        return False
+                    logger.error(f"❌ Ошибка добавления записи настроения: {e}")
+                    return {"id": 0, "user_id": user_id}
+            
+            self._ensure_flusher()
+            if self.mood_queue.put(_mood_log_row(user_id, mood_score, message, analysis)):
+                self.flush()
+            return {"id": None, "user_id": user_id, "queued": True}
+        
+        def record_mood(self, telegram_user, mood_score=None, message=None, analysis=None):
+            """
+            Записать настроение пользователя Telegram.
+            Известный пользователь - запись уходит в очередь без обращения к БД,
+            новый - пользователь и запись сохраняются одной транзакцией.
+            """
+            telegram_id, username, first_name = _telegram_identity(telegram_user)
+            cached = _cached_user(telegram_id)
+            if cached and MOOD_WRITE_BEHIND:
+                self.add_mood_log(cached["id"], mood_score, message, analysis)
+                return {"user_id": cached["id"], "telegram_id": telegram_id, "log_id": None, "queued": True}
+            
+            try:
+                with self.get_db_session() as session:
+                    result = _record_mood_tx(
+                        session, telegram_id, username, first_name, mood_score, message,
+                        analysis, user_id=cached["id"] if cached else None
+                    )
+                stats_cache.invalidate(result["user_id"])
+                emit_drops(result.pop("mood_drops"))
+                return result
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи настроения: {e}")
+                return {"user_id": None, "telegram_id": telegram_id, "log_id": None, "queued": False}
+        
+        def flush(self):
+            """Записать накопленные записи настроения одной транзакцией"""
+            rows = self.mood_queue.drain()
+            if not rows:
+                return 0
+            started = time.perf_counter()
+            try:
+                with self.get_db_session() as session:
+                    drops = _flush_mood_logs_tx(session, rows)
+            except Exception as e:
+                logger.error(f"❌ Ошибка пакетной записи настроения ({len(rows)} строк): {e}")
+                self.mood_queue.requeue(rows)
+                return 0
+            self.mood_queue.record_flush(len(rows), time.perf_counter() - started)
+            _invalidate_flushed(rows)
+            emit_drops(drops)
+            return len(rows)
+        
+        def _ensure_flusher(self):
+            """Фоновый поток, сбрасывающий очередь по таймеру"""
+            if self._flusher is None:
+                self._flusher = threading.Thread(
+                    target=self._flush_loop, name="mood-log-flusher", daemon=True
+                )
+                self._flusher.start()
+        
+        def _flush_loop(self):
+            while not self._stop_flusher.wait(self.mood_queue.flush_interval / 2):
+                if self.mood_queue.is_due():
+                    self.flush()
+        
+        def close(self):
+            """Остановить фоновый сброс и дописать очередь"""
+            self._stop_flusher.set()
+            written = self.flush()
+            logger.info(f"✅ Очередь записей настроения сброшена: {written} строк")
+        
+        def get_user_stats(self, user_id):
+            """Получить статистику пользователя"""
+            cached = stats_cache.get(user_id)
+            if cached is not None:
+                return cached
+            token = stats_cache.token()
+            # Свежие записи пользователя должны попасть в статистику
+            if self.mood_queue.has_pending(user_id):
+                self.flush()
+            try:
+                with self.get_db_session() as session:
+                    stats = _get_user_stats_tx(session, user_id)
+                stats_cache.put(user_id, stats, token)
+                return stats
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики: {e}")
+                return _empty_stats()
+        
+        def get_period_stats(self, user_id, period="all"):
+            """Статистика за период: today / week / month / all"""
+            if self.mood_queue.has_pending(user_id):
+                self.flush()
+            try:
+                with self.get_db_session() as session:
+                    return _get_period_stats_tx(session, user_id, period)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики за период: {e}")
+                return _empty_period_stats(period)
+        
+        def get_topic_stats(self, user_id, period="month"):
+            """Частота тем и эмоций за период по признакам NLP в mood_logs"""
+            if self.mood_queue.has_pending(user_id):
+                self.flush()
+            try:
+                with self.get_db_session() as session:
+                    return _get_topic_stats_tx(session, user_id, period)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики тем: {e}")
+                return _empty_topic_stats(period)
+        
+        def get_stress_trend(self, user_id, period="month"):
+            """Уровень стресса по дням за период"""
+            if self.mood_queue.has_pending(user_id):
+                self.flush()
+            try:
+                with self.get_db_session() as session:
+                    return _get_stress_trend_tx(session, user_id, period)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения динамики стресса: {e}")
+                return _empty_stress_trend(period)
+        
+        def iter_mood_history(self, user_id, before=None, limit=10):
+            """Страница истории настроения; before - курсор next_before предыдущей страницы"""
+            if self.mood_queue.has_pending(user_id):
+                self.flush()
+            try:
+                with self.get_db_session() as session:
+                    return _iter_mood_history_tx(session, user_id, before, limit)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения истории: {e}")
+                return {"items": [], "next_before": None}
+        
+        def add_chat_turn(self, user_id, user_message, ai_response, message_type="text"):
+            """Сохранить реплику диалога с ИИ"""
+            try:
+                with self.get_db_session() as session:
+                    return _add_chat_turn_tx(session, user_id, user_message, ai_response, message_type)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения истории чата: {e}")
+                return None
+        
+        def get_chat_history(self, user_id, limit=20):
+            """Последние реплики диалога с ИИ (старые первыми)"""
+            try:
+                with self.get_db_session() as session:
+                    return _get_chat_history_tx(session, user_id, limit)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения истории чата: {e}")
+                return []
+        
+        def set_user_timezone(self, telegram_id, tz_name):
+            """Установить часовой пояс пользователя"""
+            try:
+                with self.get_db_session() as session:
+                    return _set_user_timezone_tx(session, telegram_id, tz_name)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения часового пояса: {e}")
+                return False
+        
+        def rebuild_mood_aggregates(self):
+            """Одноразовый пересчет агрегатов и дневных итогов по существующим mood_logs"""
+            self.flush()
+            with self.get_db_session() as session:
+                users = _rebuild_mood_aggregates_tx(session)
+                days = _rebuild_daily_stats_tx(session)
+            stats_cache.clear()
+            logger.info(f"✅ Агрегаты настроения пересчитаны: {users} пользователей, {days} дней")
+            return users
+    
+    # ============ АСИНХРОННЫЙ МЕНЕДЖЕР (SQLAlchemy async engine) ============
+    
+    def _make_async_url(url):
+        """Подобрать асинхронный драйвер: asyncpg для PostgreSQL, aiosqlite для SQLite"""
+        scheme, rest = url.split("://", 1)
+        dialect = scheme.split("+", 1)[0]
+        drivers = {"postgresql": "asyncpg", "sqlite": "aiosqlite"}
+        if dialect not in drivers:
+            raise ValueError(f"Асинхронный режим не поддерживает диалект {dialect}")
+        return f"{dialect}+{drivers[dialect]}://{rest}"
+    
+    class AsyncDatabaseManager:
+        """Менеджер БД на асинхронном движке с тем же API, что и DatabaseManager"""
+        
+        def __init__(self, url):
+            from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
             
-            @contextmanager
-            def get_db_session(self):
-                """Контекстный менеджер для сессий"""
-                session = SessionLocal()
+            async_url = _make_async_url(url)
+            engine_kwargs = {"pool_pre_ping": True, "echo": False}
+            if not async_url.startswith("sqlite"):
+                engine_kwargs.update(
+                    pool_size=DB_ASYNC_POOL_SIZE,
+                    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+                    pool_recycle=300
+                )
+            if async_url.startswith("sqlite"):
+                engine_kwargs["connect_args"] = {"timeout": DB_CALL_TIMEOUT}
+            self.engine = create_async_engine(async_url, **engine_kwargs)
+            if async_url.startswith("sqlite"):
+                event.listen(self.engine.sync_engine, "connect", _sqlite_pragmas)
+            self.Base = Base
+            self.session_factory = async_sessionmaker(
+                self.engine, autoflush=False, expire_on_commit=False
+            )
+            self.mood_queue = WriteBehindQueue(
+                "mood_logs",
+                batch_size=MOOD_BATCH_SIZE,
+                flush_interval=MOOD_FLUSH_INTERVAL,
+                max_size=MOOD_QUEUE_MAX
+            )
+            self._flusher = None
+            logger.info(f"✅ Асинхронный движок БД создан: {async_url.split('://', 1)[0]}")
+        
+        async def init_db(self):
+            """Создание таблиц с защитой от ошибок"""
+            try:
+                async with self.engine.begin() as conn:
+                    await conn.run_sync(self.Base.metadata.create_all)
+                    await conn.run_sync(_migrate_schema)
+                logger.info("✅ Таблицы БД созданы/проверены (async)")
+                return True
+            except Exception as e:
+                logger.error(f"❌ Ошибка создания таблиц (async): {e}")
+                return False
+        
+        @asynccontextmanager
+        async def get_db_session(self):
+            """Асинхронный контекстный менеджер для сессий"""
+            async with self.session_factory() as session:
                 try:
                     yield session
-                    session.commit()
+                    await session.commit()
+                    _run_after_commit(session)
                 except Exception as e:
-                    session.rollback()
-                    logger.error(f"Ошибка БД: {e}")
+                    await session.rollback()
+                    logger.error(f"Ошибка БД (async): {e}")
                     raise
-                finally:
-                    session.close()
-            
-            def add_user(self, telegram_id, username=None, first_name=None):
-                """Добавить пользователя"""
-                try:
-                    with self.get_db_session() as session:
-                        # Проверяем существование
-                        existing = session.query(User).filter(
-                            User.telegram_id == telegram_id
-                        ).first()
-                        
-                        if existing:
-                            existing.last_active = datetime.utcnow()
-                            session.commit()
-                            logger.info(f"👤 Пользователь обновлен: {telegram_id}")
-                            return {"id": existing.id, "telegram_id": existing.telegram_id}
-                        
-                        # Создаем нового
-                        user = User(
-                            telegram_id=telegram_id,
-                            username=username,
-                            first_name=first_name
-                        )
-                        session.add(user)
-                        session.commit()
-                        session.refresh(user)
-                        
-                        logger.info(f"👤 Новый пользователь: {telegram_id} ({first_name})")
-                        return {"id": user.id, "telegram_id": user.telegram_id}
-                        
-                except Exception as e:
-                    logger.error(f"❌ Ошибка добавления пользователя: {e}")
-                    # Возвращаем заглушку, чтобы бот продолжал работу
-                    return {"id": telegram_id, "telegram_id": telegram_id}
+        
+        async def _run_tx(self, tx, *args, timeout=None):
+            """Выполнить операцию в отдельной транзакции с таймаутом"""
+            async def _call():
+                async with self.get_db_session() as session:
+                    return await session.run_sync(tx, *args)
             
-            def add_mood_log(self, user_id, mood_score=None, message=None):
-                """Добавить запись настроения"""
+            limit = DB_CALL_TIMEOUT if timeout is None else timeout
+            return await asyncio.wait_for(_call(), timeout=limit)
+        
+        async def add_user(self, telegram_id, username=None, first_name=None, timeout=None):
+            """Добавить пользователя"""
+            cached = _cached_user(telegram_id)
+            if cached:
+                return cached
+            try:
+                return await self._run_tx(_add_user_tx, telegram_id, username, first_name, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка добавления пользователя: {e}")
+                return {"id": telegram_id, "telegram_id": telegram_id}
+        
+        async def get_user_id(self, telegram_id, timeout=None):
+            """users.id без записи в БД (см. DatabaseManager.get_user_id)"""
+            user_id = _known_user_id(telegram_id)
+            if user_id is not None:
+                return user_id
+            try:
+                return await self._run_tx(_get_user_id_tx, telegram_id, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка поиска пользователя: {e}")
+                return None
+        
+        async def add_mood_log(self, user_id, mood_score=None, message=None, analysis=None, timeout=None):
+            """Добавить запись настроения (через очередь отложенной записи)"""
+            stats_cache.invalidate(user_id)
+            if not MOOD_WRITE_BEHIND:
                 try:
-                    with self.get_db_session() as session:
-                        log = MoodLog(
-                            user_id=user_id,
-                            mood_score=mood_score,
-                            user_message=message
-                        )
-                        session.add(log)
-                        session.commit()
-                        session.refresh(log)
-                        
-                        logger.info(f"📊 Запись настроения: user={user_id}, score={mood_score}")
-                        return {"id": log.id, "user_id": log.user_id}
-                        
+                    result = await self._run_tx(
+                        _add_mood_log_tx, user_id, mood_score, message, analysis, timeout=timeout
+                    )
+                    emit_drops(result.pop("mood_drops"))
+                    return result
                 except Exception as e:
                     logger.error(f"❌ Ошибка добавления записи настроения: {e}")
                     return {"id": 0, "user_id": user_id}
             
-            def get_user_stats(self, user_id):
-                """Получить статистику пользователя"""
-                try:
-                    with self.get_db_session() as session:
-                        # Количество записей
-                        count = session.query(MoodLog).filter(
-                            MoodLog.user_id == user_id
-                        ).count()
-                        
-                        # Среднее настроение
-                        avg_mood = session.query(func.avg(MoodLog.mood_score)).filter(
-                            MoodLog.user_id == user_id,
-                            MoodLog.mood_score.isnot(None)
-                        ).scalar()
-                        
-                        # Последние записи
-                        recent = session.query(MoodLog).filter(
-                            MoodLog.user_id == user_id
-                        ).order_by(MoodLog.created_at.desc()).limit(5).all()
-                        
-                        return {
-                            "total_records": count,
-                            "avg_mood": float(avg_mood) if avg_mood else None,
-                            "recent_logs": [
-                                {
-                                    "mood_score": log.mood_score,
-                                    "message": log.user_message[:50] + "..." if log.user_message and len(log.user_message) > 50 else log.user_message,
-                                    "created_at": log.created_at.isoformat() if log.created_at else None
-                                }
-                                for log in recent
-                            ]
-                        }
-                        
-                except Exception as e:
-                    logger.error(f"❌ Ошибка получения статистики: {e}")
-                    return {
-                        "total_records": 0,
-                        "avg_mood": None,
-                        "recent_logs": []
-                    }
-        
-        # Создаем реальный менеджер БД
-        db_manager = DatabaseManager()
-        
-    except ImportError as e:
-        logger.error(f"❌ Не удалось импортировать SQLAlchemy: {e}")
-        # Создаем заглушку если нет SQLAlchemy
-        from database import DummyDBManager
-        db_manager = DummyDBManager()
-        USE_REAL_DB = False
-    except Exception as e:
-        logger.error(f"❌ Ошибка инициализации реальной БД: {e}")
-        # Создаем заглушку при любой ошибке
-        from database import DummyDBManager
-        db_manager = DummyDBManager()
-        USE_REAL_DB = False
+            self._ensure_flusher()
+            if self.mood_queue.put(_mood_log_row(user_id, mood_score, message, analysis)):
+                await self.flush()
+            return {"id": None, "user_id": user_id, "queued": True}
+        
+        async def record_mood(self, telegram_user, mood_score=None, message=None, analysis=None, timeout=None):
+            """Записать настроение пользователя Telegram (см. DatabaseManager.record_mood)"""
+            telegram_id, username, first_name = _telegram_identity(telegram_user)
+            cached = _cached_user(telegram_id)
+            if cached and MOOD_WRITE_BEHIND:
+                await self.add_mood_log(cached["id"], mood_score, message, analysis)
+                return {"user_id": cached["id"], "telegram_id": telegram_id, "log_id": None, "queued": True}
+            
+            try:
+                result = await self._run_tx(
+                    _record_mood_tx, telegram_id, username, first_name, mood_score, message,
+                    analysis, cached["id"] if cached else None, timeout=timeout
+                )
+                stats_cache.invalidate(result["user_id"])
+                emit_drops(result.pop("mood_drops"))
+                return result
+            except Exception as e:
+                logger.error(f"❌ Ошибка записи настроения: {e}")
+                return {"user_id": None, "telegram_id": telegram_id, "log_id": None, "queued": False}
+        
+        async def flush(self):
+            """Записать накопленные записи настроения одной транзакцией"""
+            rows = self.mood_queue.drain()
+            if not rows:
+                return 0
+            started = time.perf_counter()
+            try:
+                drops = await self._run_tx(_flush_mood_logs_tx, rows)
+            except Exception as e:
+                logger.error(f"❌ Ошибка пакетной записи настроения ({len(rows)} строк): {e}")
+                self.mood_queue.requeue(rows)
+                return 0
+            self.mood_queue.record_flush(len(rows), time.perf_counter() - started)
+            _invalidate_flushed(rows)
+            emit_drops(drops)
+            return len(rows)
+        
+        def _ensure_flusher(self):
+            """Фоновая задача, сбрасывающая очередь по таймеру"""
+            if self._flusher is None or self._flusher.done():
+                self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+        
+        async def _flush_loop(self):
+            while True:
+                await asyncio.sleep(self.mood_queue.flush_interval / 2)
+                if self.mood_queue.is_due():
+                    await self.flush()
+        
+        async def get_user_stats(self, user_id, timeout=None):
+            """Получить статистику пользователя"""
+            cached = stats_cache.get(user_id)
+            if cached is not None:
+                return cached
+            token = stats_cache.token()
+            # Свежие записи пользователя должны попасть в статистику
+            if self.mood_queue.has_pending(user_id):
+                await self.flush()
+            try:
+                stats = await self._run_tx(_get_user_stats_tx, user_id, timeout=timeout)
+                stats_cache.put(user_id, stats, token)
+                return stats
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики: {e}")
+                return _empty_stats()
+        
+        async def get_period_stats(self, user_id, period="all", timeout=None):
+            """Статистика за период: today / week / month / all"""
+            if self.mood_queue.has_pending(user_id):
+                await self.flush()
+            try:
+                return await self._run_tx(_get_period_stats_tx, user_id, period, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики за период: {e}")
+                return _empty_period_stats(period)
+        
+        async def get_topic_stats(self, user_id, period="month", timeout=None):
+            """Частота тем и эмоций за период по признакам NLP в mood_logs"""
+            if self.mood_queue.has_pending(user_id):
+                await self.flush()
+            try:
+                return await self._run_tx(_get_topic_stats_tx, user_id, period, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения статистики тем: {e}")
+                return _empty_topic_stats(period)
+        
+        async def get_stress_trend(self, user_id, period="month", timeout=None):
+            """Уровень стресса по дням за период"""
+            if self.mood_queue.has_pending(user_id):
+                await self.flush()
+            try:
+                return await self._run_tx(_get_stress_trend_tx, user_id, period, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения динамики стресса: {e}")
+                return _empty_stress_trend(period)
+        
+        async def iter_mood_history(self, user_id, before=None, limit=10, timeout=None):
+            """Страница истории настроения; before - курсор next_before предыдущей страницы"""
+            if self.mood_queue.has_pending(user_id):
+                await self.flush()
+            try:
+                return await self._run_tx(_iter_mood_history_tx, user_id, before, limit, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения истории: {e}")
+                return {"items": [], "next_before": None}
+        
+        async def add_chat_turn(self, user_id, user_message, ai_response, message_type="text", timeout=None):
+            """Сохранить реплику диалога с ИИ"""
+            try:
+                return await self._run_tx(
+                    _add_chat_turn_tx, user_id, user_message, ai_response, message_type, timeout=timeout
+                )
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения истории чата: {e}")
+                return None
+        
+        async def get_chat_history(self, user_id, limit=20, timeout=None):
+            """Последние реплики диалога с ИИ (старые первыми)"""
+            try:
+                return await self._run_tx(_get_chat_history_tx, user_id, limit, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка получения истории чата: {e}")
+                return []
+        
+        async def set_user_timezone(self, telegram_id, tz_name, timeout=None):
+            """Установить часовой пояс пользователя"""
+            try:
+                return await self._run_tx(_set_user_timezone_tx, telegram_id, tz_name, timeout=timeout)
+            except Exception as e:
+                logger.error(f"❌ Ошибка сохранения часового пояса: {e}")
+                return False
+        
+        async def close(self):
+            """Дописать очередь и закрыть пул соединений"""
+            if self._flusher is not None:
+                self._flusher.cancel()
+                self._flusher = None
+            written = await self.flush()
+            logger.info(f"✅ Очередь записей настроения сброшена: {written} строк")
+            await self.engine.dispose()
+            logger.info("✅ Асинхронный движок БД остановлен")
+    
+    # Создаем реальный менеджер БД
+    db_manager = DatabaseManager()
+    
+    if DB_ENGINE_MODE == "async":
+        try:
+            async_db_manager = AsyncDatabaseManager(DATABASE_URL)
+        except Exception as e:
+            logger.error(f"❌ Не удалось создать асинхронный движок: {e}")
+            logger.warning("⚠️ Используется синхронный движок в пуле потоков")
+    
+except ImportError as e:
+    logger.error(f"❌ Не удалось импортировать SQLAlchemy: {e}")
+    # Создаем заглушку если нет SQLAlchemy
+    db_manager = DummyDBManager()
+    USE_REAL_DB = False
+except Exception as e:
+    logger.error(f"❌ Ошибка инициализации реальной БД: {e}")
+    # Создаем заглушку при любой ошибке
+    db_manager = DummyDBManager()
+    USE_REAL_DB = False
 
 # Экспортируем db_manager
-__all__ = ['db_manager']
+__all__ = ['db_manager', 'async_db_manager', 'stats_cache']
+
+# ============ КОМАНДЫ ОБСЛУЖИВАНИЯ ============
+# python database.py rebuild-aggregates - пересчитать user_mood_aggregates
+
+if __name__ == "__main__":
+    import sys
+    
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(name)s: %(message)s')
+    command = sys.argv[1] if len(sys.argv) > 1 else ""
+    
+    if command == "rebuild-aggregates":
+        if not hasattr(db_manager, "rebuild_mood_aggregates"):
+            logger.error("❌ Пересчет агрегатов недоступен: БД не инициализирована")
+            sys.exit(1)
+        db_manager.init_db()
+        db_manager.rebuild_mood_aggregates()
+    else:
+        print("Использование: python database.py rebuild-aggregates")
+        sys.exit(1)
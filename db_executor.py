@@ -0,0 +1,156 @@
+"""
+Асинхронный слой выполнения запросов к БД
+Синхронные вызовы db_manager выполняются в ограниченном пуле потоков,
+чтобы не блокировать event loop PTB на время запроса к PostgreSQL.
+В режиме DB_ENGINE_MODE=async используется нативный асинхронный менеджер.
+"""
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from config import settings
+from database import db_manager, async_db_manager
+
+logger = logging.getLogger(__name__)
+
+
+class DBExecutor:
+    """Awaitable-фасад над синхронным менеджером БД"""
+
+    def __init__(self, manager, max_workers: int = 4, timeout: Optional[float] = 10.0):
+        self.manager = manager
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    @property
+    def pool(self) -> ThreadPoolExecutor:
+        """Пул потоков создается лениво при первом запросе"""
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(
+                max_workers=self.max_workers,
+                thread_name_prefix="db-worker"
+            )
+            logger.info(f"✅ Пул потоков БД создан: {self.max_workers} воркеров")
+        return self._pool
+
+    async def run(self, func, *args, timeout: Optional[float] = None, **kwargs) -> Any:
+        """
+        Выполнить синхронную функцию в пуле потоков.
+        При превышении таймаута поднимает asyncio.TimeoutError,
+        сам запрос при этом доработает в своем потоке.
+        """
+        loop = asyncio.get_running_loop()
+        call = functools.partial(func, *args, **kwargs)
+        future = loop.run_in_executor(self.pool, call)
+        limit = self.timeout if timeout is None else timeout
+        try:
+            return await asyncio.wait_for(future, timeout=limit)
+        except asyncio.TimeoutError:
+            logger.error(f"⏱️ Таймаут запроса к БД ({limit} с): {getattr(func, '__name__', func)}")
+            raise
+
+    async def init_db(self) -> bool:
+        """Инициализация БД в пуле потоков"""
+        return await self.run(self.manager.init_db, timeout=None)
+
+    async def add_user(self, telegram_id, username=None, first_name=None,
+                       timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Добавить пользователя (не блокируя event loop)"""
+        return await self.run(
+            self.manager.add_user, telegram_id,
+            username=username, first_name=first_name, timeout=timeout
+        )
+
+    async def get_user_id(self, telegram_id, timeout: Optional[float] = None) -> Optional[int]:
+        """users.id без записи в БД (для чтения статистики и истории)"""
+        return await self.run(self.manager.get_user_id, telegram_id, timeout=timeout)
+
+    async def add_mood_log(self, user_id, mood_score=None, message=None, analysis=None,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Добавить запись настроения (не блокируя event loop)"""
+        return await self.run(
+            self.manager.add_mood_log, user_id,
+            mood_score=mood_score, message=message, analysis=analysis, timeout=timeout
+        )
+
+    async def record_mood(self, telegram_user, mood_score=None, message=None, analysis=None,
+                          timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Сохранить пользователя и запись настроения одной операцией"""
+        return await self.run(
+            self.manager.record_mood, telegram_user, mood_score, message, analysis, timeout=timeout
+        )
+
+    async def get_user_stats(self, user_id, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Получить статистику пользователя (не блокируя event loop)"""
+        return await self.run(self.manager.get_user_stats, user_id, timeout=timeout)
+
+    async def get_period_stats(self, user_id, period: str = "all",
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Статистика за период today / week / month / all"""
+        return await self.run(self.manager.get_period_stats, user_id, period, timeout=timeout)
+
+    async def get_topic_stats(self, user_id, period: str = "month",
+                              timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Частота тем и эмоций за период"""
+        return await self.run(self.manager.get_topic_stats, user_id, period, timeout=timeout)
+
+    async def get_stress_trend(self, user_id, period: str = "month",
+                               timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Уровень стресса по дням за период"""
+        return await self.run(self.manager.get_stress_trend, user_id, period, timeout=timeout)
+
+    async def iter_mood_history(self, user_id, before: Optional[str] = None, limit: int = 10,
+                                timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Страница истории настроения (keyset-пагинация)"""
+        return await self.run(self.manager.iter_mood_history, user_id, before, limit, timeout=timeout)
+
+    async def add_chat_turn(self, user_id, user_message: str, ai_response: str, message_type: str = "text",
+                            timeout: Optional[float] = None) -> Optional[int]:
+        """Сохранить реплику диалога с ИИ"""
+        return await self.run(self.manager.add_chat_turn, user_id, user_message, ai_response,
+                              message_type, timeout=timeout)
+
+    async def get_chat_history(self, user_id, limit: int = 20,
+                               timeout: Optional[float] = None) -> List[Dict[str, Any]]:
+        """Последние реплики диалога с ИИ (старые первыми)"""
+        return await self.run(self.manager.get_chat_history, user_id, limit, timeout=timeout)
+
+    async def set_user_timezone(self, telegram_id, tz_name: str,
+                                timeout: Optional[float] = None) -> bool:
+        """Сохранить часовой пояс пользователя"""
+        return await self.run(self.manager.set_user_timezone, telegram_id, tz_name, timeout=timeout)
+
+    async def flush(self) -> int:
+        """Сбросить очередь отложенной записи"""
+        return await self.run(self.manager.flush, timeout=None)
+
+    def shutdown(self, wait: bool = True):
+        """Остановить пул потоков"""
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
+            logger.info("✅ Пул потоков БД остановлен")
+
+    async def close(self):
+        """Общий интерфейс остановки с асинхронным менеджером"""
+        await self.run(self.manager.close, timeout=None)
+        self.shutdown(wait=True)
+
+
+# Создаем глобальный экземпляр: оба варианта имеют одинаковый awaitable API
+if async_db_manager is not None:
+    async_db = async_db_manager
+    logger.info("✅ БД: нативный асинхронный движок")
+else:
+    async_db = DBExecutor(
+        db_manager,
+        max_workers=settings.DB_EXECUTOR_WORKERS,
+        timeout=settings.DB_CALL_TIMEOUT
+    )
+    logger.info("✅ БД: синхронный движок в пуле потоков")
+
+__all__ = ['DBExecutor', 'async_db']
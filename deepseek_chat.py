@@ -1,13 +1,83 @@
 import os
 import json
+import time
 import logging
 import asyncio
 import aiohttp
-from typing import Dict, Any, Optional
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
 from datetime import datetime
 
+from metrics import metrics
+
 logger = logging.getLogger(__name__)
 
+try:
+    from config import settings
+    DEEPSEEK_TIMEOUT = settings.DEEPSEEK_TIMEOUT
+    DEEPSEEK_POOL_LIMIT = settings.DEEPSEEK_POOL_LIMIT
+    DEEPSEEK_KEEPALIVE = settings.DEEPSEEK_KEEPALIVE
+    DEEPSEEK_DNS_TTL = settings.DEEPSEEK_DNS_TTL
+except Exception:
+    DEEPSEEK_TIMEOUT = float(os.getenv("DEEPSEEK_TIMEOUT", "30"))
+    DEEPSEEK_POOL_LIMIT = int(os.getenv("DEEPSEEK_POOL_LIMIT", "20"))
+    DEEPSEEK_KEEPALIVE = float(os.getenv("DEEPSEEK_KEEPALIVE", "60"))
+    DEEPSEEK_DNS_TTL = int(os.getenv("DEEPSEEK_DNS_TTL", "300"))
+
+NO_KEY_RESULT = {
+    'success': False,
+    'error': 'API ключ не настроен',
+    'response': 'Функция чата с ИИ временно недоступна. Пожалуйста, настройте API ключ в админ-панели.'
+}
+
+# Корзины гистограмм времени соединения и запроса (секунды)
+CONNECT_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+REQUEST_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0)
+FIRST_TOKEN_BUCKETS = (0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0)
+
+
+def _make_trace_config() -> aiohttp.TraceConfig:
+    """
+    Метрики соединений: новое соединение (DNS + TCP + TLS) против повторного
+    использования из пула keep-alive, время установки соединения и запроса.
+    """
+    trace = aiohttp.TraceConfig()
+    
+    async def on_request_start(session, ctx, params):
+        ctx.request_started = time.perf_counter()
+    
+    async def on_request_end(session, ctx, params):
+        metrics.observe("deepseek.request_time", time.perf_counter() - ctx.request_started)
+    
+    async def on_connection_create_start(session, ctx, params):
+        ctx.connect_started = time.perf_counter()
+    
+    async def on_connection_create_end(session, ctx, params):
+        metrics.inc("deepseek.connections_created")
+        metrics.observe("deepseek.connect_time", time.perf_counter() - ctx.connect_started)
+    
+    async def on_connection_reuseconn(session, ctx, params):
+        metrics.inc("deepseek.connections_reused")
+    
+    async def on_dns_cache_hit(session, ctx, params):
+        metrics.inc("deepseek.dns_cache_hits")
+    
+    async def on_dns_cache_miss(session, ctx, params):
+        metrics.inc("deepseek.dns_cache_misses")
+    
+    trace.on_request_start.append(on_request_start)
+    trace.on_request_end.append(on_request_end)
+    trace.on_connection_create_start.append(on_connection_create_start)
+    trace.on_connection_create_end.append(on_connection_create_end)
+    trace.on_connection_reuseconn.append(on_connection_reuseconn)
+    trace.on_dns_cache_hit.append(on_dns_cache_hit)
+    trace.on_dns_cache_miss.append(on_dns_cache_miss)
+    return trace
+
+
+class DeepSeekError(Exception):
+    """Ошибка ответа DeepSeek API (статус не 200)"""
+
+
 class DeepSeekChatRender:
     """Клиент DeepSeek API оптимизированный для Render"""
     
@@ -15,24 +85,55 @@ class DeepSeekChatRender:
         self.api_key = os.environ.get('DEEPSEEK_API_KEY')
         self.api_url = "https://api.deepseek.com/v1/chat/completions"
         self.model = "deepseek-chat"
+        self._session: Optional[aiohttp.ClientSession] = None
+        
+        metrics.histogram("deepseek.connect_time", buckets=CONNECT_BUCKETS)
+        metrics.histogram("deepseek.request_time", buckets=REQUEST_BUCKETS)
+        metrics.histogram("deepseek.first_token_time", buckets=FIRST_TOKEN_BUCKETS)
         
         if self.api_key:
             logger.info("✅ DeepSeek API ключ найден")
         else:
             logger.warning("⚠️ DeepSeek API ключ не найден. Чат с ИИ будет недоступен.")
     
-    async def get_response(self, user_message: str, context: list = None) -> Dict[str, Any]:
+    async def start(self):
         """
-        Получить ответ от DeepSeek API.
-        Возвращает словарь с результатом.
+        Создать общую сессию на весь процесс (вызывается при старте бота).
+        Соединения к api.deepseek.com переиспользуются между ответами:
+        TCP и TLS рукопожатие выполняется один раз, а не на каждое сообщение.
         """
-        if not self.api_key:
-            return {
-                'success': False,
-                'error': 'API ключ не настроен',
-                'response': 'Функция чата с ИИ временно недоступна. Пожалуйста, настройте API ключ в админ-панели.'
-            }
-        
+        if self._session is not None and not self._session.closed:
+            return
+        connector = aiohttp.TCPConnector(
+            limit=DEEPSEEK_POOL_LIMIT,
+            limit_per_host=DEEPSEEK_POOL_LIMIT,
+            keepalive_timeout=DEEPSEEK_KEEPALIVE,
+            use_dns_cache=True,
+            ttl_dns_cache=DEEPSEEK_DNS_TTL
+        )
+        self._session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=DEEPSEEK_TIMEOUT),
+            trace_configs=[_make_trace_config()]
+        )
+        logger.info(f"✅ Сессия DeepSeek создана (до {DEEPSEEK_POOL_LIMIT} соединений, "
+                    f"keep-alive {DEEPSEEK_KEEPALIVE:.0f} с)")
+    
+    async def close(self):
+        """Закрыть сессию и соединения пула (вызывается при остановке бота)"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+            logger.info("✅ Сессия DeepSeek закрыта")
+        self._session = None
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Общая сессия; создается при первом запросе, если бот не вызвал start()"""
+        if self._session is None or self._session.closed:
+            await self.start()
+        return self._session
+    
+    def _build_request(self, user_message: str, context: Optional[list], stream: bool):
+        """Заголовки и тело запроса chat/completions"""
         # Подготавливаем сообщения
         messages = []
         
@@ -52,9 +153,9 @@ class DeepSeekChatRender:
         
         messages.append({"role": "system", "content": system_prompt})
         
-        # Добавляем контекст если есть
+        # Добавляем контекст если есть (обрезан по токенам в chat_memory)
         if context:
-            messages.extend(context[-5:])  # Берем последние 5 сообщений
+            messages.extend(context)
         
         # Добавляем текущее сообщение пользователя
         messages.append({"role": "user", "content": user_message})
@@ -70,41 +171,51 @@ class DeepSeekChatRender:
             "messages": messages,
             "max_tokens": 800,
             "temperature": 0.7,
-            "stream": False
+            "stream": stream
         }
+        return headers, data
+    
+    async def get_response(self, user_message: str, context: list = None) -> Dict[str, Any]:
+        """
+        Получить ответ от DeepSeek API.
+        Возвращает словарь с результатом.
+        """
+        if not self.api_key:
+            return dict(NO_KEY_RESULT)
+        
+        headers, data = self._build_request(user_message, context, stream=False)
         
         try:
-            # Используем aiohttp для асинхронного запроса
-            timeout = aiohttp.ClientTimeout(total=30)
+            # Общая сессия: соединение берется из пула keep-alive
+            session = await self._get_session()
             
-            async with aiohttp.ClientSession(timeout=timeout) as session:
-                async with session.post(self.api_url, headers=headers, json=data) as response:
+            async with session.post(self.api_url, headers=headers, json=data) as response:
+                
+                if response.status == 200:
+                    result = await response.json()
+                    response_text = result["choices"][0]["message"]["content"]
                     
-                    if response.status == 200:
-                        result = await response.json()
-                        response_text = result["choices"][0]["message"]["content"]
-                        
-                        # Форматируем для Telegram
-                        formatted_response = self._format_for_telegram(response_text)
-                        
-                        return {
-                            'success': True,
-                            'response': formatted_response,
-                            'raw_response': response_text,
-                            'usage': result.get("usage", {}),
-                            'model': result.get("model", self.model)
-                        }
+                    # Форматируем для Telegram
+                    formatted_response = self._format_for_telegram(response_text)
+                    
+                    return {
+                        'success': True,
+                        'response': formatted_response,
+                        'raw_response': response_text,
+                        'usage': result.get("usage", {}),
+                        'model': result.get("model", self.model)
+                    }
+                
+                else:
+                    error_text = await response.text()
+                    logger.error(f"DeepSeek API ошибка {response.status}: {error_text}")
+                    
+                    return {
+                        'success': False,
+                        'error': f"API ошибка {response.status}",
+                        'response': "Извините, произошла ошибка при обработке запроса. Попробуйте позже."
+                    }
                     
-                    else:
-                        error_text = await response.text()
-                        logger.error(f"DeepSeek API ошибка {response.status}: {error_text}")
-                        
-                        return {
-                            'success': False,
-                            'error': f"API ошибка {response.status}",
-                            'response': "Извините, произошла ошибка при обработке запроса. Попробуйте позже."
-                        }
-                        
         except asyncio.TimeoutError:
             logger.error("Таймаут запроса к DeepSeek API")
             return {
@@ -154,14 +265,93 @@ class DeepSeekChatRender:
         
         return formatted
     
-    async def stream_response(self, user_message: str) -> str:
-        """Упрощенный streaming (для будущих улучшений)"""
-        result = await self.get_response(user_message)
+    async def stream_chunks(self, user_message: str, context: list = None) -> AsyncIterator[str]:
+        """
+        Потоковый ответ ("stream": true): фрагменты текста по мере генерации.
+        События SSE разбираются построчно, не дожидаясь конца ответа.
+        Ошибки API и сети пробрасываются вызывающему.
+        """
+        headers, data = self._build_request(user_message, context, stream=True)
+        session = await self._get_session()
+        # Общий таймаут не подходит для долгой генерации: ограничиваем паузу между данными
+        timeout = aiohttp.ClientTimeout(total=None, sock_connect=DEEPSEEK_TIMEOUT, sock_read=DEEPSEEK_TIMEOUT)
         
-        if result['success']:
-            return result['response']
-        else:
-            return result['response']  # Уже содержит сообщение об ошибке
+        async with session.post(self.api_url, headers=headers, json=data, timeout=timeout) as response:
+            if response.status != 200:
+                error_text = await response.text()
+                logger.error(f"DeepSeek API ошибка {response.status}: {error_text}")
+                raise DeepSeekError(f"API ошибка {response.status}")
+            
+            async for raw_line in response.content:
+                line = raw_line.decode('utf-8', errors='replace').strip()
+                # Пустые строки разделяют события, ":" - комментарии keep-alive
+                if not line.startswith('data:'):
+                    continue
+                payload = line[5:].strip()
+                if payload == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(payload)
+                except ValueError:
+                    logger.warning(f"⚠️ Некорректное событие потока DeepSeek: {payload[:100]}")
+                    continue
+                for choice in chunk.get('choices') or ():
+                    text = (choice.get('delta') or {}).get('content')
+                    if text:
+                        yield text
+    
+    async def stream_response(self, user_message: str, context: list = None,
+                              on_text: Optional[Callable[[str], Awaitable[Any]]] = None) -> Dict[str, Any]:
+        """
+        Получить ответ потоком. on_text вызывается с накопленным текстом после
+        каждого фрагмента (частоту правок сообщения ограничивает сам вызывающий,
+        см. stream_reply.StreamingReply). Результат - словарь как у get_response.
+        """
+        if not self.api_key:
+            return dict(NO_KEY_RESULT)
+        
+        started = time.perf_counter()
+        parts = []
+        try:
+            async for text in self.stream_chunks(user_message, context):
+                if not parts:
+                    metrics.observe("deepseek.first_token_time", time.perf_counter() - started)
+                parts.append(text)
+                if on_text is not None:
+                    await on_text(''.join(parts))
+        
+        except asyncio.TimeoutError:
+            logger.error("Таймаут потока DeepSeek API")
+            return self._stream_failure('Timeout', parts,
+                                        "Извините, сервис отвечает слишком долго. Попробуйте позже.")
+        
+        except DeepSeekError as e:
+            return self._stream_failure(str(e), parts,
+                                        "Извините, произошла ошибка при обработке запроса. Попробуйте позже.")
+        
+        except Exception as e:
+            logger.error(f"Ошибка потока DeepSeek API: {e}")
+            return self._stream_failure(str(e), parts,
+                                        "Извините, произошла техническая ошибка. Пожалуйста, попробуйте позже.")
+        
+        response_text = ''.join(parts)
+        return {
+            'success': True,
+            'response': self._format_for_telegram(response_text),
+            'raw_response': response_text,
+            'model': self.model
+        }
+    
+    def _stream_failure(self, error: str, parts: list, message: str) -> Dict[str, Any]:
+        """Ошибка потока: уже полученный текст сохраняется с пометкой об обрыве"""
+        metrics.inc("deepseek.stream_errors")
+        partial = ''.join(parts)
+        return {
+            'success': False,
+            'error': error,
+            'response': f"{self._format_for_telegram(partial)}\n\n⚠️ Ответ прерван." if partial else message,
+            'raw_response': partial
+        }
     
     def is_available(self) -> bool:
         """Проверка доступности API"""
@@ -37,7 +37,7 @@ def get_stats_keyboard():
     keyboard = [
         ["📅 Сегодня", "📆 Неделя"],
         ["🗓️ Месяц", "📊 Все время"],
-        ["↩️ Назад в меню"]
+        ["📜 История записей", "↩️ Назад в меню"]
     ]
     return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
 
@@ -101,6 +101,13 @@ def get_stats_inline_keyboard():
     ]
     return InlineKeyboardMarkup(keyboard)
 
+def get_history_inline_keyboard(cursor: str):
+    """Inline кнопка следующей страницы истории"""
+    keyboard = [
+        [InlineKeyboardButton("⬇️ Показать еще", callback_data=f"history_more:{cursor}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
 def get_settings_inline_keyboard():
     """Inline клавиатура настроек"""
     keyboard = [
@@ -141,6 +148,7 @@ __all__ = [
     'get_ai_chat_keyboard',
     'get_back_keyboard',
     'get_stats_inline_keyboard',
+    'get_history_inline_keyboard',
     'get_settings_inline_keyboard',
     'get_confirmation_inline_keyboard'
 ]
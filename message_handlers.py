@@ -3,11 +3,16 @@
 ПОЛНАЯ ФУНКЦИОНАЛЬНАЯ ВЕРСИЯ С КНОПКАМИ И ОФОРМЛЕНИЕМ
 """
 
+import os
+import time
+import asyncio
 import logging
 import random
+from dataclasses import replace
 from datetime import datetime
-from telegram import Update, ReplyKeyboardMarkup
-from telegram.ext import ContextTypes
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+from telegram import Update, ReplyKeyboardMarkup, InlineKeyboardMarkup, InlineKeyboardButton
+from telegram.ext import ApplicationHandlerStop, ContextTypes
 
 logger = logging.getLogger(__name__)
 
@@ -22,7 +27,8 @@ try:
         get_help_keyboard,
         get_crisis_keyboard,
         get_ai_chat_keyboard,
-        get_back_keyboard
+        get_back_keyboard,
+        get_history_inline_keyboard
     )
 except ImportError:
     # Создаем простые заглушки если файла keyboards.py нет
@@ -39,15 +45,61 @@ except ImportError:
         return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
     
     get_stats_keyboard = get_settings_keyboard = get_help_keyboard = get_crisis_keyboard = get_ai_chat_keyboard = get_back_keyboard = get_main_keyboard
+    
+    def get_history_inline_keyboard(cursor):
+        return InlineKeyboardMarkup([[InlineKeyboardButton("⬇️ Показать еще", callback_data=f"history_more:{cursor}")]])
 
-# Импорт БД с защитой
+# Импорт БД с защитой (запросы выполняются вне event loop)
 try:
-    from database import db_manager
+    from db_executor import async_db
     DB_AVAILABLE = True
 except ImportError:
     DB_AVAILABLE = False
     logger.warning("⚠️ База данных недоступна")
 
+# NLP анализ для признаков записей настроения (темы, эмоции, стресс)
+try:
+    from nlp_analyzer import nlp_analyzer
+    NLP_AVAILABLE = True
+except Exception as e:
+    NLP_AVAILABLE = False
+    logger.warning(f"⚠️ NLP анализатор недоступен: {e}")
+
+# DeepSeek для режима чата с ИИ (ответ потоком)
+try:
+    from deepseek_chat import deepseek_chat
+    DEEPSEEK_AVAILABLE = True
+except Exception as e:
+    DEEPSEEK_AVAILABLE = False
+    logger.warning(f"⚠️ DeepSeek недоступен: {e}")
+
+from crisis_detector import crisis_detector
+from metrics import metrics
+from stream_reply import StreamingReply
+from ai_tasks import ai_tasks, AI_RESPONSE_BUDGET
+from chat_memory import chat_memory
+from ai_scheduler import ai_scheduler, SchedulerBusy, PRIORITY_CRISIS, PRIORITY_NORMAL
+from text_matcher import StemIndex
+from utils import LRUCache
+
+try:
+    from config import settings
+    MOOD_DROP_NOTIFY_INTERVAL = settings.MOOD_DROP_NOTIFY_INTERVAL
+    AI_CRISIS_PRIORITY_WINDOW = settings.AI_CRISIS_PRIORITY_WINDOW
+except Exception:
+    MOOD_DROP_NOTIFY_INTERVAL = float(os.getenv("MOOD_DROP_NOTIFY_INTERVAL", "21600"))
+    AI_CRISIS_PRIORITY_WINDOW = float(os.getenv("AI_CRISIS_PRIORITY_WINDOW", "3600"))
+
+# Словарь быстрого анализа текста настроения (совпадения по основам целых слов)
+MOOD_TEXT_LEXICON = {
+    'positive': ['хорошо', 'отлично', 'рад', 'счастлив', 'прекрасно', 'замечательно', 'ура', 'восторг'],
+    'negative': ['плохо', 'грустно', 'устал', 'стресс', 'тревога', 'беспокойство', 'одиночество', 'страх'],
+    'neutral': ['нормально', 'обычно', 'так себе', 'ничего', 'пойдет']
+}
+mood_text_index = StemIndex(
+    (word, kind) for kind, words in MOOD_TEXT_LEXICON.items() for word in words
+).compile()
+
 # ============ ОСНОВНЫЕ ОБРАБОТЧИКИ ============
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -82,7 +134,7 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
         # Сохраняем пользователя в БД
         if DB_AVAILABLE:
             try:
-                db_manager.add_user(
+                await async_db.add_user(
                     telegram_id=user.id,
                     username=user.username,
                     first_name=user.first_name
@@ -292,8 +344,13 @@ async def handle_stats_button(update: Update, context: ContextTypes.DEFAULT_TYPE
     try:
         if DB_AVAILABLE:
             try:
-                user = update.effective_user
-                stats = db_manager.get_user_stats(user.id)
+                # Записи привязаны к внутреннему users.id, а не к telegram_id;
+                # чтение статистики не пишет в БД (None - пользователя еще нет)
+                user_id = await async_db.get_user_id(update.effective_user.id)
+                if user_id is None:
+                    stats = {'total_records': 0}
+                else:
+                    stats = await async_db.get_user_stats(user_id)
                 
                 if stats['total_records'] > 0:
                     text = f"""
@@ -302,9 +359,16 @@ async def handle_stats_button(update: Update, context: ContextTypes.DEFAULT_TYPE
 📊 *Общая информация:*
 • Всего записей: {stats['total_records']}
 • Среднее настроение: {stats['avg_mood']:.1f}/10
-
-🎯 *Последние записи:*
 """
+                    trend = stats.get('trend')
+                    if trend:
+                        directions = {'up': '📈 растет', 'down': '📉 снижается', 'flat': '➡️ стабильно'}
+                        text += (f"• Динамика: {directions[trend['direction']]} "
+                                 f"(сейчас {trend['mood_ewma']:.1f}, обычно {trend['mood_baseline']:.1f})\n")
+                        if trend.get('stress_ewma') is not None:
+                            text += f"• Уровень стресса: {trend['stress_ewma']:.1f}/10\n"
+                    
+                    text += "\n🎯 *Последние записи:*\n"
                     for i, log in enumerate(stats['recent_logs'][:3], 1):
                         mood_emoji = "😊" if log.get('mood_score', 5) >= 7 else "😐" if log.get('mood_score', 5) >= 4 else "😔"
                         text += f"{i}. {mood_emoji} {log.get('mood_score', '?')}/10: {log.get('message', 'Без описания')[:30]}...\n"
@@ -350,6 +414,160 @@ async def handle_stats_button(update: Update, context: ContextTypes.DEFAULT_TYPE
             "📈 Статистика будет доступна после нескольких записей"
         )
 
+# Кнопки периодов статистики -> (ключ периода, заголовок)
+STATS_PERIODS = {
+    "📅 Сегодня": ("today", "ЗА СЕГОДНЯ"),
+    "📆 Неделя": ("week", "ЗА НЕДЕЛЮ"),
+    "🗓️ Месяц": ("month", "ЗА МЕСЯЦ"),
+    "📊 Все время": ("all", "ЗА ВСЕ ВРЕМЯ"),
+}
+
+async def handle_stats_period(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопок периода статистики"""
+    try:
+        period, title = STATS_PERIODS.get(update.message.text, ("all", "ЗА ВСЕ ВРЕМЯ"))
+        
+        if not DB_AVAILABLE:
+            await update.message.reply_text(
+                "📈 Статистика появится после настройки базы данных.",
+                reply_markup=get_stats_keyboard()
+            )
+            return
+        
+        user_id = await async_db.get_user_id(update.effective_user.id)
+        if user_id is None:
+            stats = {'total_records': 0}
+        else:
+            stats = await async_db.get_period_stats(user_id, period)
+        
+        if stats['total_records'] == 0:
+            text = f"📈 *СТАТИСТИКА {title}*\n\nЗа этот период записей нет.\nОцените настроение кнопкой \"📊 Настроение\"."
+        else:
+            avg = f"{stats['avg_mood']:.1f}/10" if stats['avg_mood'] is not None else "—"
+            text = f"""
+📈 *СТАТИСТИКА {title}*
+
+📊 *Общая информация:*
+• Записей: {stats['total_records']}
+• Среднее настроение: {avg}
+"""
+            if stats.get('min_mood') is not None:
+                text += f"• Диапазон: {stats['min_mood']}–{stats['max_mood']}/10\n"
+            
+            if len(stats['days']) > 1:
+                text += "\n📅 *По дням:*\n"
+                for day in stats['days'][-7:]:
+                    day_avg = f"{day['avg_mood']:.1f}" if day['avg_mood'] is not None else "—"
+                    text += f"• {day['date']}: {day_avg} ({day['message_count']} зап.)\n"
+        
+        await update.message.reply_text(
+            text,
+            reply_markup=get_stats_keyboard(),
+            parse_mode='Markdown'
+        )
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка в handle_stats_period: {e}")
+        await update.message.reply_text("📈 Статистика временно недоступна")
+
+HISTORY_PAGE_SIZE = 10
+
+def _format_history_page(items) -> str:
+    """Текст страницы истории настроения"""
+    lines = []
+    for item in items:
+        score = item.get('mood_score')
+        date = (item.get('created_at') or '')[:16].replace('T', ' ')
+        message = (item.get('message') or 'Без описания')[:40]
+        lines.append(f"• {date} — {score if score is not None else '?'}/10: {message}")
+    return "\n".join(lines)
+
+async def _send_history_page(message, user_id: int, before=None):
+    """Отправить страницу истории с кнопкой «Показать еще»"""
+    page = await async_db.iter_mood_history(user_id, before=before, limit=HISTORY_PAGE_SIZE)
+    
+    if not page['items']:
+        await message.reply_text("📜 Записей больше нет." if before else "📜 У вас пока нет записей настроения.")
+        return
+    
+    title = "📜 *ИСТОРИЯ ЗАПИСЕЙ*\n\n" if before is None else ""
+    markup = get_history_inline_keyboard(page['next_before']) if page['next_before'] else None
+    await message.reply_text(
+        title + _format_history_page(page['items']),
+        reply_markup=markup,
+        parse_mode='Markdown' if before is None else None
+    )
+
+async def show_history(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /history и кнопка «📜 История записей»"""
+    try:
+        if not DB_AVAILABLE:
+            await update.message.reply_text("📜 История появится после настройки базы данных.")
+            return
+        
+        user_id = await async_db.get_user_id(update.effective_user.id)
+        if user_id is None:
+            await update.message.reply_text("📜 У вас пока нет записей настроения.")
+            return
+        await _send_history_page(update.message, user_id)
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка в show_history: {e}")
+        await update.message.reply_text("📜 История временно недоступна")
+
+async def handle_history_more(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Кнопка «Показать еще»: следующая страница по курсору из callback_data"""
+    query = update.callback_query
+    try:
+        await query.answer()
+        cursor = query.data.split(":", 1)[1]
+        
+        user_id = await async_db.get_user_id(update.effective_user.id)
+        # Убираем кнопку у предыдущей страницы
+        await query.edit_message_reply_markup(reply_markup=None)
+        if user_id is None:
+            await query.message.reply_text("📜 Записей больше нет.")
+            return
+        await _send_history_page(query.message, user_id, before=cursor)
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка в handle_history_more: {e}")
+
+async def set_timezone_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /timezone Europe/Moscow - часовой пояс для дневной статистики"""
+    try:
+        if not context.args:
+            await update.message.reply_text(
+                "🕒 Укажите часовой пояс, например:\n/timezone Europe/Moscow"
+            )
+            return
+        
+        tz_name = context.args[0]
+        try:
+            ZoneInfo(tz_name)
+        except (ZoneInfoNotFoundError, ValueError):
+            await update.message.reply_text(f"❓ Неизвестный часовой пояс: {tz_name}")
+            return
+        
+        saved = False
+        if DB_AVAILABLE:
+            user = update.effective_user
+            await async_db.add_user(
+                telegram_id=user.id,
+                username=user.username,
+                first_name=user.first_name
+            )
+            saved = await async_db.set_user_timezone(user.id, tz_name)
+        
+        if saved:
+            await update.message.reply_text(f"✅ Часовой пояс установлен: {tz_name}")
+        else:
+            await update.message.reply_text("⚠️ Не удалось сохранить часовой пояс")
+        
+    except Exception as e:
+        logger.error(f"❌ Ошибка в set_timezone_command: {e}")
+        await update.message.reply_text("⚠️ Не удалось сохранить часовой пояс")
+
 async def handle_settings_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки Настройки"""
     try:
@@ -391,9 +609,10 @@ async def handle_settings_button(update: Update, context: ContextTypes.DEFAULT_T
 async def handle_back_button(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки Назад"""
     try:
-        # Сбрасываем флаг режима чата
+        # Сбрасываем флаг режима чата и останавливаем незавершенный ответ ИИ
         if 'in_ai_chat' in context.user_data:
             context.user_data['in_ai_chat'] = False
+        ai_tasks.cancel(update.effective_user.id)
         
         await update.message.reply_text(
             "↩️ *Возвращаемся в главное меню*\n\n"
@@ -489,13 +708,8 @@ async def handle_mood_rating(update: Update, context: ContextTypes.DEFAULT_TYPE,
         # Сохраняем в БД
         if DB_AVAILABLE:
             try:
-                user_data = db_manager.add_user(
-                    telegram_id=user.id,
-                    username=user.username,
-                    first_name=user.first_name
-                )
-                db_manager.add_mood_log(
-                    user_id=user_data.get('id', user.id),
+                await async_db.record_mood(
+                    user,
                     mood_score=score,
                     message=f"Оценка настроения: {score}/10"
                 )
@@ -521,10 +735,36 @@ async def handle_mood_rating(update: Update, context: ContextTypes.DEFAULT_TYPE,
         logger.error(f"❌ Ошибка в handle_mood_rating: {e}")
         await update.message.reply_text("Спасибо за оценку!")
 
+def ai_priority(update: Update, context: ContextTypes.DEFAULT_TYPE) -> int:
+    """
+    Класс приоритета запроса к ИИ. Сообщения с кризисными словами сюда не
+    доходят (их перехватывает экстренная проверка), поэтому вне очереди
+    обслуживаются пользователи, недавно писавшие такие сообщения или с
+    замеченным спадом настроения (trends).
+    """
+    user_data = getattr(context, 'user_data', None) or {}
+    crisis_at = user_data.get('crisis_at')
+    if crisis_at is not None and time.time() - crisis_at < AI_CRISIS_PRIORITY_WINDOW:
+        return PRIORITY_CRISIS
+    if mood_drop_notified.get(update.effective_user.id):
+        return PRIORITY_CRISIS
+    return PRIORITY_NORMAL
+
 async def handle_ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text: str):
     """Обработка ответа ИИ"""
+    if DEEPSEEK_AVAILABLE and deepseek_chat.is_available():
+        # Ответ модели - в фоне, обработчик обновления сразу освобождается
+        user_id = update.effective_user.id
+        if ai_tasks.is_busy(user_id):
+            await update.message.reply_text("⏳ Я еще отвечаю на предыдущее сообщение, подождите немного.")
+            return
+        priority = ai_priority(update, context)
+        ai_tasks.submit(user_id, stream_ai_response(update, user_text, priority),
+                        bot=context.bot, chat_id=update.effective_chat.id)
+        return
+    
     try:
-        # Имитация ответов ИИ
+        # Имитация ответов ИИ (DeepSeek не настроен)
         ai_responses = [
             "💭 *Я понимаю ваши чувства.*\n\nПопробуйте посмотреть на ситуацию с другой стороны. Часто наши переживания кажутся больше, чем они есть на самом деле.",
             "🤗 *Спасибо, что поделились.*\n\nВажно признавать свои эмоции. Это первый шаг к их пониманию и управлению.",
@@ -557,31 +797,66 @@ async def handle_ai_response(update: Update, context: ContextTypes.DEFAULT_TYPE,
         logger.error(f"❌ Ошибка в handle_ai_response: {e}")
         await update.message.reply_text("Спасибо за сообщение! Чем еще могу помочь?")
 
+async def _chat_user_id(user) -> int:
+    """users.id для истории чата (без БД - telegram id)"""
+    if not DB_AVAILABLE:
+        return user.id
+    user_data = await async_db.add_user(user.id, user.username, user.first_name)
+    return user_data.get('id', user.id)
+
+async def stream_ai_response(update: Update, user_text: str, priority: int = PRIORITY_NORMAL):
+    """
+    Ответ DeepSeek потоком: первое сообщение появляется с первыми словами
+    ответа и дописывается правками, итог - с HTML форматированием.
+    Выполняется фоновой задачей (ai_tasks) в пределах AI_RESPONSE_BUDGET.
+    История разговора берется из chat_memory (обрезана по токенам),
+    число одновременных запросов ограничивает ai_scheduler.
+    """
+    reply = StreamingReply(update.message)
+    
+    async def answer():
+        user_id = await _chat_user_id(update.effective_user)
+        history = await chat_memory.context(user_id)
+        async with ai_scheduler.slot(user_id, priority):
+            result = await deepseek_chat.stream_response(user_text, context=history, on_text=reply.update)
+        return user_id, result
+    
+    try:
+        user_id, result = await asyncio.wait_for(answer(), AI_RESPONSE_BUDGET)
+        await reply.finish(result['response'], parse_mode='HTML',
+                           fallback_text=result.get('raw_response') or result['response'])
+        if result['success']:
+            await chat_memory.add_turn(user_id, user_text, result['raw_response'])
+    except SchedulerBusy as e:
+        logger.warning(f"⏳ DeepSeek перегружен, запрос отклонен: {e}")
+        await reply.finish(
+            f"⏳ Сейчас ко мне обращается много людей, ответ занял бы около {e.estimated_wait:.0f} с.\n"
+            "Пожалуйста, напишите еще раз через минуту. Если вам тяжело прямо сейчас - "
+            "позвоните на линию доверия 8-800-2000-122 (бесплатно).",
+            parse_mode=None
+        )
+    except asyncio.TimeoutError:
+        metrics.inc("ai.budget_exceeded")
+        logger.warning(f"⏱ Ответ ИИ не уложился в {AI_RESPONSE_BUDGET:.0f} с")
+        await reply.abort("⏱ Ответ занял слишком много времени. Попробуйте переформулировать вопрос.")
+    except asyncio.CancelledError:
+        # Пользователь вышел из режима чата
+        await reply.abort("⏹ Ответ остановлен.", send_if_empty=False)
+        raise
+    except Exception as e:
+        logger.error(f"❌ Ошибка в stream_ai_response: {e}")
+        await reply.finish("Извините, произошла техническая ошибка. Пожалуйста, попробуйте позже.", parse_mode=None)
+
 async def analyze_mood_text(update: Update, context: ContextTypes.DEFAULT_TYPE, user_text: str):
     """Анализ текста настроения"""
     try:
         user = update.effective_user
         
-        # Сохраняем пользователя
-        if DB_AVAILABLE:
-            try:
-                user_data = db_manager.add_user(
-                    telegram_id=user.id,
-                    username=user.username,
-                    first_name=user.first_name
-                )
-            except Exception as e:
-                logger.error(f"Ошибка сохранения пользователя: {e}")
-        
         # Простой анализ ключевых слов
-        positive_words = ['хорошо', 'отлично', 'рад', 'счастлив', 'прекрасно', 'замечательно', 'ура', 'восторг']
-        negative_words = ['плохо', 'грустно', 'устал', 'стресс', 'тревога', 'беспокойство', 'одиночество', 'страх']
-        neutral_words = ['нормально', 'обычно', 'так себе', 'ничего', 'пойдет']
-        
-        text_lower = user_text.lower()
-        positive_count = sum(1 for word in positive_words if word in text_lower)
-        negative_count = sum(1 for word in negative_words if word in text_lower)
-        neutral_count = sum(1 for word in neutral_words if word in text_lower)
+        hits = mood_text_index.match(user_text)
+        positive_count = hits.count('positive')
+        negative_count = hits.count('negative')
+        neutral_count = hits.count('neutral')
         
         # Определяем тональность
         if positive_count > negative_count and positive_count > neutral_count:
@@ -606,12 +881,20 @@ async def analyze_mood_text(update: Update, context: ContextTypes.DEFAULT_TYPE,
             score = 5
         
         # Сохраняем анализ в БД
-        if DB_AVAILABLE and 'user_data' in locals():
+        if DB_AVAILABLE:
+            # Тональность - по оценке выше, темы, эмоции и стресс - по NLP анализу
+            analysis = {'sentiment': sentiment}
+            if NLP_AVAILABLE:
+                try:
+                    analysis = replace(await nlp_analyzer.analyze_async(user_text), sentiment_label=sentiment)
+                except Exception as e:
+                    logger.error(f"Ошибка NLP анализа сообщения: {e}")
             try:
-                db_manager.add_mood_log(
-                    user_id=user_data.get('id', user.id),
+                await async_db.record_mood(
+                    user,
                     mood_score=score,
-                    message=user_text[:500]
+                    message=user_text[:500],
+                    analysis=analysis
                 )
             except Exception as e:
                 logger.error(f"Ошибка сохранения лога настроения: {e}")
@@ -659,10 +942,7 @@ async def show_stats(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Команда /stats"""
     await handle_stats_button(update, context)
 
-async def handle_crisis_situation(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Команда /crisis"""
-    try:
-        text = """
+CRISIS_HELP_TEXT = """
 🚨 *ЭКСТРЕННАЯ ПСИХОЛОГИЧЕСКАЯ ПОМОЩЬ*
 
 📞 *Телефоны доверия (Россия, бесплатно, 24/7):*
@@ -692,17 +972,109 @@ async def handle_crisis_situation(update: Update, context: ContextTypes.DEFAULT_
 
 🌈 *Ваша жизнь бесценна!*
 *Помощь доступна всегда — не стесняйтесь обратиться!*
-        """
-        
-        await update.message.reply_text(
-            text,
+"""
+
+CRISIS_FALLBACK_TEXT = "🚨 Телефон доверия: 8-800-2000-122\nСкорая помощь: 103"
+
+async def send_crisis_help(update: Update):
+    """Отправить контакты экстренной помощи (без оформления, если Markdown не прошел)"""
+    message = update.effective_message
+    try:
+        await message.reply_text(
+            CRISIS_HELP_TEXT,
             reply_markup=get_crisis_keyboard(),
             parse_mode='Markdown'
         )
-        
     except Exception as e:
-        logger.error(f"❌ Ошибка в handle_crisis_situation: {e}")
-        await update.message.reply_text("🚨 Телефон доверия: 8-800-2000-122\nСкорая помощь: 103")
+        logger.error(f"❌ Ошибка отправки экстренной помощи: {e}")
+        await message.reply_text(CRISIS_FALLBACK_TEXT)
+
+async def handle_crisis_situation(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Команда /crisis"""
+    await send_crisis_help(update)
+
+def _message_text(update) -> str:
+    message = getattr(update, 'effective_message', None)
+    return (getattr(message, 'text', None) or '') if message is not None else ''
+
+def is_crisis_update(update) -> bool:
+    """
+    Срочное обновление для PerUserUpdateProcessor: кризисное сообщение
+    не ждет очереди сообщений пользователя и лимита обработки.
+    Правленые сообщения тоже проверяются (effective_message).
+    """
+    return bool(crisis_detector.detect(_message_text(update)))
+
+def _received_at(update, context) -> float:
+    """
+    Время получения обновления процессором (с учетом ожидания в очереди).
+    Не message.date: у него точность в секунду, а SLO - доли секунды.
+    """
+    application = getattr(context, 'application', None)
+    processor = getattr(application, 'update_processor', None)
+    received = processor.received_at(update) if hasattr(processor, 'received_at') else None
+    return received if received is not None else time.perf_counter()
+
+async def handle_crisis_fast_lane(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """
+    Экстренная проверка каждого текста до всех остальных обработчиков (группа -1).
+    При кризисных словах помощь отправляется сразу, без записи в БД, анализа
+    и очереди к ИИ, а остальные обработчики пропускаются.
+    Время ответа считается от получения обновления, а не от входа в обработчик.
+    """
+    started = _received_at(update, context)
+    try:
+        found = crisis_detector.detect(_message_text(update))
+    except Exception as e:
+        logger.error(f"❌ Ошибка детектора кризиса: {e}")
+        return
+    if not found:
+        return
+
+    metrics.inc("crisis.detected")
+    logger.warning(f"🚨 Кризисное сообщение от пользователя {update.effective_user.id}")
+    user_data = getattr(context, 'user_data', None)
+    if user_data is not None:
+        # Следующие ответы ИИ этому пользователю идут вне очереди (ai_priority)
+        user_data['crisis_at'] = time.time()
+    try:
+        await send_crisis_help(update)
+    finally:
+        crisis_detector.record_response(time.perf_counter() - started)
+    raise ApplicationHandlerStop
+
+# Спад настроения (trends): сообщение не чаще раза в MOOD_DROP_NOTIFY_INTERVAL
+mood_drop_notified = LRUCache(maxsize=10000, ttl=MOOD_DROP_NOTIFY_INTERVAL)
+
+MOOD_DROP_TEXTS = {
+    'sudden': "💙 *Кажется, сейчас вам заметно хуже, чем обычно.*\n\n",
+    'decline': "💙 *Похоже, последние дни настроение постепенно снижается.*\n\n",
+}
+
+async def handle_mood_drop(bot, event):
+    """Обработчик спада настроения (trends.register_drop_hook): бережно предложить поддержку"""
+    telegram_id = event.get('telegram_id')
+    if telegram_id is None or mood_drop_notified.get(telegram_id):
+        return
+    mood_drop_notified.set(telegram_id, True)
+    
+    text = MOOD_DROP_TEXTS.get(event.get('kind'), MOOD_DROP_TEXTS['sudden']) + (
+        "Вы не обязаны справляться с этим в одиночку:\n"
+        "• 🧘 Упражнения — дыхание и релаксация\n"
+        "• 💬 Чат с ИИ — выговориться\n"
+        "• /crisis — телефоны экстренной помощи\n\n"
+        "Телефон доверия (бесплатно, 24/7): `8-800-2000-122`"
+    )
+    try:
+        await bot.send_message(
+            chat_id=telegram_id,
+            text=text,
+            reply_markup=get_crisis_keyboard(),
+            parse_mode='Markdown'
+        )
+        metrics.inc("mood_drop.notified")
+    except Exception as e:
+        logger.error(f"❌ Ошибка отправки сообщения о спаде настроения: {e}")
 
 async def handle_unknown(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Неизвестные команды"""
@@ -733,11 +1105,18 @@ __all__ = [
     'handle_ai_chat_button',
     'handle_exercises_button',
     'handle_stats_button',
+    'handle_stats_period',
+    'set_timezone_command',
+    'show_history',
+    'handle_history_more',
     'handle_settings_button',
     'handle_back_button',
     'log_mood_command',
     'start_chat',
     'show_stats',
     'handle_crisis_situation',
+    'handle_crisis_fast_lane',
+    'is_crisis_update',
+    'handle_mood_drop',
     'handle_unknown'
 ]
@@ -0,0 +1,126 @@
+"""
+Простые метрики процесса для MindMate Bot
+Счетчики, гистограммы и гейджи без внешних зависимостей
+"""
+
+import bisect
+import logging
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Optional, Sequence
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин по умолчанию (секунды)
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами и окном последних значений для перцентилей"""
+
+    def __init__(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS, window: int = 1024):
+        self.name = name
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self._recent = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        """Зарегистрировать значение"""
+        with self._lock:
+            self.counts[bisect.bisect_left(self.buckets, value)] += 1
+            self.count += 1
+            self.sum += value
+            self._recent.append(value)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Перцентиль по окну последних значений (q от 0 до 100)"""
+        with self._lock:
+            values = sorted(self._recent)
+        if not values:
+            return None
+        index = min(len(values) - 1, int(round(q / 100 * (len(values) - 1))))
+        return values[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Текущее состояние гистограммы"""
+        labels = [f"<={b}" for b in self.buckets] + [f">{self.buckets[-1]}"]
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'avg': round(self.sum / self.count, 6) if self.count else None,
+            'p50': self.percentile(50),
+            'p95': self.percentile(95),
+            'p99': self.percentile(99),
+            'buckets': dict(zip(labels, self.counts))
+        }
+
+
+class MetricsRegistry:
+    """Реестр метрик процесса"""
+
+    def __init__(self):
+        self._counters: Dict[str, int] = {}
+        self._histograms: Dict[str, Histogram] = {}
+        self._gauges: Dict[str, Callable[[], Any]] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name: str, value: int = 1):
+        """Увеличить счетчик"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def histogram(self, name: str, buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        """Получить (или создать) гистограмму"""
+        with self._lock:
+            if name not in self._histograms:
+                self._histograms[name] = Histogram(name, buckets)
+            return self._histograms[name]
+
+    def observe(self, name: str, value: float):
+        """Добавить значение в гистограмму"""
+        self.histogram(name).observe(value)
+
+    def gauge(self, name: str, fn: Callable[[], Any]):
+        """Зарегистрировать гейдж, значение которого вычисляется при чтении"""
+        with self._lock:
+            self._gauges[name] = fn
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Снимок всех метрик"""
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = dict(self._histograms)
+            gauges = dict(self._gauges)
+
+        gauge_values = {}
+        for name, fn in gauges.items():
+            try:
+                gauge_values[name] = fn()
+            except Exception as e:
+                gauge_values[name] = None
+                logger.debug(f"Ошибка чтения гейджа {name}: {e}")
+
+        return {
+            'counters': counters,
+            'gauges': gauge_values,
+            'histograms': {name: h.snapshot() for name, h in histograms.items()}
+        }
+
+    def log_summary(self):
+        """Вывести краткую сводку метрик в лог"""
+        snap = self.snapshot()
+        for name, value in sorted(snap['counters'].items()):
+            logger.info(f"📏 {name}: {value}")
+        for name, value in sorted(snap['gauges'].items()):
+            logger.info(f"📏 {name}: {value}")
+        for name, h in sorted(snap['histograms'].items()):
+            logger.info(f"📏 {name}: count={h['count']} avg={h['avg']} p95={h['p95']}")
+
+
+# Создаем глобальный экземпляр
+metrics = MetricsRegistry()
+
+__all__ = ['Histogram', 'MetricsRegistry', 'metrics', 'DEFAULT_BUCKETS']
@@ -1,15 +1,44 @@
+import os
 import re
 import json
+import hashlib
 import logging
-from datetime import datetime
-from typing import Dict, List, Any, Optional
+from itertools import chain
+from typing import Dict, List, Any, Iterable, Iterator, Optional
+
+from crisis_detector import CRISIS_KEYWORDS
+from metrics import metrics
+from text_matcher import LexiconMatcher, StemIndex
+from tokenizer import stem, tokenize
+from nlp_result import AnalysisResult, format_summary, topic_mask_bits, emotion_mask_bits
+from utils import LRUCache, normalize_text
 
 logger = logging.getLogger(__name__)
 
+try:
+    from config import settings
+    NLP_CACHE_SIZE = settings.NLP_CACHE_SIZE
+except Exception:
+    NLP_CACHE_SIZE = int(os.getenv("NLP_CACHE_SIZE", "10000"))
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+    logger.warning("⚠️ NumPy не установлен, analyze_many работает построчно")
+
+# Размер пачки для потокового пакетного анализа
+ANALYZE_BATCH_SIZE = 1000
+
 class SimpleNLPAnalyzer:
     """Упрощенный NLP анализатор без тяжелых зависимостей для Render"""
     
-    def __init__(self):
+    model_name = 'simple_render_analyzer_v1'
+    backend_name = 'simple'  # Имя в реестре nlp_backends (для процессов пула)
+    
+    def __init__(self, cache_size: Optional[int] = None):
         # Эмоциональные словари
         self.positive_words = [
             'хорошо', 'отлично', 'прекрасно', 'замечательно', 'рад', 'счастлив',
@@ -37,62 +66,421 @@ class SimpleNLPAnalyzer:
         }
         
         # Кризисные слова (триггеры)
-        self.crisis_keywords = [
-            'суицид', 'самоубийство', 'покончить', 'свести счеты', 'не хочу жить',
-            'все бессмысленно', 'конец', 'надоело жить', 'устал от жизни'
-        ]
+        self.crisis_keywords = list(CRISIS_KEYWORDS)
+        
+        # Эмоции и их маркеры
+        self.emotions_map = {
+            'радость': ['рад', 'счастлив', 'восторг', 'восхищение', 'весело'],
+            'грусть': ['грустно', 'печально', 'тоскливо', 'плакать', 'слезы'],
+            'гнев': ['злой', 'сердит', 'раздражен', 'бесит', 'ненавижу'],
+            'страх': ['боюсь', 'страшно', 'испуг', 'ужас', 'паника'],
+            'спокойствие': ['спокоен', 'умиротворен', 'тишина', 'мир', 'расслаблен']
+        }
+        
+        self.compile_lexicons()
+        
+        # Кэш результатов по хэшу нормализованного текста
+        cache_size = NLP_CACHE_SIZE if cache_size is None else cache_size
+        self._cache = LRUCache(maxsize=cache_size) if cache_size > 0 else None
+        if self._cache is not None:
+            metrics.gauge("nlp_cache.hits", lambda: self._cache.hits)
+            metrics.gauge("nlp_cache.misses", lambda: self._cache.misses)
+            metrics.gauge("nlp_cache.size", lambda: len(self._cache))
+    
+    def compile_lexicons(self):
+        """
+        Собрать все словари в индекс основ слов.
+        Кризисные слова дополнительно ищутся как подстроки: для них полнота
+        важнее точности ('суицид' должен находить и 'суицидальные').
+        Вызывать повторно после изменения словарей.
+        """
+        # Столбцы словаря: (вид, группа, слово) в порядке объявления
+        entries = [('positive', None, word) for word in self.positive_words]
+        entries += [('negative', None, word) for word in self.negative_words]
+        for topic_name, keywords in self.topics.items():
+            entries += [('topic', topic_name, keyword) for keyword in keywords]
+        entries += [('crisis', None, word) for word in self.crisis_keywords]
+        for emotion, keywords in self.emotions_map.items():
+            entries += [('emotion', emotion, keyword) for keyword in keywords]
+        
+        self._entries = entries
+        self._stem_index = StemIndex(
+            (word, column) for column, (_, _, word) in enumerate(entries)
+        ).compile()
+        self._crisis_matcher = LexiconMatcher(
+            (word, column) for column, (kind, _, word) in enumerate(entries) if kind == 'crisis'
+        ).compile()
+        
+        # Биты тем и эмоций в масках результата (см. nlp_features)
+        self._topic_bits = topic_mask_bits(self.topics)
+        self._emotion_bits = emotion_mask_bits(self.emotions_map)
+        unmapped = [name for name, bit in zip(chain(self.topics, self.emotions_map),
+                                              self._topic_bits + self._emotion_bits) if not bit]
+        if unmapped:
+            logger.warning(f"⚠️ Нет битов в nlp_features для: {', '.join(unmapped)}")
+        
+        if NUMPY_AVAILABLE:
+            self._build_lexicon_arrays()
+    
+    def _build_lexicon_arrays(self):
+        """Векторы-признаки столбцов словаря для пакетного анализа"""
+        kinds = np.array([kind for kind, _, _ in self._entries])
+        topic_index = {name: i for i, name in enumerate(self.topics)}
+        emotion_index = {name: i for i, name in enumerate(self.emotions_map)}
+        
+        self._col_positive = (kinds == 'positive').astype(np.float64)
+        self._col_negative = (kinds == 'negative').astype(np.float64)
+        self._col_crisis = (kinds == 'crisis').astype(np.float64)
+        self._col_topic = np.array(
+            [topic_index[group] if kind == 'topic' else -1 for kind, group, _ in self._entries],
+            dtype=np.int64
+        )
+        self._col_emotion = np.array(
+            [emotion_index[group] if kind == 'emotion' else -1 for kind, group, _ in self._entries],
+            dtype=np.int64
+        )
+    
+    def _match_lexicons(self, text: str) -> Dict[str, Any]:
+        """Все совпадения со словарями, разложенные по видам"""
+        return self._group_hits(self._hit_columns(text))
+    
+    def _hit_columns(self, text: str) -> List[int]:
+        """Столбцы словаря, найденные в тексте (по возрастанию)"""
+        columns = set(self._stem_index.match(text))
+        columns.update(self._crisis_matcher.match(text))
+        return sorted(columns)
+    
+    def _group_hits(self, columns: List[int]) -> Dict[str, Any]:
+        """Разложить найденные столбцы словаря по видам"""
+        hits = {'positive': [], 'negative': [], 'topic': {}, 'crisis': [], 'emotion': {}}
+        for column in columns:
+            kind, group, word = self._entries[column]
+            if group is None:
+                hits[kind].append(word)
+            else:
+                hits[kind].setdefault(group, []).append(word)
+        return hits
     
-    def analyze_text(self, text: str) -> Dict[str, Any]:
+    def analyze_text(self, text: str) -> AnalysisResult:
         """
         Простой анализ текста без ML моделей.
         Подходит для Render (не требует torch/transformers).
+        Результат неизменяемый и общий для одинаковых (после нормализации) текстов.
         """
         if not text or len(text.strip()) < 3:
-            return self._get_empty_result()
+            return EMPTY_RESULT
         
+        normalized = normalize_text(text)
+        if self._cache is None:
+            return self._analyze_normalized(normalized)
+        
+        key = self._cache_key(normalized)
+        cached = self._cache.get(key)
+        if cached is not None:
+            return cached
+        
+        result = self._analyze_normalized(normalized)
+        if result.success:
+            self._cache.set(key, result)
+        return result
+    
+    async def analyze_async(self, text: str) -> AnalysisResult:
+        """Анализ в пуле процессов (см. nlp_pool), не блокирует event loop"""
+        from nlp_pool import get_pool
+        return await get_pool(self).analyze(text)
+    
+    @staticmethod
+    def _cache_key(normalized: str) -> bytes:
+        return hashlib.blake2b(normalized.encode('utf-8'), digest_size=16).digest()
+    
+    def lookup(self, text: str) -> Optional[AnalysisResult]:
+        """Готовый результат без вычислений: для коротких текстов или из кэша"""
+        if not text or len(text.strip()) < 3:
+            return EMPTY_RESULT
+        if self._cache is None:
+            return None
+        return self._cache.get(self._cache_key(normalize_text(text)))
+    
+    def remember(self, text: str, result: AnalysisResult):
+        """Сохранить в кэш результат, посчитанный вне этого процесса"""
+        if self._cache is not None and result.success:
+            self._cache.set(self._cache_key(normalize_text(text)), result)
+    
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша анализа"""
+        return self._cache.get_stats() if self._cache is not None else {'size': 0, 'maxsize': 0}
+    
+    def clear_cache(self):
+        """Очистить кэш (например, после изменения словарей)"""
+        if self._cache is not None:
+            self._cache.clear()
+    
+    def _analyze_normalized(self, text_lower: str) -> AnalysisResult:
+        """Анализ уже нормализованного текста"""
         try:
-            text_lower = text.lower()
+            hits = self._match_lexicons(text_lower)
             
             # 1. Анализ тональности
-            sentiment = self._analyze_sentiment(text_lower)
-            
-            # 2. Определение тем
-            topics = self._extract_topics(text_lower)
-            
-            # 3. Уровень стресса
-            stress_level = self._calculate_stress_level(text_lower, sentiment)
-            
-            # 4. Проверка на кризис
-            is_crisis, crisis_words = self._check_crisis(text_lower)
+            sentiment = self._score_sentiment(text_lower, hits)
             
-            # 5. Эмоции
-            emotions = self._detect_emotions(text_lower)
+            # 2. Уровень стресса (кризисные слова повышают его)
+            stress_level = self._calculate_stress_level(text_lower, sentiment, bool(hits['crisis']))
             
-            result = {
-                'success': True,
-                'text_original': text,
-                'sentiment': sentiment,
-                'topics': topics,
-                'stress_level': stress_level,
-                'is_crisis': is_crisis,
-                'crisis_words': crisis_words,
-                'emotions': emotions,
-                'word_count': len(text.split()),
-                'analysis_time': datetime.utcnow().isoformat(),
-                'model': 'simple_render_analyzer_v1'
-            }
+            # 3. Темы и эмоции - битовые маски, найденные слова тем - для ленивого списка тем
+            topic_mask = 0
+            topic_hits = []
+            for name, bit in zip(self.topics, self._topic_bits):
+                found = hits['topic'].get(name)
+                if found:
+                    topic_mask |= bit
+                    topic_hits += [(name, word) for word in found]
+            emotion_mask = 0
+            for name, bit in zip(self.emotions_map, self._emotion_bits):
+                if name in hits['emotion']:
+                    emotion_mask |= bit
             
             logger.debug(f"NLP анализ: {sentiment['label']}, стресс: {stress_level}")
-            return result
+            return self._build_result(
+                text_lower, sentiment, stress_level, topic_mask, emotion_mask,
+                tuple(hits['crisis']), tuple(topic_hits)
+            )
             
         except Exception as e:
             logger.error(f"Ошибка NLP анализа: {e}")
             return self._get_error_result(str(e))
     
-    def _analyze_sentiment(self, text: str) -> Dict[str, Any]:
+    def _build_result(self, text: str, sentiment: Dict[str, Any], stress_level: int, topic_mask: int,
+                      emotion_mask: int, crisis_words: tuple, topic_hits: tuple) -> AnalysisResult:
+        """Итоговый результат анализа"""
+        return AnalysisResult(
+            success=True,
+            sentiment_label=sentiment['label'],
+            sentiment_score=sentiment['score'],
+            positive=sentiment['positive'],
+            negative=sentiment['negative'],
+            stress_level=stress_level,
+            topic_mask=topic_mask,
+            emotion_mask=emotion_mask,
+            crisis_words=crisis_words,
+            topic_hits=topic_hits,
+            word_count=len(text.split()),
+            model=self.model_name
+        )
+    
+    def analyze(self, text: str) -> AnalysisResult:
+        """Общий интерфейс бэкендов NLP (см. nlp_backends)"""
+        return self.analyze_text(text)
+    
+    def analyze_many(self, texts: Iterable[str], batch_size: int = ANALYZE_BATCH_SIZE) -> Iterator[AnalysisResult]:
+        """
+        Пакетный анализ. Принимает любой итерируемый источник (в том числе генератор)
+        и отдает результаты по одному, держа в памяти не больше одной пачки.
+        Результаты совпадают с analyze_text построчно.
+        """
+        batch = []
+        for text in texts:
+            batch.append(text)
+            if len(batch) >= batch_size:
+                yield from self._analyze_batch(batch)
+                batch = []
+        if batch:
+            yield from self._analyze_batch(batch)
+    
+    def _analyze_batch(self, texts: List[str]) -> List[AnalysisResult]:
+        """Анализ пачки через разреженную матрицу документ x словарь"""
+        if not NUMPY_AVAILABLE:
+            return [self.analyze_text(text) for text in texts]
+        
+        # Пакетный анализ не пополняет кэш, чтобы бэкфилл не вытеснял живые сообщения
+        try:
+            results: List[Optional[AnalysisResult]] = [None] * len(texts)
+            valid = []
+            for i, text in enumerate(texts):
+                if not text or len(text.strip()) < 3:
+                    results[i] = EMPTY_RESULT
+                else:
+                    valid.append(i)
+            if not valid:
+                return results
+            
+            lowered = [normalize_text(texts[i]) for i in valid]
+            n = len(valid)
+            
+            # Разреженная матрица в формате COO: строка - документ, столбец - слово словаря
+            rows, cols = self._batch_hits(lowered)
+            
+            positive = np.bincount(rows, weights=self._col_positive[cols], minlength=n).astype(np.int64)
+            negative = np.bincount(rows, weights=self._col_negative[cols], minlength=n).astype(np.int64)
+            crisis = np.bincount(rows, weights=self._col_crisis[cols], minlength=n) > 0
+            topic_counts = self._group_counts(rows, self._col_topic[cols], n, len(self.topics))
+            emotion_counts = self._group_counts(rows, self._col_emotion[cols], n, len(self.emotions_map))
+            exclamations = np.fromiter((text.count('!') for text in lowered), dtype=np.int64, count=n)
+            # После normalize_text слова разделены ровно одним пробелом
+            word_counts = [text.count(' ') + 1 for text in lowered]
+            
+            # Тональность
+            is_positive, is_negative, score, scored = self._batch_sentiment(lowered, positive, negative)
+            
+            # Уровень стресса по тем же правилам, что и _calculate_stress_level
+            stress = np.full(n, 5, dtype=np.int64)
+            stress += 2 * is_negative + (is_negative & (score > 0.7))
+            stress += 3 * crisis
+            stress += (negative > 3).astype(np.int64) + (negative > 5)
+            stress += exclamations > 2
+            stress = np.clip(stress, 1, 10)
+            
+            # Битовые маски тем и эмоций
+            topic_mask = (topic_counts > 0).astype(np.int64) @ np.array(self._topic_bits, dtype=np.int64)
+            emotion_mask = (emotion_counts > 0).astype(np.int64) @ np.array(self._emotion_bits, dtype=np.int64)
+            
+            # Дальше собираем результаты построчно, поэтому переходим к спискам Python
+            stress_list = stress.tolist()
+            topic_list = topic_mask.tolist()
+            emotion_list = emotion_mask.tolist()
+            
+            # Поля тональности для всех строк сразу (без совпадений - нейтрально, 0.5)
+            labels = np.where(scored & is_positive, 'POSITIVE',
+                              np.where(scored & is_negative, 'NEGATIVE', 'NEUTRAL')).tolist()
+            scores = [round(value, 2) for value in np.where(scored, score, 0.5).tolist()]
+            positive_out = np.where(scored, positive, 0).tolist()
+            negative_out = np.where(scored, negative, 0).tolist()
+            
+            # Слова тем и кризисные слова нужны только строкам, где они есть:
+            # выбираем их столбцы из матрицы, группы строк - по границам
+            topic_hits = self._batch_words(rows, cols, self._col_topic >= 0, n, with_group=True)
+            crisis_words = self._batch_words(rows, cols, self._col_crisis > 0, n)
+            
+            model = self.model_name
+            for k, i in enumerate(valid):
+                results[i] = AnalysisResult(
+                    success=True,
+                    sentiment_label=labels[k],
+                    sentiment_score=scores[k],
+                    positive=positive_out[k],
+                    negative=negative_out[k],
+                    stress_level=stress_list[k],
+                    topic_mask=topic_list[k],
+                    emotion_mask=emotion_list[k],
+                    crisis_words=crisis_words.get(k, ()),
+                    topic_hits=topic_hits.get(k, ()),
+                    word_count=word_counts[k],
+                    model=model
+                )
+            return results
+            
+        except Exception as e:
+            logger.error(f"Ошибка пакетного NLP анализа: {e}")
+            return [self.analyze_text(text) for text in texts]
+    
+    def _batch_hits(self, texts: List[str]) -> tuple:
+        """
+        Совпадения пачки со словарями: пары (строка, столбец) без повторов,
+        отсортированные как в _hit_columns. Основа и поиск по индексу - один
+        раз на каждое разное слово пачки, вхождения разворачиваются массивами
+        NumPy; фразы проверяются только там, где они могут начинаться, а
+        кризисные корни - одним проходом автомата по склеенной пачке.
+        """
+        n = len(texts)
+        token_lists = [tokenize(text) for text in texts]
+        lengths = np.fromiter(map(len, token_lists), dtype=np.int64, count=n)
+        
+        # Номер каждого слова пачки в ее словаре
+        tokens = list(chain.from_iterable(token_lists))
+        vocabulary = {token: i for i, token in enumerate(dict.fromkeys(tokens))}
+        token_ids = np.fromiter(map(vocabulary.__getitem__, tokens), dtype=np.int64, count=len(tokens))
+        token_rows = np.repeat(np.arange(n, dtype=np.int64), lengths)
+        
+        # Столбцы словаря для каждого разного слова (в формате CSR)
+        stems = [stem(token) for token in vocabulary]
+        word_columns = []
+        starts_phrase = np.zeros(len(stems), dtype=bool)
+        for word_id, word_stem in enumerate(stems):
+            columns, starts_phrase[word_id] = self._stem_index.word_tags(word_stem)
+            word_columns.append(columns)
+        counts = np.fromiter(map(len, word_columns), dtype=np.int64, count=len(stems))
+        flat_columns = np.fromiter(chain.from_iterable(word_columns), dtype=np.int64, count=int(counts.sum()))
+        word_starts = np.cumsum(counts) - counts
+        
+        # Вхождения слов с совпадениями -> пары (строка, столбец)
+        per_token = counts[token_ids]
+        matched = per_token > 0
+        per_token = per_token[matched]
+        rows = np.repeat(token_rows[matched], per_token)
+        first = np.repeat(word_starts[token_ids[matched]] - (np.cumsum(per_token) - per_token), per_token)
+        cols = flat_columns[first + np.arange(len(rows), dtype=np.int64)]
+        
+        # Фразы из нескольких слов: только позиции, с которых они начинаются
+        extra_rows, extra_cols = [], []
+        doc_starts = (np.cumsum(lengths) - lengths).tolist()
+        doc_stems = {}
+        for position in np.flatnonzero(starts_phrase[token_ids]).tolist():
+            row = int(token_rows[position])
+            if row not in doc_stems:
+                doc_stems[row] = [stems[w] for w in token_ids[doc_starts[row]:doc_starts[row] + lengths[row]].tolist()]
+            for column in self._stem_index.match_phrases_at(doc_stems[row], position - doc_starts[row]):
+                extra_rows.append(row)
+                extra_cols.append(column)
+        
+        # Кризисные корни как подстроки: перевод строки не входит ни в один корень,
+        # поэтому совпадение не может захватить два текста
+        sizes = np.fromiter((len(text) + 1 for text in texts), dtype=np.int64, count=n)
+        crisis_hits = self._crisis_matcher.match_positions("\n".join(texts))
+        if crisis_hits:
+            positions, columns = zip(*crisis_hits)
+            text_starts = np.cumsum(sizes) - sizes
+            extra_rows.extend((np.searchsorted(text_starts, positions, side='right') - 1).tolist())
+            extra_cols.extend(columns)
+        
+        if extra_rows:
+            rows = np.concatenate((rows, np.array(extra_rows, dtype=np.int64)))
+            cols = np.concatenate((cols, np.array(extra_cols, dtype=np.int64)))
+        
+        # Без повторов и по возрастанию (строка, столбец)
+        width = len(self._entries)
+        keys = np.unique(rows * width + cols)
+        return keys // width, keys % width
+    
+    def _batch_words(self, rows, cols, column_mask, n: int, with_group: bool = False) -> Dict[int, tuple]:
+        """Слова выбранных столбцов по строкам пачки (только строки, где они есть)"""
+        selected = column_mask[cols]
+        if not selected.any():
+            return {}
+        entries = self._entries
+        words: Dict[int, list] = {}
+        for row, column in zip(rows[selected].tolist(), cols[selected].tolist()):
+            _, group, word = entries[column]
+            words.setdefault(row, []).append((group, word) if with_group else word)
+        return {row: tuple(found) for row, found in words.items()}
+    
+    def _batch_sentiment(self, texts: List[str], positive, negative) -> tuple:
+        """
+        Тональность пачки по счетчикам словаря: (is_positive, is_negative, score, scored).
+        scored=False - совпадений нет, тональность нейтральная без оценки.
+        """
+        total = positive + negative
+        safe_total = np.maximum(total, 1)
+        positive_score = positive / safe_total
+        negative_score = negative / safe_total
+        is_positive = (total > 0) & (positive_score > negative_score)
+        is_negative = (total > 0) & (negative_score > positive_score)
+        score = np.where(is_positive, positive_score, np.where(is_negative, negative_score, 0.5))
+        return is_positive, is_negative, score, total > 0
+    
+    @staticmethod
+    def _group_counts(rows, groups, n: int, width: int):
+        """Матрица документ x группа (тема, эмоция) из разреженных совпадений"""
+        mask = groups >= 0
+        flat = rows[mask] * width + groups[mask]
+        return np.bincount(flat, minlength=n * width).reshape(n, width)
+    
+    def _score_sentiment(self, text: str, hits: Dict[str, Any]) -> Dict[str, Any]:
+        """Тональность текста; наследники заменяют словарную оценку моделью"""
+        return self._analyze_sentiment(hits)
+    
+    def _analyze_sentiment(self, hits: Dict[str, Any]) -> Dict[str, Any]:
         """Простой анализ тональности"""
-        positive_matches = sum(1 for word in self.positive_words if word in text)
-        negative_matches = sum(1 for word in self.negative_words if word in text)
+        positive_matches = len(hits['positive'])
+        negative_matches = len(hits['negative'])
         
         total_matches = positive_matches + negative_matches
         
@@ -119,29 +507,7 @@ class SimpleNLPAnalyzer:
             'negative': negative_matches
         }
     
-    def _extract_topics(self, text: str) -> List[Dict[str, Any]]:
-        """Извлечение тем"""
-        topics_found = []
-        
-        for topic_name, keywords in self.topics.items():
-            found_keywords = []
-            for keyword in keywords:
-                if keyword in text:
-                    found_keywords.append(keyword)
-            
-            if found_keywords:
-                confidence = min(1.0, len(found_keywords) * 0.3)
-                topics_found.append({
-                    'name': topic_name,
-                    'keywords_found': found_keywords,
-                    'confidence': round(confidence, 2)
-                })
-        
-        # Сортируем по уверенности
-        topics_found.sort(key=lambda x: x['confidence'], reverse=True)
-        return topics_found[:3]  # Возвращаем только 3 основные темы
-    
-    def _calculate_stress_level(self, text: str, sentiment: Dict[str, Any]) -> int:
+    def _calculate_stress_level(self, text: str, sentiment: Dict[str, Any], is_crisis: bool) -> int:
         """Расчет уровня стресса (1-10)"""
         base_level = 5
         
@@ -152,7 +518,6 @@ class SimpleNLPAnalyzer:
                 base_level += 1
         
         # Влияние кризисных слов
-        is_crisis, crisis_words = self._check_crisis(text)
         if is_crisis:
             base_level += 3
         
@@ -170,96 +535,34 @@ class SimpleNLPAnalyzer:
         # Ограничиваем диапазон 1-10
         return max(1, min(10, base_level))
     
-    def _check_crisis(self, text: str) -> tuple:
-        """Проверка на кризисные слова"""
-        found_words = []
-        for word in self.crisis_keywords:
-            if word in text:
-                found_words.append(word)
-        
-        return len(found_words) > 0, found_words
-    
-    def _detect_emotions(self, text: str) -> List[str]:
-        """Определение основных эмоций"""
-        emotions_map = {
-            'радость': ['рад', 'счастлив', 'восторг', 'восхищение', 'весело'],
-            'грусть': ['грустно', 'печально', 'тоскливо', 'плакать', 'слезы'],
-            'гнев': ['злой', 'сердит', 'раздражен', 'бесит', 'ненавижу'],
-            'страх': ['боюсь', 'страшно', 'испуг', 'ужас', 'паника'],
-            'спокойствие': ['спокоен', 'умиротворен', 'тишина', 'мир', 'расслаблен']
-        }
-        
-        detected = []
-        for emotion, keywords in emotions_map.items():
-            for keyword in keywords:
-                if keyword in text and emotion not in detected:
-                    detected.append(emotion)
-                    break
-        
-        return detected
-    
-    def _get_empty_result(self) -> Dict[str, Any]:
+    @staticmethod
+    def _get_empty_result() -> AnalysisResult:
         """Пустой результат"""
-        return {
-            'success': False,
-            'error': 'Текст слишком короткий',
-            'sentiment': {'label': 'NEUTRAL', 'score': 0.5},
-            'topics': [],
-            'stress_level': 5,
-            'is_crisis': False,
-            'crisis_words': [],
-            'emotions': []
-        }
+        return AnalysisResult.empty()
     
-    def _get_error_result(self, error: str) -> Dict[str, Any]:
+    def _get_error_result(self, error: str) -> AnalysisResult:
         """Результат с ошибкой"""
-        return {
-            'success': False,
-            'error': error,
-            'sentiment': {'label': 'ERROR', 'score': 0},
-            'topics': [],
-            'stress_level': 5,
-            'is_crisis': False,
-            'crisis_words': [],
-            'emotions': []
-        }
+        return AnalysisResult.failed(error)
     
-    def get_summary(self, analysis_result: Dict[str, Any]) -> str:
-        """Текстовое резюме анализа"""
-        if not analysis_result.get('success'):
-            return "Анализ не выполнен."
-        
-        parts = []
-        
-        # Тональность
-        sentiment = analysis_result['sentiment']
-        if sentiment['label'] == 'POSITIVE':
-            parts.append("📈 **Позитивный настрой**")
-        elif sentiment['label'] == 'NEGATIVE':
-            parts.append("📉 **Негативный настрой**")
-        else:
-            parts.append("📊 **Нейтральный настрой**")
-        
-        # Стресс
-        stress = analysis_result.get('stress_level', 5)
-        if stress >= 8:
-            parts.append(f"🔴 **Высокий стресс:** {stress}/10")
-        elif stress >= 6:
-            parts.append(f"🟡 **Средний стресс:** {stress}/10")
-        else:
-            parts.append(f"🟢 **Низкий стресс:** {stress}/10")
-        
-        # Темы
-        topics = analysis_result.get('topics', [])
-        if topics:
-            topic_names = [t['name'] for t in topics[:2]]
-            parts.append(f"🏷️ **Темы:** {', '.join(topic_names)}")
-        
-        # Кризис
-        if analysis_result.get('is_crisis'):
-            parts.append("🚨 **Обнаружены тревожные слова**")
-        
-        return "\n".join(parts)
+    def get_summary(self, analysis_result) -> str:
+        """Текстовое резюме анализа (AnalysisResult или словарь прежнего формата)"""
+        if isinstance(analysis_result, AnalysisResult):
+            return analysis_result.summary
+        return format_summary(
+            bool(analysis_result.get('success')),
+            analysis_result.get('sentiment', {}).get('label'),
+            analysis_result.get('stress_level', 5),
+            [t['name'] for t in analysis_result.get('topics', [])],
+            bool(analysis_result.get('is_crisis'))
+        )
+
+# Общий неизменяемый результат для пустых и слишком коротких текстов
+EMPTY_RESULT = AnalysisResult.empty()
+
 
-# Создаем глобальный экземпляр
-nlp_analyzer = SimpleNLPAnalyzer()
+def __getattr__(name: str):
+    """Глобальный экземпляр nlp_analyzer: бэкенд по NLP_MODEL, создается при первом обращении"""
+    if name == 'nlp_analyzer':
+        from nlp_backends import get_backend
+        return get_backend()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,87 @@
+"""
+Реестр NLP бэкендов для MindMate Bot
+Бэкенд выбирается настройкой NLP_MODEL и создается лениво при первом запросе,
+поэтому тяжелые зависимости невыбранных бэкендов не загружаются.
+Все бэкенды поддерживают общий интерфейс: analyze(text), analyze_many(texts),
+а также analyze_text и get_summary для совместимости.
+"""
+
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    NLP_MODEL = settings.NLP_MODEL
+except Exception:
+    NLP_MODEL = os.getenv("NLP_MODEL", "simple")
+
+DEFAULT_BACKEND = "simple"
+
+_factories: Dict[str, Callable[[], Any]] = {}
+_instances: Dict[str, Any] = {}
+_lock = threading.Lock()
+
+
+def register_backend(name: str):
+    """Декоратор регистрации фабрики бэкенда"""
+    def decorator(factory: Callable[[], Any]) -> Callable[[], Any]:
+        _factories[name] = factory
+        return factory
+    return decorator
+
+
+def available_backends() -> list:
+    """Имена зарегистрированных бэкендов"""
+    return sorted(_factories)
+
+
+def get_backend(name: Optional[str] = None) -> Any:
+    """
+    Получить экземпляр бэкенда (по умолчанию - из настройки NLP_MODEL).
+    Если бэкенд неизвестен или не загрузился, используется простой анализатор.
+    """
+    name = (name or NLP_MODEL or DEFAULT_BACKEND).lower()
+    with _lock:
+        if name in _instances:
+            return _instances[name]
+
+        factory = _factories.get(name)
+        if factory is None:
+            logger.warning(f"⚠️ NLP бэкенд '{name}' не найден, используем '{DEFAULT_BACKEND}'")
+            name, factory = DEFAULT_BACKEND, _factories[DEFAULT_BACKEND]
+            if name in _instances:
+                return _instances[name]
+
+        try:
+            backend = factory()
+        except Exception as e:
+            if name == DEFAULT_BACKEND:
+                raise
+            logger.error(f"❌ Ошибка загрузки NLP бэкенда '{name}': {e}, используем '{DEFAULT_BACKEND}'")
+            name = DEFAULT_BACKEND
+            backend = _instances.get(name) or _factories[name]()
+
+        _instances[name] = backend
+        logger.info(f"✅ NLP бэкенд: {name}")
+        return backend
+
+
+@register_backend("simple")
+def _simple_backend():
+    """Словарный анализатор без зависимостей"""
+    from nlp_analyzer import SimpleNLPAnalyzer
+    return SimpleNLPAnalyzer()
+
+
+@register_backend("hashed_linear")
+def _hashed_linear_backend():
+    """Линейный классификатор на хэшированных n-граммах (NumPy, веса в memmap)"""
+    from nlp_hashed import HashedLinearAnalyzer
+    return HashedLinearAnalyzer()
+
+
+__all__ = ['register_backend', 'get_backend', 'available_backends']
@@ -0,0 +1,90 @@
+"""
+Компактные признаки NLP анализа для хранения в mood_logs
+Тональность - код -1/0/1, стресс - число 1..10, темы и эмоции - битовые маски.
+Порядок битов фиксирован: новые темы и эмоции добавляются только в конец,
+иначе маски уже сохраненных записей будут прочитаны неверно.
+"""
+
+from typing import Any, Dict, Iterable, List, Optional
+
+# Биты тем (словарь topics анализатора)
+TOPIC_BITS = ('работа', 'семья', 'здоровье', 'финансы', 'учеба', 'отношения')
+
+# Биты эмоций (словарь emotions_map анализатора)
+EMOTION_BITS = ('радость', 'грусть', 'гнев', 'страх', 'спокойствие')
+
+# Коды тональности; MIXED - смешанные чувства без перевеса, хранится как нейтральная
+SENTIMENT_CODES = {'NEGATIVE': -1, 'NEUTRAL': 0, 'MIXED': 0, 'POSITIVE': 1}
+SENTIMENT_LABELS = {-1: 'NEGATIVE', 0: 'NEUTRAL', 1: 'POSITIVE'}
+
+# Колонки mood_logs с признаками
+FEATURE_COLUMNS = ('sentiment', 'stress_level', 'topic_mask', 'emotion_mask')
+
+
+def encode_mask(names: Iterable[str], vocabulary: tuple) -> int:
+    """Битовая маска по именам (неизвестные имена пропускаются)"""
+    mask = 0
+    for name in names:
+        if name in vocabulary:
+            mask |= 1 << vocabulary.index(name)
+    return mask
+
+
+def decode_mask(mask: Optional[int], vocabulary: tuple) -> List[str]:
+    """Имена по битовой маске в порядке словаря"""
+    if not mask:
+        return []
+    return [name for bit, name in enumerate(vocabulary) if mask & (1 << bit)]
+
+
+def topic_bit(name: str) -> int:
+    """Бит темы для фильтра topic_mask & bit"""
+    return 1 << TOPIC_BITS.index(name)
+
+
+def emotion_bit(name: str) -> int:
+    """Бит эмоции для фильтра emotion_mask & bit"""
+    return 1 << EMOTION_BITS.index(name)
+
+
+def mood_features(analysis: Optional[Dict[str, Any]]) -> Dict[str, Optional[int]]:
+    """
+    Колонки признаков по результату анализа (AnalysisResult или словарь).
+    Без анализа (оценка цифрой) все колонки NULL; отсутствующие в анализе поля - тоже NULL.
+    """
+    features = dict.fromkeys(FEATURE_COLUMNS)
+    if analysis is None:
+        return features
+    if hasattr(analysis, 'topic_mask'):
+        # AnalysisResult: маски уже посчитаны
+        features.update(
+            sentiment=SENTIMENT_CODES.get(analysis.sentiment_label),
+            stress_level=analysis.stress_level,
+            topic_mask=analysis.topic_mask,
+            emotion_mask=analysis.emotion_mask
+        )
+        return features
+    if not analysis:
+        return features
+
+    sentiment = analysis.get('sentiment')
+    label = sentiment.get('label') if hasattr(sentiment, 'get') else sentiment
+    features['sentiment'] = SENTIMENT_CODES.get(label)
+
+    stress = analysis.get('stress_level')
+    if isinstance(stress, (int, float)):
+        features['stress_level'] = max(1, min(10, int(stress)))
+
+    if 'topics' in analysis:
+        features['topic_mask'] = encode_mask(
+            (t.get('name') if hasattr(t, 'get') else t for t in analysis['topics']), TOPIC_BITS
+        )
+    if 'emotions' in analysis:
+        features['emotion_mask'] = encode_mask(analysis['emotions'], EMOTION_BITS)
+    return features
+
+
+__all__ = [
+    'TOPIC_BITS', 'EMOTION_BITS', 'SENTIMENT_CODES', 'SENTIMENT_LABELS', 'FEATURE_COLUMNS',
+    'encode_mask', 'decode_mask', 'topic_bit', 'emotion_bit', 'mood_features'
+]
@@ -0,0 +1,266 @@
+"""
+Линейный классификатор тональности на хэшированных n-граммах
+Признаки - основы слов (crc32, кэшируется) и пары соседних основ (смешивание
+хэшей соседей, векторно по всей пачке) в пространстве фиксированного размера.
+Веса - матрица float32 (dim + 1) x 3 в файле .npy, открытом через memmap:
+в память попадают только нужные строки.
+Темы, эмоции, стресс и кризисные слова по-прежнему считаются по словарям.
+
+Обучение: python nlp_hashed.py train data.csv [--epochs 5] [--out nlp_weights.npy]
+(CSV с колонками text,label; label - NEGATIVE / NEUTRAL / POSITIVE)
+"""
+
+import os
+import csv
+import zlib
+import logging
+import tempfile
+from functools import lru_cache
+from itertools import chain
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+import numpy as np
+
+from nlp_analyzer import SimpleNLPAnalyzer
+from tokenizer import stem, stem_tokens, tokenize
+from utils import normalize_text
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    NLP_WEIGHTS_PATH = settings.NLP_WEIGHTS_PATH
+    NLP_HASH_DIM = settings.NLP_HASH_DIM
+except Exception:
+    NLP_WEIGHTS_PATH = os.getenv("NLP_WEIGHTS_PATH", "")
+    NLP_HASH_DIM = int(os.getenv("NLP_HASH_DIM", str(2 ** 18)))
+
+# Относительный путь к весам считается от каталога модуля, а не от текущего
+# каталога процесса: бот и процессы пула должны открывать один и тот же файл
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+NLP_WEIGHTS_PATH = os.path.join(MODULE_DIR, NLP_WEIGHTS_PATH or "nlp_weights.npy")
+
+LABELS = ('NEGATIVE', 'NEUTRAL', 'POSITIVE')
+NEGATIVE, NEUTRAL, POSITIVE = range(len(LABELS))
+
+
+# Константы смешивания хэшей для биграмм
+BIGRAM_MULTIPLIER = 0x9E3779B1
+BIGRAM_SALT = 0x5BD1E995
+
+
+@lru_cache(maxsize=65536)
+def _stem_hash(word_stem: str) -> int:
+    """32-битный хэш основы (стабилен между процессами, в отличие от hash())"""
+    return zlib.crc32(word_stem.encode('utf-8'))
+
+
+def _unigram_index(word_stem: str, dim: int) -> int:
+    return _stem_hash(word_stem) % dim
+
+
+def _bigram_index(first: str, second: str, dim: int) -> int:
+    """Скалярная версия векторного смешивания из hash_batch"""
+    return ((_stem_hash(first) * BIGRAM_MULTIPLIER + _stem_hash(second)) ^ BIGRAM_SALT) % dim
+
+
+def hash_batch(texts: Sequence[str], dim: int) -> tuple:
+    """
+    Разреженная матрица документ x признак в формате (строки, столбцы):
+    униграммы основ, затем биграммы соседних основ одного документа.
+    """
+    stem_lists = [stem_tokens(text) for text in texts]
+    lengths = np.fromiter(map(len, stem_lists), dtype=np.int64, count=len(stem_lists))
+    unigram_rows = np.repeat(np.arange(len(stem_lists), dtype=np.int64), lengths)
+    hashes = np.fromiter(
+        map(_stem_hash, chain.from_iterable(stem_lists)), dtype=np.uint64, count=int(lengths.sum())
+    )
+
+    same_doc = unigram_rows[1:] == unigram_rows[:-1]
+    bigrams = (hashes[:-1] * np.uint64(BIGRAM_MULTIPLIER) + hashes[1:]) ^ np.uint64(BIGRAM_SALT)
+
+    rows = np.concatenate([unigram_rows, unigram_rows[1:][same_doc]])
+    cols = np.concatenate([hashes, bigrams[same_doc]]) % np.uint64(dim)
+    return rows, cols.astype(np.int64)
+
+
+def _logits(weights, rows, cols, n: int) -> np.ndarray:
+    """Линейная часть модели: сумма весов признаков документа + смещение"""
+    gathered = np.asarray(weights[cols], dtype=np.float64)
+    logits = np.empty((n, len(LABELS)), dtype=np.float64)
+    for label in range(len(LABELS)):
+        logits[:, label] = np.bincount(rows, weights=gathered[:, label], minlength=n)
+    logits += weights[weights.shape[0] - 1]
+    return logits
+
+
+def _softmax(logits: np.ndarray) -> np.ndarray:
+    exp = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+def seed_weights(dim: int, analyzer: Optional[SimpleNLPAnalyzer] = None) -> np.ndarray:
+    """
+    Начальные веса по словарям простого анализатора: модель работает и без обучения.
+    Биграммы с 'не' инвертируют тональность слова ('не хорошо' - негатив).
+    """
+    analyzer = analyzer or SimpleNLPAnalyzer(cache_size=0)
+    weights = np.zeros((dim + 1, len(LABELS)), dtype=np.float32)
+    weights[dim, NEUTRAL] = 0.5  # Без признаков - нейтрально
+
+    def add(phrase: str, label: int, value: float, negated_label: Optional[int] = None):
+        tokens = tokenize(phrase)
+        # Словарная форма - тоже ключ: стеммер иногда режет ее глубже словоформ
+        for stems in {tuple(stem(t) for t in tokens), tuple(tokens)}:
+            if len(stems) == 1:
+                weights[_unigram_index(stems[0], dim), label] += value
+                if negated_label is not None:
+                    weights[_bigram_index('не', stems[0], dim), negated_label] += value * 1.5
+            for a, b in zip(stems, stems[1:]):
+                weights[_bigram_index(a, b, dim), label] += value
+
+    for word in analyzer.positive_words:
+        add(word, POSITIVE, 2.0, negated_label=NEGATIVE)
+    for word in analyzer.negative_words:
+        add(word, NEGATIVE, 2.0, negated_label=POSITIVE)
+    for word in analyzer.crisis_keywords:
+        add(word, NEGATIVE, 3.0)
+    return weights
+
+
+def save_weights(path: str, weights: np.ndarray):
+    """
+    Записать веса атомарно: во временный файл рядом, затем os.replace.
+    Процессы пула, стартующие одновременно, могут строить веса параллельно -
+    ни один не должен открыть наполовину записанный файл.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".nlp_weights-", suffix=".npy", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            np.save(f, weights)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def load_weights(path: str, dim: int, analyzer: Optional[SimpleNLPAnalyzer] = None):
+    """
+    Открыть веса через memmap. Если файла нет - построить по словарям
+    и сохранить, чтобы следующие процессы открывали его без пересчета.
+    """
+    if os.path.exists(path):
+        weights = np.load(path, mmap_mode='r')
+        if weights.ndim != 2 or weights.shape[1] != len(LABELS):
+            raise ValueError(f"Неверная форма весов {weights.shape} в {path}")
+        logger.info(f"✅ Веса классификатора открыты: {path} ({weights.shape[0] - 1} признаков)")
+        return weights
+
+    logger.warning(f"⚠️ Файл весов {path} не найден, веса построены по словарям")
+    weights = seed_weights(dim, analyzer)
+    try:
+        save_weights(path, weights)
+        return np.load(path, mmap_mode='r')
+    except OSError as e:
+        logger.warning(f"⚠️ Не удалось сохранить веса ({e}), используем веса в памяти")
+        return weights
+
+
+class HashedLinearAnalyzer(SimpleNLPAnalyzer):
+    """Анализатор с тональностью от линейной модели на хэшированных n-граммах"""
+
+    model_name = 'hashed_linear_v1'
+    backend_name = 'hashed_linear'
+
+    def __init__(self, weights_path: Optional[str] = None, dim: Optional[int] = None,
+                 cache_size: Optional[int] = None):
+        super().__init__(cache_size)
+        self.weights_path = weights_path or NLP_WEIGHTS_PATH
+        self.weights = load_weights(self.weights_path, dim or NLP_HASH_DIM, self)
+        self.dim = self.weights.shape[0] - 1
+
+    def predict_proba(self, texts: Sequence[str]) -> np.ndarray:
+        """Вероятности NEGATIVE / NEUTRAL / POSITIVE для нормализованных текстов"""
+        rows, cols = hash_batch(texts, self.dim)
+        return _softmax(_logits(self.weights, rows, cols, len(texts)))
+
+    def _batch_sentiment(self, texts: List[str], positive, negative) -> tuple:
+        """Тональность пачки по модели; счетчики словаря остаются для расчета стресса"""
+        proba = self.predict_proba(texts)
+        best = proba.argmax(axis=1)
+        scored = np.ones(len(texts), dtype=bool)
+        return best == POSITIVE, best == NEGATIVE, proba.max(axis=1), scored
+
+    def _score_sentiment(self, text: str, hits: Dict[str, Any]) -> Dict[str, Any]:
+        positive, negative = len(hits['positive']), len(hits['negative'])
+        is_positive, is_negative, score, _ = self._batch_sentiment(
+            [text], np.array([positive]), np.array([negative])
+        )
+        return {
+            'label': 'POSITIVE' if is_positive[0] else 'NEGATIVE' if is_negative[0] else 'NEUTRAL',
+            'score': round(float(score[0]), 2),
+            'positive': positive,
+            'negative': negative
+        }
+
+
+def train(texts: Iterable[str], labels: Iterable[str], dim: int = NLP_HASH_DIM, epochs: int = 5,
+          lr: float = 0.5, batch_size: int = 256, init: Optional[np.ndarray] = None,
+          seed: int = 42) -> np.ndarray:
+    """Обучить многоклассовую логистическую регрессию мини-батчами SGD"""
+    weights = np.array(init if init is not None else seed_weights(dim), dtype=np.float32)
+    dim = weights.shape[0] - 1
+    texts = [normalize_text(text) for text in texts]
+    targets = np.array([LABELS.index(label.strip().upper()) for label in labels], dtype=np.int64)
+    rng = np.random.default_rng(seed)
+
+    for epoch in range(epochs):
+        order = rng.permutation(len(texts))
+        loss, correct = 0.0, 0
+        for start in range(0, len(order), batch_size):
+            batch = order[start:start + batch_size]
+            rows, cols = hash_batch([texts[i] for i in batch], dim)
+            proba = _softmax(_logits(weights, rows, cols, len(batch)))
+            index = np.arange(len(batch))
+            loss -= np.log(proba[index, targets[batch]] + 1e-12).sum()
+            correct += int((proba.argmax(axis=1) == targets[batch]).sum())
+
+            grad = proba
+            grad[index, targets[batch]] -= 1.0
+            grad /= len(batch)
+            np.add.at(weights, cols, (-lr * grad[rows]).astype(np.float32))
+            weights[dim] -= (lr * grad.sum(axis=0)).astype(np.float32)
+
+        logger.info(f"📚 Эпоха {epoch + 1}/{epochs}: loss={loss / len(order):.4f}, "
+                    f"accuracy={correct / len(order):.3f}")
+    return weights
+
+
+if __name__ == "__main__":
+    import argparse
+    import sys
+
+    logging.basicConfig(level=logging.INFO, format='[%(asctime)s] [%(levelname)s] %(name)s: %(message)s')
+    parser = argparse.ArgumentParser(description="Обучение классификатора тональности")
+    parser.add_argument("command", choices=["train"])
+    parser.add_argument("data", help="CSV с колонками text,label")
+    parser.add_argument("--out", default=NLP_WEIGHTS_PATH)
+    parser.add_argument("--dim", type=int, default=NLP_HASH_DIM)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--lr", type=float, default=0.5)
+    args = parser.parse_args()
+
+    with open(args.data, encoding="utf-8", newline="") as f:
+        rows = [(row["text"], row["label"]) for row in csv.DictReader(f)]
+    if not rows:
+        logger.error("❌ Нет данных для обучения")
+        sys.exit(1)
+
+    texts, labels = zip(*rows)
+    trained = train(texts, labels, dim=args.dim, epochs=args.epochs, lr=args.lr)
+    save_weights(args.out, trained)
+    logger.info(f"✅ Веса сохранены: {args.out}")
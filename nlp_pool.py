@@ -0,0 +1,242 @@
+"""
+Пул процессов для анализа текста
+Анализ выполняется в заранее прогретых процессах, которые один раз загружают
+словари и веса модели, поэтому тяжелый бэкенд не держит GIL event loop PTB.
+Запросы, пришедшие в пределах нескольких миллисекунд, уходят одной пачкой
+через analyze_many. Если пул выключен, перегружен или сломан, анализ
+выполняется в основном процессе.
+"""
+
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    NLP_POOL_WORKERS = settings.NLP_POOL_WORKERS
+    NLP_BATCH_WINDOW_MS = settings.NLP_BATCH_WINDOW_MS
+    NLP_BATCH_MAX = settings.NLP_BATCH_MAX
+    NLP_POOL_MAX_INFLIGHT = settings.NLP_POOL_MAX_INFLIGHT
+except Exception:
+    NLP_POOL_WORKERS = int(os.getenv("NLP_POOL_WORKERS", "2"))
+    NLP_BATCH_WINDOW_MS = float(os.getenv("NLP_BATCH_WINDOW_MS", "5"))
+    NLP_BATCH_MAX = int(os.getenv("NLP_BATCH_MAX", "64"))
+    NLP_POOL_MAX_INFLIGHT = int(os.getenv("NLP_POOL_MAX_INFLIGHT", "0"))
+
+# ============ КОД ПРОЦЕССА-ВОРКЕРА ============
+
+_worker_backend = None
+
+
+def _init_worker(backend_name: str):
+    """Инициализация процесса: загрузка бэкенда и прогрев"""
+    global _worker_backend
+    from nlp_backends import get_backend
+    _worker_backend = get_backend(backend_name)
+    _worker_backend.analyze_text("прогрев анализатора настроения")
+
+
+def _worker_ping(hold: float = 0.0) -> int:
+    """Задержка не дает одному процессу забрать все задачи прогрева"""
+    time.sleep(hold)
+    return os.getpid()
+
+
+def _worker_analyze(texts: List[str]) -> List[Any]:
+    """Пакетный анализ в процессе (AnalysisResult передается через pickle как есть)"""
+    return list(_worker_backend.analyze_many(texts))
+
+
+# ============ ПУЛ В ОСНОВНОМ ПРОЦЕССЕ ============
+
+class NLPProcessPool:
+    """Пул процессов с микро-пакетированием запросов одного бэкенда"""
+
+    def __init__(self, backend, workers: int = NLP_POOL_WORKERS,
+                 batch_window: float = NLP_BATCH_WINDOW_MS / 1000,
+                 max_batch: int = NLP_BATCH_MAX, max_inflight: int = NLP_POOL_MAX_INFLIGHT):
+        self.backend = backend
+        self.workers = workers
+        self.batch_window = batch_window
+        self.max_batch = max_batch
+        self.max_inflight = max_inflight or max(1, workers * 2)
+        self.enabled = workers > 0
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._flush_handle: Optional[asyncio.TimerHandle] = None
+        self._inflight = 0
+
+        metrics.gauge("nlp_pool.inflight", lambda: self._inflight)
+        metrics.histogram("nlp_pool.batch_size", buckets=(1, 2, 4, 8, 16, 32, 64, 128))
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        """
+        Процессы запускаются через spawn: fork процесса с потоками БД и PTB небезопасен.
+        Процесс загружает только этот модуль и бэкенд (_init_worker, _worker_analyze),
+        но spawn еще импортирует главный модуль как __mp_main__ - поэтому bot.py
+        настраивается и импортирует модули бота только под if __name__ == "__main__".
+        """
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.backend.backend_name,)
+            )
+        return self._executor
+
+    async def start(self):
+        """Запустить и прогреть все процессы заранее (вызывается при старте бота)"""
+        if not self.enabled:
+            logger.info("ℹ️ Пул NLP выключен, анализ в основном процессе")
+            return
+        loop = asyncio.get_running_loop()
+        try:
+            pids = await asyncio.gather(*(
+                loop.run_in_executor(self.executor, _worker_ping, 0.2) for _ in range(self.workers)
+            ))
+            logger.info(f"✅ Пул NLP запущен: {len(set(pids))} процессов ({self.backend.backend_name})")
+        except Exception as e:
+            logger.error(f"❌ Не удалось запустить пул NLP: {e}, анализ в основном процессе")
+            self._disable()
+
+    async def analyze(self, text: str) -> Any:
+        """Анализ текста: кэш, затем пачка в пуле процессов или в основном процессе"""
+        ready = self.backend.lookup(text)
+        if ready is not None:
+            return ready
+
+        loop = asyncio.get_running_loop()
+        if not self.enabled or self._inflight >= self.max_inflight:
+            metrics.inc("nlp_pool.inline")
+            return await loop.run_in_executor(None, self.backend.analyze_text, text)
+
+        future = loop.create_future()
+        self._pending.append((text, future))
+        if len(self._pending) >= self.max_batch:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.batch_window, self._flush)
+
+        result = await future
+        self.backend.remember(text, result)
+        return result
+
+    def _flush(self):
+        """Отправить накопленную пачку в пул"""
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        metrics.observe("nlp_pool.batch_size", len(batch))
+        if not self.enabled or self._inflight >= self.max_inflight:
+            metrics.inc("nlp_pool.inline")
+            self._resolve_inline(batch)
+            return
+
+        self._inflight += 1
+        try:
+            submitted = asyncio.get_running_loop().run_in_executor(
+                self.executor, _worker_analyze, [text for text, _ in batch]
+            )
+        except (BrokenProcessPool, RuntimeError) as e:
+            self._inflight -= 1
+            logger.error(f"❌ Пул NLP недоступен: {e}")
+            self._disable()
+            self._resolve_inline(batch)
+            return
+        submitted.add_done_callback(lambda done: self._on_batch_done(done, batch))
+
+    def _on_batch_done(self, done: asyncio.Future, batch: List[Tuple[str, asyncio.Future]]):
+        self._inflight -= 1
+        if done.cancelled() or done.exception() is not None:
+            error = "отменено" if done.cancelled() else done.exception()
+            logger.error(f"❌ Ошибка анализа в пуле NLP: {error}, считаем в основном процессе")
+            if isinstance(error, BrokenProcessPool):
+                self._disable()
+            self._resolve_inline(batch)
+            return
+
+        metrics.inc("nlp_pool.batches")
+        for (_, future), result in zip(batch, done.result()):
+            if not future.done():
+                future.set_result(result)
+
+    def _resolve_inline(self, batch: List[Tuple[str, asyncio.Future]]):
+        """
+        Посчитать пачку в основном процессе. Анализ идет в потоке по умолчанию,
+        а не в самом event loop: при перегруженном пуле иначе встали бы все апдейты.
+        """
+        waiting = [(text, future) for text, future in batch if not future.done()]
+        if not waiting:
+            return
+        texts = [text for text, _ in waiting]
+        submitted = asyncio.get_running_loop().run_in_executor(
+            None, lambda: list(self.backend.analyze_many(texts))
+        )
+        submitted.add_done_callback(lambda done: self._on_inline_done(done, waiting))
+
+    @staticmethod
+    def _on_inline_done(done: asyncio.Future, waiting: List[Tuple[str, asyncio.Future]]):
+        error = asyncio.CancelledError() if done.cancelled() else done.exception()
+        for index, (_, future) in enumerate(waiting):
+            if future.done():
+                continue
+            if error is not None:
+                future.set_exception(error)
+            else:
+                future.set_result(done.result()[index])
+
+    def _disable(self):
+        """Перейти на анализ в основном процессе"""
+        self.enabled = False
+        self.shutdown(wait=False)
+
+    def shutdown(self, wait: bool = True):
+        """Остановить процессы пула"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait, cancel_futures=True)
+            self._executor = None
+            logger.info("✅ Пул NLP остановлен")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            'enabled': self.enabled,
+            'workers': self.workers,
+            'inflight': self._inflight,
+            'pending': len(self._pending),
+            'batch_size': metrics.histogram("nlp_pool.batch_size").snapshot()
+        }
+
+
+_pools: Dict[str, NLPProcessPool] = {}
+
+
+def get_pool(backend) -> NLPProcessPool:
+    """Пул процессов для бэкенда (создается при первом обращении)"""
+    pool = _pools.get(backend.backend_name)
+    if pool is None:
+        pool = _pools[backend.backend_name] = NLPProcessPool(backend)
+    return pool
+
+
+def shutdown_pools(wait: bool = True):
+    """Остановить все пулы (вызывается при остановке бота)"""
+    for pool in _pools.values():
+        pool.shutdown(wait=wait)
+
+
+__all__ = ['NLPProcessPool', 'get_pool', 'shutdown_pools']
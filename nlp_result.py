@@ -0,0 +1,179 @@
+"""
+Результат NLP анализа
+Компактный неизменяемый объект со слотами вместо вложенного словаря: темы и
+эмоции - битовые маски (см. nlp_features), без копии текста и строки времени.
+Списки тем, резюме и словарь прежнего формата строятся лениво, только для тех,
+кому они нужны. Для совместимости объект поддерживает чтение как словарь:
+result['sentiment'], result.get('topics'), dict(result).
+"""
+
+import sys
+from collections.abc import Mapping
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from nlp_features import EMOTION_BITS, TOPIC_BITS, decode_mask
+
+# slots у dataclass - с Python 3.10; на 3.9 (runtime.txt) объект работает без них
+_SLOTS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# Сколько тем показывать (по убыванию уверенности)
+TOP_TOPICS = 3
+
+
+def topic_confidence(count: int) -> float:
+    """Уверенность темы по числу найденных ключевых слов"""
+    return round(min(1.0, count * 0.3), 2)
+
+
+def format_summary(success: bool, label: str, stress: int, topic_names: List[str], is_crisis: bool) -> str:
+    """Текстовое резюме анализа (общее для объекта и словаря прежнего формата)"""
+    if not success:
+        return "Анализ не выполнен."
+
+    parts = []
+
+    # Тональность
+    if label == 'POSITIVE':
+        parts.append("📈 **Позитивный настрой**")
+    elif label == 'NEGATIVE':
+        parts.append("📉 **Негативный настрой**")
+    else:
+        parts.append("📊 **Нейтральный настрой**")
+
+    # Стресс
+    if stress >= 8:
+        parts.append(f"🔴 **Высокий стресс:** {stress}/10")
+    elif stress >= 6:
+        parts.append(f"🟡 **Средний стресс:** {stress}/10")
+    else:
+        parts.append(f"🟢 **Низкий стресс:** {stress}/10")
+
+    # Темы
+    if topic_names:
+        parts.append(f"🏷️ **Темы:** {', '.join(topic_names[:2])}")
+
+    # Кризис
+    if is_crisis:
+        parts.append("🚨 **Обнаружены тревожные слова**")
+
+    return "\n".join(parts)
+
+
+@dataclass(frozen=True, **_SLOTS)
+class AnalysisResult(Mapping):
+    """Результат анализа одного текста"""
+
+    success: bool
+    sentiment_label: str
+    sentiment_score: float
+    positive: int = 0
+    negative: int = 0
+    stress_level: int = 5
+    topic_mask: int = 0  # биты TOPIC_BITS
+    emotion_mask: int = 0  # биты EMOTION_BITS
+    crisis_words: Tuple[str, ...] = ()
+    topic_hits: Tuple[Tuple[str, str], ...] = ()  # (тема, ключевое слово) в порядке словаря
+    word_count: int = 0
+    model: Optional[str] = None
+    error: Optional[str] = None
+
+    @property
+    def is_crisis(self) -> bool:
+        return bool(self.crisis_words)
+
+    @property
+    def emotions(self) -> List[str]:
+        return decode_mask(self.emotion_mask, EMOTION_BITS)
+
+    @property
+    def topic_names(self) -> List[str]:
+        """Названия основных тем по убыванию уверенности"""
+        return [topic['name'] for topic in self.topics_list]
+
+    @property
+    def topics_list(self) -> List[Dict[str, Any]]:
+        """Основные темы в прежнем формате: name, keywords_found, confidence"""
+        if not self.topic_hits:
+            return []
+        keywords: Dict[str, List[str]] = {}
+        for topic, word in self.topic_hits:
+            keywords.setdefault(topic, []).append(word)
+        order = sorted(keywords, key=lambda t: TOPIC_BITS.index(t) if t in TOPIC_BITS else len(TOPIC_BITS))
+        topics = [
+            {'name': name, 'keywords_found': keywords[name], 'confidence': topic_confidence(len(keywords[name]))}
+            for name in order
+        ]
+        topics.sort(key=lambda t: t['confidence'], reverse=True)
+        return topics[:TOP_TOPICS]
+
+    @property
+    def sentiment(self) -> Dict[str, Any]:
+        """Тональность в прежнем формате"""
+        if not self.success:
+            return {'label': self.sentiment_label, 'score': self.sentiment_score}
+        return {
+            'label': self.sentiment_label,
+            'score': self.sentiment_score,
+            'positive': self.positive,
+            'negative': self.negative
+        }
+
+    @property
+    def summary(self) -> str:
+        return format_summary(self.success, self.sentiment_label, self.stress_level,
+                              self.topic_names, self.is_crisis)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Словарь прежнего формата (без text_original и analysis_time)"""
+        return {key: self[key] for key in self}
+
+    # ---- Чтение как словаря (совместимость) ----
+
+    def _keys(self) -> Tuple[str, ...]:
+        return _SUCCESS_KEYS if self.success else _FAILURE_KEYS
+
+    def __getitem__(self, key: str) -> Any:
+        if key not in self._keys():
+            raise KeyError(key)
+        if key == 'topics':
+            return self.topics_list
+        if key == 'crisis_words':
+            return list(self.crisis_words)
+        return getattr(self, key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._keys())
+
+    def __len__(self) -> int:
+        return len(self._keys())
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._keys()
+
+    @classmethod
+    def empty(cls, error: str = 'Текст слишком короткий') -> 'AnalysisResult':
+        return cls(success=False, sentiment_label='NEUTRAL', sentiment_score=0.5, error=error)
+
+    @classmethod
+    def failed(cls, error: str) -> 'AnalysisResult':
+        return cls(success=False, sentiment_label='ERROR', sentiment_score=0, error=error)
+
+
+_SUCCESS_KEYS = ('success', 'sentiment', 'topics', 'stress_level', 'is_crisis',
+                 'crisis_words', 'emotions', 'word_count', 'model')
+_FAILURE_KEYS = ('success', 'error', 'sentiment', 'topics', 'stress_level', 'is_crisis',
+                 'crisis_words', 'emotions')
+
+
+def topic_mask_bits(names) -> List[int]:
+    """Бит каждой темы словаря анализатора (0 - темы нет в TOPIC_BITS)"""
+    return [1 << TOPIC_BITS.index(name) if name in TOPIC_BITS else 0 for name in names]
+
+
+def emotion_mask_bits(names) -> List[int]:
+    """Бит каждой эмоции словаря анализатора (0 - эмоции нет в EMOTION_BITS)"""
+    return [1 << EMOTION_BITS.index(name) if name in EMOTION_BITS else 0 for name in names]
+
+
+__all__ = ['AnalysisResult', 'format_summary', 'topic_confidence', 'topic_mask_bits', 'emotion_mask_bits']
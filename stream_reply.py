@@ -0,0 +1,144 @@
+"""
+Потоковый ответ в Telegram
+Первое сообщение отправляется, как только пришли первые слова ответа, затем
+оно дописывается через edit_message_text не чаще STREAM_EDIT_INTERVAL:
+Telegram ограничивает частоту правок (около одной в секунду на чат), при
+превышении отвечает RetryAfter - тогда правки пропускаются до конца паузы.
+Промежуточные правки - обычный текст (незакрытая разметка ломает HTML),
+итоговая - с форматированием.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Optional
+
+from telegram.error import BadRequest, RetryAfter, TelegramError
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    STREAM_EDIT_INTERVAL = settings.STREAM_EDIT_INTERVAL
+    STREAM_FIRST_CHARS = settings.STREAM_FIRST_CHARS
+except Exception:
+    STREAM_EDIT_INTERVAL = float(os.getenv("STREAM_EDIT_INTERVAL", "1.0"))
+    STREAM_FIRST_CHARS = int(os.getenv("STREAM_FIRST_CHARS", "20"))
+
+# Лимит Telegram - 4096 символов; во время генерации показываем начало ответа
+MAX_STREAM_CHARS = 3900
+
+# Признак того, что ответ еще пишется
+CURSOR = " ▌"
+
+
+class StreamingReply:
+    """Сообщение, которое дописывается по мере генерации ответа"""
+
+    def __init__(self, message, edit_interval: float = None, first_chars: int = None):
+        self.message = message  # входящее сообщение пользователя (для reply_text)
+        self.edit_interval = STREAM_EDIT_INTERVAL if edit_interval is None else edit_interval
+        self.first_chars = STREAM_FIRST_CHARS if first_chars is None else first_chars
+        self.sent = None  # отправленное сообщение бота
+        self.text = ""  # последний полученный текст
+        self._shown = ""
+        self._next_edit = 0.0
+        self._started = time.perf_counter()
+
+    async def update(self, text: str):
+        """Новый накопленный текст; отправка или правка - только если подошло время"""
+        text = text[:MAX_STREAM_CHARS]
+        self.text = text
+        now = time.perf_counter()
+
+        if self.sent is None:
+            if len(text.strip()) < self.first_chars:
+                return
+            try:
+                self.sent = await self.message.reply_text(text + CURSOR)
+            except TelegramError as e:
+                logger.warning(f"⚠️ Не удалось отправить начало ответа: {e}")
+                return
+            metrics.observe("stream.first_message_time", time.perf_counter() - self._started)
+            self._shown = text
+            self._next_edit = now + self.edit_interval
+            return
+
+        if now < self._next_edit or text == self._shown:
+            return
+        await self._edit(text + CURSOR)
+        self._shown = text
+
+    async def finish(self, text: str, parse_mode: Optional[str] = 'HTML', fallback_text: str = None):
+        """
+        Итоговый текст с форматированием. Если разметка не принята,
+        отправляется fallback_text без parse_mode.
+        """
+        try:
+            await self._deliver(text, parse_mode)
+        except BadRequest as e:
+            if 'not modified' in str(e).lower():
+                return
+            logger.warning(f"⚠️ Ответ не принят с разметкой: {e}")
+            try:
+                await self._deliver(fallback_text or text, None)
+            except TelegramError as e:
+                logger.error(f"❌ Не удалось отправить ответ без разметки: {e}")
+        except TelegramError as e:
+            logger.error(f"❌ Не удалось отправить ответ: {e}")
+
+    async def abort(self, note: str, send_if_empty: bool = True):
+        """
+        Прерванный ответ (превышено время, отмена): полученный текст
+        остается с пометкой. Ошибки Telegram не пробрасываются.
+        """
+        if self.sent is None and not send_if_empty:
+            return
+        text = f"{self.text}\n\n{note}" if self.text else note
+        try:
+            await self._deliver(text, None)
+        except Exception as e:
+            logger.warning(f"⚠️ Не удалось отметить прерванный ответ: {e}")
+
+    async def _deliver(self, text: str, parse_mode: Optional[str]):
+        """Итоговая правка (или новое сообщение, если поток не успел начаться)"""
+        if self.sent is None:
+            self.sent = await self.message.reply_text(text, parse_mode=parse_mode)
+            return
+        delay = self._next_edit - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        try:
+            await self.sent.edit_text(text, parse_mode=parse_mode)
+        except RetryAfter as e:
+            await asyncio.sleep(_retry_seconds(e))
+            await self.sent.edit_text(text, parse_mode=parse_mode)
+        metrics.inc("stream.edits")
+
+    async def _edit(self, text: str):
+        """Промежуточная правка; при RetryAfter правки откладываются"""
+        try:
+            await self.sent.edit_text(text)
+            metrics.inc("stream.edits")
+        except RetryAfter as e:
+            metrics.inc("stream.edits_throttled")
+            self._next_edit = time.perf_counter() + _retry_seconds(e)
+            return
+        except BadRequest as e:
+            if 'not modified' not in str(e).lower():
+                logger.warning(f"⚠️ Ошибка правки потокового ответа: {e}")
+        except TelegramError as e:
+            logger.warning(f"⚠️ Ошибка правки потокового ответа: {e}")
+        self._next_edit = time.perf_counter() + self.edit_interval
+
+
+def _retry_seconds(error: RetryAfter) -> float:
+    """Пауза из RetryAfter (int или timedelta в зависимости от версии PTB)"""
+    retry = error.retry_after
+    return retry.total_seconds() if hasattr(retry, 'total_seconds') else float(retry)
+
+
+__all__ = ['StreamingReply', 'STREAM_EDIT_INTERVAL']
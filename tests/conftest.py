@@ -0,0 +1,19 @@
+"""
+Общая настройка тестов: модули бота лежат в корне репозитория, а БД -
+встроенная SQLite во временном каталоге (переменные окружения читаются
+при импорте database, поэтому задаются до него).
+"""
+
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+os.environ.pop("DATABASE_URL", None)
+os.environ["SQLITE_PATH"] = os.path.join(tempfile.mkdtemp(prefix="mindmate-tests-"), "test.db")
+os.environ["DB_ENGINE_MODE"] = "sync"
+# Фоновый сброс очереди не должен вмешиваться в тесты - пачки сбрасываются явно
+os.environ["MOOD_FLUSH_INTERVAL"] = "3600"
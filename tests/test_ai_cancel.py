@@ -0,0 +1,141 @@
+"""Отмена ответа ИИ (кнопка Назад, остановка бота): набор текста стихает, в БД ничего не пишется"""
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+import bot
+import message_handlers
+import stream_reply
+from ai_tasks import AITaskManager
+from metrics import metrics
+
+STREAMED = "Начало ответа модели, пишу дальше"
+
+
+class _Sent:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_text(self, text, parse_mode=None):
+        self.edits.append(text)
+
+
+class _Message:
+    def __init__(self):
+        self.replies = []
+        self.sent = _Sent()
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return self.sent
+
+
+class _Chat:
+    """DeepSeek, который начал отвечать и завис"""
+
+    def __init__(self):
+        self.started = None  # asyncio.Event создается внутри цикла теста (Python 3.9)
+
+    def is_available(self):
+        return True
+
+    async def stream_response(self, user_text, context=None, on_text=None):
+        await on_text(STREAMED)
+        self.started.set()
+        await asyncio.Event().wait()
+
+
+class _Store:
+    """Память чата и слой БД: записи после закрытия считаются ошибкой"""
+
+    def __init__(self):
+        self.turns = []
+        self.closed = False
+        self.events = []
+
+    async def context(self, user_id):
+        return []
+
+    async def add_turn(self, user_id, user_message, ai_response):
+        self.turns.append((user_id, user_message, ai_response, self.closed))
+
+    async def flush(self):
+        self.events.append("flush")
+        return 0
+
+    async def close(self):
+        self.events.append("close")
+        self.closed = True
+
+
+class _Bot:
+    def __init__(self):
+        self.actions = 0
+
+    async def send_chat_action(self, chat_id, action):
+        self.actions += 1
+
+
+@pytest.fixture
+def env(monkeypatch):
+    tasks, chat, store, telegram = AITaskManager(typing_interval=0.01), _Chat(), _Store(), _Bot()
+    monkeypatch.setattr(message_handlers, "ai_tasks", tasks)
+    monkeypatch.setattr(message_handlers, "deepseek_chat", chat)
+    monkeypatch.setattr(message_handlers, "chat_memory", store)
+    monkeypatch.setattr(message_handlers, "DEEPSEEK_AVAILABLE", True)
+    monkeypatch.setattr(message_handlers, "DB_AVAILABLE", False)
+    monkeypatch.setattr(stream_reply, "STREAM_EDIT_INTERVAL", 0)
+    # Имена, которые bot.py импортирует только при запуске скрипта
+    for name, value in {"ai_tasks": tasks, "async_db": store, "clear_drop_hooks": lambda: None,
+                        "NLP_AVAILABLE": False, "DEEPSEEK_AVAILABLE": False, "metrics": metrics}.items():
+        monkeypatch.setattr(bot, name, value, raising=False)
+    return SimpleNamespace(tasks=tasks, chat=chat, store=store, bot=telegram)
+
+
+async def _start_reply(env, user_id):
+    env.chat.started = asyncio.Event()
+    message = _Message()
+    update = SimpleNamespace(message=message, effective_user=SimpleNamespace(id=user_id),
+                             effective_chat=SimpleNamespace(id=user_id))
+    context = SimpleNamespace(user_data={"in_ai_chat": True}, bot=env.bot)
+    await message_handlers.handle_ai_response(update, context, "как справиться с тревогой?")
+    await asyncio.wait_for(env.chat.started.wait(), 1)
+    assert env.tasks.is_busy(user_id) and env.bot.actions > 0
+    return update, context, env.tasks._tasks[user_id]
+
+
+async def _assert_typing_stopped(env):
+    actions = env.bot.actions
+    await asyncio.sleep(0.05)
+    assert env.bot.actions == actions
+
+
+def test_back_button_cancels_reply(env):
+    async def scenario():
+        update, context, task = await _start_reply(env, 900101)
+        await message_handlers.handle_back_button(update, context)
+        await asyncio.gather(task, return_exceptions=True)
+
+        assert task.cancelled() and not env.tasks.is_busy(900101)
+        assert context.user_data["in_ai_chat"] is False
+        await _assert_typing_stopped(env)
+        # Начатый ответ остается с пометкой, в память чата он не попадает
+        assert update.message.sent.edits[-1] == f"{STREAMED}\n\n⏹ Ответ остановлен."
+        assert env.store.turns == []
+
+    asyncio.run(scenario())
+
+
+def test_shutdown_cancels_reply_before_db_close(env):
+    async def scenario():
+        _, _, task = await _start_reply(env, 900102)
+        await bot.MindMateBot().on_shutdown(application=None)
+
+        assert task.cancelled() and env.tasks._tasks == {}
+        assert env.store.events == ["flush", "close"]
+        await _assert_typing_stopped(env)
+        assert env.store.turns == []
+
+    asyncio.run(scenario())
@@ -0,0 +1,165 @@
+"""Планировщик запросов к DeepSeek: приоритеты, круг, отмена, отказ "занято" """
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+from ai_scheduler import FairScheduler, SchedulerBusy, PRIORITY_CRISIS, PRIORITY_NORMAL
+from message_handlers import ai_priority, handle_crisis_fast_lane, mood_drop_notified
+
+
+async def _hold(scheduler, release, user_id=0, priority=PRIORITY_NORMAL):
+    """Занять единственное место до release"""
+    async with scheduler.slot(user_id, priority):
+        await release.wait()
+
+
+async def _queue(scheduler, requests, order):
+    """Поставить запросы в очередь по одному (порядок постановки фиксирован)"""
+    tasks = []
+    for name, user_id, priority in requests:
+        async def request(name=name, user_id=user_id, priority=priority):
+            async with scheduler.slot(user_id, priority):
+                order.append(name)
+        tasks.append(asyncio.ensure_future(request()))
+        await asyncio.sleep(0)
+    return tasks
+
+
+def test_crisis_waiter_goes_before_queued_normal():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, busy_wait=1000)
+        release, order = asyncio.Event(), []
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await asyncio.sleep(0)
+        tasks = await _queue(scheduler, [
+            ("normal-1", 1, PRIORITY_NORMAL),
+            ("normal-2", 2, PRIORITY_NORMAL),
+            ("crisis", 3, PRIORITY_CRISIS),
+        ], order)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["crisis", "normal-1", "normal-2"]
+
+
+def test_round_robin_between_users():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, busy_wait=1000)
+        release, order = asyncio.Event(), []
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await asyncio.sleep(0)
+        tasks = await _queue(scheduler, [
+            ("a1", 1, PRIORITY_NORMAL),
+            ("a2", 1, PRIORITY_NORMAL),
+            ("a3", 1, PRIORITY_NORMAL),
+            ("b1", 2, PRIORITY_NORMAL),
+            ("c1", 3, PRIORITY_NORMAL),
+        ], order)
+        release.set()
+        await asyncio.gather(holder, *tasks)
+        return order
+
+    # Пользователь с тремя запросами не задерживает остальных больше чем на один
+    assert asyncio.run(scenario()) == ["a1", "b1", "c1", "a2", "a3"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, busy_wait=1000)
+        release, order = asyncio.Event(), []
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await asyncio.sleep(0)
+        cancelled, kept = await _queue(scheduler, [
+            ("cancelled", 1, PRIORITY_NORMAL),
+            ("kept", 2, PRIORITY_NORMAL),
+        ], order)
+        assert scheduler.queue_depth == 2
+        cancelled.cancel()
+        await asyncio.sleep(0)
+        assert scheduler.queue_depth == 1
+
+        release.set()
+        await asyncio.gather(holder, kept)
+        assert cancelled.cancelled()
+        return order, scheduler.active
+
+    order, active = asyncio.run(scenario())
+    assert order == ["kept"] and active == 0
+
+
+def test_cancel_after_grant_passes_slot_on():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, busy_wait=1000)
+        order = []
+        holder = scheduler.slot(0)
+        await holder.__aenter__()
+        granted, waiting = await _queue(scheduler, [
+            ("granted", 1, PRIORITY_NORMAL),
+            ("waiting", 2, PRIORITY_NORMAL),
+        ], order)
+        # Место передано первому ожидающему, но его задача отменена до запуска
+        await holder.__aexit__(None, None, None)
+        granted.cancel()
+        await asyncio.gather(granted, waiting, return_exceptions=True)
+        return order, scheduler.active
+
+    order, active = asyncio.run(scenario())
+    assert order == ["waiting"] and active == 0
+
+
+def test_busy_rejection_spares_crisis():
+    async def scenario():
+        scheduler = FairScheduler(max_concurrency=1, busy_wait=1.0)
+        scheduler.service_time = 10.0
+        release = asyncio.Event()
+        holder = asyncio.ensure_future(_hold(scheduler, release))
+        await asyncio.sleep(0)
+
+        with pytest.raises(SchedulerBusy) as busy:
+            async with scheduler.slot(1):
+                pass
+        assert busy.value.estimated_wait > 1.0
+        assert scheduler.queue_depth == 0
+
+        crisis = asyncio.ensure_future(_hold(scheduler, asyncio.Event(), 2, PRIORITY_CRISIS))
+        await asyncio.sleep(0)
+        # Кризисный запрос встает в очередь, несмотря на оценку ожидания
+        assert scheduler.queue_depth == 1
+        crisis.cancel()
+        release.set()
+        await asyncio.gather(holder, crisis, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+
+def _chat_update(user_id):
+    message = SimpleNamespace(text="не хочу жить", reply_text=lambda *args, **kwargs: asyncio.sleep(0))
+    return SimpleNamespace(message=message, effective_message=message,
+                           effective_user=SimpleNamespace(id=user_id))
+
+
+def test_crisis_message_raises_ai_priority():
+    update = _chat_update(700001)
+    context = SimpleNamespace(user_data={})
+    assert ai_priority(update, context) == PRIORITY_NORMAL
+
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(handle_crisis_fast_lane(update, context))
+    assert ai_priority(update, context) == PRIORITY_CRISIS
+
+    context.user_data['crisis_at'] = time.time() - 10 ** 6
+    assert ai_priority(update, context) == PRIORITY_NORMAL
+
+
+def test_mood_drop_raises_ai_priority():
+    update = _chat_update(700002)
+    mood_drop_notified.set(700002, True)
+    try:
+        assert ai_priority(update, SimpleNamespace(user_data={})) == PRIORITY_CRISIS
+    finally:
+        mood_drop_notified.pop(700002)
@@ -0,0 +1,49 @@
+"""Кэш анализа текста по нормализованному тексту"""
+
+from nlp_analyzer import EMPTY_RESULT, SimpleNLPAnalyzer
+
+
+def test_normalized_variants_share_one_result():
+    analyzer = SimpleNLPAnalyzer(cache_size=10)
+    first = analyzer.analyze_text("Мне  очень грустно и тревожно")
+    # Регистр и пробелы не влияют на ключ: возвращается тот же объект из кэша
+    assert analyzer.analyze_text("  мне очень\nГРУСТНО и тревожно ") is first
+    stats = analyzer.get_cache_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (1, 1, 1)
+
+
+def test_different_text_is_not_confused():
+    analyzer = SimpleNLPAnalyzer(cache_size=10)
+    sad = analyzer.analyze_text("мне грустно")
+    happy = analyzer.analyze_text("мне радостно")
+    assert sad is not happy and sad.sentiment_label != happy.sentiment_label
+
+
+def test_cache_is_bounded_and_clearable():
+    analyzer = SimpleNLPAnalyzer(cache_size=2)
+    for text in ("первый текст", "второй текст", "третий текст"):
+        analyzer.analyze_text(text)
+    assert analyzer.get_cache_stats()["size"] == 2
+    assert analyzer.lookup("первый текст") is None
+    assert analyzer.lookup("третий текст") is not None
+
+    analyzer.clear_cache()
+    assert analyzer.lookup("третий текст") is None
+
+
+def test_lookup_and_remember():
+    analyzer = SimpleNLPAnalyzer(cache_size=10)
+    assert analyzer.lookup("ок") is EMPTY_RESULT
+    assert analyzer.lookup("еще не анализировали") is None
+
+    # Результат, посчитанный в процессе пула, попадает в кэш основного процесса
+    result = SimpleNLPAnalyzer(cache_size=0).analyze_text("еще не анализировали")
+    analyzer.remember("Еще не  анализировали", result)
+    assert analyzer.lookup("еще не анализировали") is result
+
+
+def test_disabled_cache():
+    analyzer = SimpleNLPAnalyzer(cache_size=0)
+    assert analyzer.lookup("какой-то текст") is None
+    assert analyzer.analyze_text("какой-то текст") == analyzer.analyze_text("какой-то текст")
+    assert analyzer.get_cache_stats() == {"size": 0, "maxsize": 0}
@@ -0,0 +1,81 @@
+"""Память диалога: обрезка по токенам и свертка в резюме"""
+
+import asyncio
+
+import chat_memory
+from chat_memory import ChatMemory, Conversation, estimate_tokens, make_turn
+
+
+def _turn(n, length=60):
+    question = f"Вопрос номер {n}. " + "подробности " * (length // 12)
+    return make_turn(question, f"Ответ номер {n}. Дальше длинное продолжение ответа.")
+
+
+def test_trim_keeps_latest_turns_within_budget():
+    conversation = Conversation(max_turns=10)
+    turns = [_turn(n) for n in range(6)]
+    for turn in turns:
+        conversation.append(turn)
+
+    budget = turns[-1].tokens + turns[-2].tokens
+    conversation.trim(budget)
+
+    assert list(conversation.turns) == turns[-2:]
+    # Вытесненные реплики свернуты по порядку: вопрос и первое предложение ответа
+    assert len(conversation.points) == 4
+    assert conversation.points[0].startswith("— ") and "Ответ номер 0." in conversation.points[0]
+    assert "Дальше" not in conversation.points[0]
+
+    messages = conversation.messages()
+    assert messages[0] == {"role": "system", "content": conversation.summary}
+    assert [m["role"] for m in messages[1:]] == ["user", "assistant"] * 2
+
+
+def test_full_buffer_folds_oldest_turn():
+    conversation = Conversation(max_turns=2)
+    for n in range(3):
+        conversation.append(_turn(n))
+    assert [t.user_message.split(".")[0] for t in conversation.turns] == ["Вопрос номер 1", "Вопрос номер 2"]
+    assert len(conversation.points) == 1 and "Ответ номер 0." in conversation.points[0]
+
+
+def test_summary_is_bounded_and_drops_oldest_points(monkeypatch):
+    monkeypatch.setattr(chat_memory, "CHAT_SUMMARY_TOKENS", 120)
+    conversation = Conversation(max_turns=1)
+    for n in range(30):
+        conversation.append(_turn(n, length=300))
+
+    assert conversation.summary_tokens <= 120
+    assert conversation.summary_tokens == estimate_tokens(conversation.summary)
+    assert "Ответ номер 28." in conversation.points[-1]
+    assert all("Ответ номер 0." not in point for point in conversation.points)
+
+
+class _Store:
+    def __init__(self, rows):
+        self.rows = rows
+        self.saved = []
+
+    async def get_chat_history(self, user_id, limit):
+        return self.rows[-limit:]
+
+    async def add_chat_turn(self, user_id, user_message, ai_response):
+        self.saved.append((user_id, user_message, ai_response))
+
+
+def test_context_loads_history_and_respects_budget():
+    rows = [{"user_message": _turn(n).user_message, "ai_response": _turn(n).ai_response} for n in range(8)]
+    store = _Store(rows)
+    memory = ChatMemory(store=store, max_turns=4, context_tokens=chat_memory.CHAT_SUMMARY_TOKENS + 60)
+
+    async def scenario():
+        messages = await memory.context(1)
+        await memory.add_turn(1, "новый вопрос", "новый ответ")
+        return messages
+
+    messages = asyncio.run(scenario())
+    assert messages[0]["role"] == "system"
+    turns_tokens = sum(estimate_tokens(m["content"]) for m in messages[1:])
+    assert 0 < turns_tokens <= 60
+    assert messages[-2]["content"] == rows[-1]["user_message"]
+    assert store.saved == [(1, "новый вопрос", "новый ответ")]
@@ -0,0 +1,21 @@
+"""Настройки БД из .env доходят до database"""
+
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_database_settings_come_from_env_file(tmp_path):
+    (tmp_path / ".env").write_text(
+        f"SQLITE_PATH={tmp_path / 'env.db'}\nSTATS_CACHE_TTL=42\nMOOD_BATCH_SIZE=7\nDB_CALL_TIMEOUT=3\n"
+    )
+    env = {k: v for k, v in os.environ.items()
+           if k not in ("SQLITE_PATH", "STATS_CACHE_TTL", "MOOD_BATCH_SIZE", "DB_CALL_TIMEOUT")}
+    env["PYTHONPATH"] = ROOT
+    code = ("import database as d; "
+            "print(d.SQLITE_PATH, d.STATS_CACHE_TTL, d.MOOD_BATCH_SIZE, d.DB_CALL_TIMEOUT, d.DATABASE_URL)")
+    output = subprocess.run([sys.executable, "-c", code], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert output == [str(tmp_path / "env.db"), "42.0", "7", "3.0", f"sqlite:///{tmp_path / 'env.db'}"]
@@ -0,0 +1,52 @@
+"""Экстренная проверка: правленые сообщения и время от получения обновления"""
+
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+from message_handlers import handle_crisis_fast_lane, is_crisis_update
+from metrics import metrics
+from update_processor import PerUserUpdateProcessor
+
+
+def _edited_update(text, replies):
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    message = SimpleNamespace(text=text, reply_text=reply_text)
+    # У правленого сообщения update.message = None
+    return SimpleNamespace(message=None, effective_message=message,
+                           effective_user=SimpleNamespace(id=42))
+
+
+def test_edited_crisis_message_gets_help():
+    replies = []
+    update = _edited_update("не хочу жить", replies)
+    assert is_crisis_update(update)
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(handle_crisis_fast_lane(update, SimpleNamespace()))
+    assert len(replies) == 1 and "8-800-2000-122" in replies[0]
+
+
+def test_response_time_counts_from_receipt():
+    async def scenario():
+        processor = PerUserUpdateProcessor(4, is_urgent=is_crisis_update)
+        context = SimpleNamespace(application=SimpleNamespace(update_processor=processor))
+        update = _edited_update("думаю о самоубийстве", [])
+
+        async def dispatch():
+            # Задержка до обработчика (другие группы, ожидание) входит в время ответа
+            time.sleep(0.05)
+            try:
+                await handle_crisis_fast_lane(update, context)
+            except ApplicationHandlerStop:
+                pass
+
+        before = metrics.snapshot()['histograms']['crisis.time_to_response']['sum']
+        await processor.process_update(update, dispatch())
+        return metrics.snapshot()['histograms']['crisis.time_to_response']['sum'] - before
+
+    assert asyncio.run(scenario()) >= 0.05
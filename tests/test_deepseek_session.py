@@ -0,0 +1,75 @@
+"""Общая сессия DeepSeek: создается один раз, соединения переиспользуются"""
+
+import asyncio
+
+from aiohttp import web
+
+from deepseek_chat import DeepSeekChatRender
+
+
+def test_start_is_idempotent_and_close_resets():
+    async def scenario():
+        client = DeepSeekChatRender()
+        await client.start()
+        session = client._session
+        await client.start()
+        assert client._session is session
+
+        await client.close()
+        assert session.closed and client._session is None
+        # Повторное закрытие не падает
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+def test_session_is_created_lazily_and_recreated_after_close():
+    async def scenario():
+        client = DeepSeekChatRender()
+        assert client._session is None
+        session = await client._get_session()
+        assert await client._get_session() is session
+
+        await session.close()
+        fresh = await client._get_session()
+        assert fresh is not session and not fresh.closed
+        await client.close()
+
+    asyncio.run(scenario())
+
+
+async def _serve(peers):
+    async def completions(request):
+        peers.append(request.transport.get_extra_info("peername"))
+        return web.json_response({"choices": [{"message": {"content": "Привет"}}], "model": "test"})
+
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", completions)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/v1/chat/completions"
+
+
+def test_requests_reuse_one_session_and_connection():
+    async def scenario():
+        peers = []
+        runner, url = await _serve(peers)
+        client = DeepSeekChatRender()
+        client.api_key, client.api_url = "test", url
+        try:
+            await client.start()
+            session = client._session
+            results = [await client.get_response("привет") for _ in range(3)]
+            assert client._session is session
+        finally:
+            await client.close()
+            await runner.cleanup()
+        return results, peers
+
+    results, peers = asyncio.run(scenario())
+    assert all(result["success"] for result in results)
+    # Одно TCP-соединение из пула keep-alive на все запросы
+    assert len(peers) == 3 and len(set(peers)) == 1
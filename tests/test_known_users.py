@@ -0,0 +1,55 @@
+"""Кэш известных пользователей заполняется только после коммита"""
+
+import asyncio
+
+import pytest
+
+import database
+from database import known_users, user_timezones
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def _failing_mood_log(*args, **kwargs):
+    raise RuntimeError("ошибка вставки mood_logs")
+
+
+def test_failed_record_mood_does_not_cache_new_user(db, monkeypatch):
+    telegram_id = 800201
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "_add_mood_log_tx", _failing_mood_log)
+        result = db.record_mood({"id": telegram_id, "username": "rollback"}, 5, "запись")
+    assert result["user_id"] is None
+    assert known_users.get(telegram_id) is None
+
+    # Пользователь откатился вместе с записью: повторная запись создает его заново
+    result = db.record_mood({"id": telegram_id, "username": "rollback"}, 5, "запись")
+    assert result["user_id"] is not None
+    assert known_users.get(telegram_id)[0] == result["user_id"]
+    assert user_timezones.get(result["user_id"]) is not None
+
+
+def test_async_failed_record_mood_does_not_cache_new_user(db, monkeypatch):
+    telegram_id = 800202
+
+    async def scenario():
+        manager = database.AsyncDatabaseManager(database.DATABASE_URL)
+        assert await manager.init_db()
+        try:
+            with monkeypatch.context() as patch:
+                patch.setattr(database, "_add_mood_log_tx", _failing_mood_log)
+                failed = await manager.record_mood({"id": telegram_id}, 4, "запись")
+            assert failed["user_id"] is None
+            assert known_users.get(telegram_id) is None
+
+            user = await manager.add_user(telegram_id)
+            assert known_users.get(telegram_id)[0] == user["id"]
+        finally:
+            await manager.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,69 @@
+"""Агрегаты настроения пользователя обновляются при записи, без пересчета истории"""
+
+import pytest
+
+import database
+from database import AGG_RECENT_SIZE
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def _scan(db, user_id):
+    with db.get_db_session() as session:
+        return database._scan_user_stats_tx(session, user_id)
+
+
+def test_aggregates_follow_queued_and_direct_writes(db):
+    # Новый пользователь: пользователь и первая запись - одной транзакцией
+    first = db.record_mood({"id": 800301, "first_name": "Agg"}, 4, "первая")
+    user_id = first["user_id"]
+    assert first["queued"] is False
+
+    # Дальше - через очередь, включая запись без оценки
+    for score, text in [(8, "вторая"), (None, "без оценки"), (6, "третья"),
+                        (2, "четвертая"), (9, "пятая"), (7, "шестая")]:
+        db.add_mood_log(user_id, score, text)
+    stats = db.get_user_stats(user_id)
+
+    scores = [4, 8, 6, 2, 9, 7]
+    assert stats["total_records"] == 7
+    assert stats["avg_mood"] == pytest.approx(sum(scores) / len(scores))
+    assert (stats["min_mood"], stats["max_mood"]) == (2, 9)
+    assert len(stats["recent_logs"]) == AGG_RECENT_SIZE
+    assert stats["recent_logs"][0]["message"] == "шестая"
+    assert stats["trend"]["mood_ewma"] is not None
+
+    # Совпадает с подсчетом по mood_logs
+    scan = _scan(db, user_id)
+    assert stats["total_records"] == scan["total_records"]
+    assert stats["avg_mood"] == pytest.approx(scan["avg_mood"])
+    assert stats["recent_logs"] == scan["recent_logs"][:AGG_RECENT_SIZE]
+
+
+def test_rebuild_matches_incremental(db):
+    user_id = db.add_user(800302, "rebuild", "Rebuild")["id"]
+    for score in [5, 3, 7, None, 6]:
+        db.add_mood_log(user_id, score, f"запись {score}")
+    incremental = db.get_user_stats(user_id)
+
+    db.rebuild_mood_aggregates()
+    assert db.get_user_stats(user_id) == incremental
+
+
+def test_stats_without_aggregate_row_fall_back_to_scan(db):
+    user_id = db.add_user(800303, "scan", "Scan")["id"]
+    db.add_mood_log(user_id, 5, "запись")
+    db.flush()
+    with db.get_db_session() as session:
+        session.query(database.UserMoodAggregate).filter(
+            database.UserMoodAggregate.user_id == user_id
+        ).delete()
+    database.stats_cache.invalidate(user_id)
+
+    stats = db.get_user_stats(user_id)
+    assert stats["total_records"] == 1 and stats["avg_mood"] == 5.0
@@ -0,0 +1,112 @@
+"""Keyset-пагинация истории настроения"""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from message_handlers import handle_history_more
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def _insert(db, user_id, created_at, count, label):
+    rows = []
+    for n in range(count):
+        row = database._mood_log_row(user_id, 5, f"{label}-{n}")
+        row["created_at"] = created_at
+        rows.append(row)
+    with db.get_db_session() as session:
+        database._flush_mood_logs_tx(session, rows)
+
+
+def _pages(db, user_id, limit, before=None):
+    pages = []
+    while True:
+        page = db.iter_mood_history(user_id, before=before, limit=limit)
+        pages.append([item["message"] for item in page["items"]])
+        before = page["next_before"]
+        if before is None:
+            return pages
+
+
+def test_pages_split_exactly_and_equal_timestamps_are_not_lost(db):
+    user_id = db.add_user(800501, "history", "History")["id"]
+    now = datetime.utcnow().replace(microsecond=0)
+    _insert(db, user_id, now - timedelta(hours=1), 3, "old")
+    # Пять записей с одинаковым created_at: порядок между ними задает id
+    _insert(db, user_id, now, 5, "same")
+
+    pages = _pages(db, user_id, limit=2)
+    assert [len(page) for page in pages] == [2, 2, 2, 2]
+    flat = [message for page in pages for message in page]
+    assert flat == ["same-4", "same-3", "same-2", "same-1", "same-0", "old-2", "old-1", "old-0"]
+
+    # Размер страницы, кратный числу записей: последняя страница без курсора
+    pages = _pages(db, user_id, limit=4)
+    assert [len(page) for page in pages] == [4, 4]
+
+
+def test_new_records_do_not_shift_next_page(db):
+    user_id = db.add_user(800502, "history", "History")["id"]
+    _insert(db, user_id, datetime.utcnow() - timedelta(minutes=5), 4, "before")
+    first = db.iter_mood_history(user_id, limit=2)
+
+    db.add_mood_log(user_id, 7, "новая")
+    second = db.iter_mood_history(user_id, before=first["next_before"], limit=2)
+    assert [item["message"] for item in second["items"]] == ["before-1", "before-0"]
+
+
+def test_stale_cursor_continues_after_deleted_row(db):
+    user_id = db.add_user(800503, "history", "History")["id"]
+    _insert(db, user_id, datetime.utcnow() - timedelta(minutes=5), 4, "row")
+    first = db.iter_mood_history(user_id, limit=2)
+    with db.get_db_session() as session:
+        session.query(database.MoodLog).filter(database.MoodLog.id == first["items"][-1]["id"]).delete()
+
+    second = db.iter_mood_history(user_id, before=first["next_before"], limit=2)
+    assert [item["message"] for item in second["items"]] == ["row-1", "row-0"]
+    assert second["next_before"] is None
+
+
+@pytest.mark.parametrize("cursor", ["|", "мусор", "2024-01-01T00:00:00", "2024-13-01T00:00:00|5",
+                                    "2024-01-01T00:00:00|abc"])
+def test_malformed_cursor_returns_empty_page(db, cursor):
+    user_id = db.add_user(800504, "history", "History")["id"]
+    db.add_mood_log(user_id, 5, "запись")
+    page = db.iter_mood_history(user_id, before=cursor, limit=5)
+    assert page == {"items": [], "next_before": None}
+
+
+def test_cursor_with_timezone_is_normalized():
+    created_at, log_id = database._decode_cursor("2024-01-01T03:00:00+03:00|7")
+    assert (created_at, log_id) == (datetime(2024, 1, 1), 7)
+    assert database._decode_cursor(database._encode_cursor(datetime(2024, 1, 1, 5), 9)) == (datetime(2024, 1, 1, 5), 9)
+
+
+def test_history_more_button_with_bad_cursor(db):
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    async def answer(*args, **kwargs):
+        pass
+
+    async def edit_message_reply_markup(**kwargs):
+        pass
+
+    query = SimpleNamespace(data="history_more:не курсор", answer=answer,
+                            edit_message_reply_markup=edit_message_reply_markup,
+                            message=SimpleNamespace(reply_text=reply_text))
+    update = SimpleNamespace(callback_query=query,
+                             effective_user=SimpleNamespace(id=800505, username=None, first_name="H"))
+    asyncio.run(handle_history_more(update, SimpleNamespace(user_data={})))
+    assert replies == ["📜 Записей больше нет."]
@@ -0,0 +1,74 @@
+"""Запросы по mood_logs идут по единственному индексу (user_id, created_at)"""
+
+from contextlib import contextmanager
+
+import pytest
+from sqlalchemy import event, inspect, text
+
+import database
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+@contextmanager
+def _mood_selects(db):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith("SELECT") and "FROM mood_logs" in statement:
+            seen.append((statement, parameters))
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _plan(db, statement, parameters):
+    with db.engine.connect() as conn:
+        cursor = conn.connection.cursor()
+        cursor.execute(f"EXPLAIN QUERY PLAN {statement}", parameters)
+        return " | ".join(row[-1] for row in cursor.fetchall())
+
+
+def test_mood_logs_has_one_user_index(db):
+    names = {ix["name"] for ix in inspect(db.engine).get_indexes("mood_logs")}
+    assert "ix_mood_logs_user_created" in names
+    assert not {"ix_mood_logs_user_id", "ix_mood_logs_user_features"} & names
+
+
+@pytest.mark.parametrize("period", ["week", "all"])
+def test_history_and_reports_use_composite_index(db, period):
+    user_id = db.add_user(801801, "ix", "IX")["id"]
+    db.add_mood_log(user_id, 4, "тревога на работе", analysis={
+        "sentiment": "NEGATIVE", "stress_level": 7, "topics": ["работа"], "emotions": ["тревога"]
+    })
+    db.flush()
+
+    with _mood_selects(db) as seen:
+        db.iter_mood_history(user_id, limit=5)
+        db.get_topic_stats(user_id, period)
+        db.get_stress_trend(user_id, period)
+    assert len(seen) >= 3
+    for statement, parameters in seen:
+        plan = _plan(db, statement, parameters)
+        assert "USING INDEX ix_mood_logs_user_created" in plan or \
+            "USING COVERING INDEX ix_mood_logs_user_created" in plan, plan
+
+
+def test_migration_drops_obsolete_indexes(db):
+    with db.engine.begin() as conn:
+        conn.execute(text("CREATE INDEX ix_mood_logs_user_id ON mood_logs (user_id)"))
+        conn.execute(text(
+            "CREATE INDEX ix_mood_logs_user_features ON mood_logs "
+            "(user_id, created_at, sentiment, stress_level, topic_mask, emotion_mask)"
+        ))
+        database._migrate_schema(conn)
+    names = {ix["name"] for ix in inspect(db.engine).get_indexes("mood_logs")}
+    assert not {"ix_mood_logs_user_id", "ix_mood_logs_user_features"} & names
@@ -0,0 +1,28 @@
+"""Пакетный анализ совпадает с построчным"""
+
+from nlp_analyzer import SimpleNLPAnalyzer
+
+TEXTS = [
+    "Сегодня отличный день, я счастлив и спокоен!",
+    "не хочу жить, всё плохо",
+    "суицидальные мысли не отпускают",
+    "",
+    "ок",
+    "Устал на работе, начальник опять кричал!!! Тревога и стресс",
+    "Поругались с мамой, грустно и одиноко",
+    "просто обычный вторник",
+]
+
+
+def test_analyze_many_matches_analyze_text():
+    analyzer = SimpleNLPAnalyzer(cache_size=0)
+    expected = [analyzer.analyze_text(text) for text in TEXTS]
+    assert list(analyzer.analyze_many(iter(TEXTS), batch_size=3)) == expected
+
+
+def test_crisis_root_does_not_span_texts():
+    analyzer = SimpleNLPAnalyzer(cache_size=0)
+    # Конец одного текста и начало следующего не складываются в кризисный корень
+    texts = ["мне нужен суи", "цид не причём, просто устал"]
+    results = list(analyzer.analyze_many(texts))
+    assert [r.crisis_words for r in results] == [analyzer.analyze_text(t).crisis_words for t in texts]
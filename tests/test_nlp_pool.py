@@ -0,0 +1,79 @@
+"""Запасной анализ пула NLP не блокирует event loop"""
+
+import asyncio
+import time
+
+import pytest
+
+from nlp_pool import NLPProcessPool
+
+
+class SlowBackend:
+    """Бэкенд, который держит поток, как тяжелый анализ"""
+    backend_name = "slow"
+
+    def __init__(self, delay=0.2, fail=False):
+        self.delay = delay
+        self.fail = fail
+
+    def lookup(self, text):
+        return None
+
+    def remember(self, text, result):
+        pass
+
+    def analyze_text(self, text):
+        time.sleep(self.delay)
+        return text.upper()
+
+    def analyze_many(self, texts):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ValueError("сломался")
+        return [text.upper() for text in texts]
+
+
+async def _ticks_while(awaitable):
+    """Сколько раз event loop успел проснуться, пока идет анализ"""
+    ticks = 0
+    task = asyncio.ensure_future(awaitable)
+    while not task.done():
+        await asyncio.sleep(0.01)
+        ticks += 1
+    return ticks, await task
+
+
+def test_disabled_pool_analyzes_off_the_loop():
+    async def scenario():
+        pool = NLPProcessPool(SlowBackend(), workers=0)
+        return await _ticks_while(pool.analyze("грустно"))
+
+    ticks, result = asyncio.run(scenario())
+    assert result == "ГРУСТНО"
+    assert ticks >= 5
+
+
+def test_saturated_batch_resolves_off_the_loop():
+    async def scenario():
+        pool = NLPProcessPool(SlowBackend(), workers=1)
+        pool.enabled = False
+        loop = asyncio.get_running_loop()
+        batch = [(text, loop.create_future()) for text in ("раз", "два")]
+        pool._resolve_inline(batch)
+        return await _ticks_while(asyncio.gather(*(future for _, future in batch)))
+
+    ticks, results = asyncio.run(scenario())
+    assert results == ["РАЗ", "ДВА"]
+    assert ticks >= 5
+
+
+def test_inline_error_reaches_every_waiter():
+    async def scenario():
+        pool = NLPProcessPool(SlowBackend(delay=0, fail=True), workers=0)
+        loop = asyncio.get_running_loop()
+        batch = [(text, loop.create_future()) for text in ("раз", "два")]
+        pool._resolve_inline(batch)
+        return await asyncio.gather(*(future for _, future in batch), return_exceptions=True)
+
+    errors = asyncio.run(scenario())
+    assert all(isinstance(error, ValueError) for error in errors)
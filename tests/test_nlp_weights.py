@@ -0,0 +1,76 @@
+"""Веса hashed_linear: путь по умолчанию и атомарная запись файла"""
+
+import io
+import os
+import threading
+
+import numpy as np
+import pytest
+
+import nlp_hashed
+from nlp_hashed import LABELS, load_weights, save_weights
+
+DIM = 1024
+
+
+def test_default_path_is_next_to_module():
+    assert os.path.dirname(nlp_hashed.NLP_WEIGHTS_PATH) == os.path.dirname(os.path.abspath(nlp_hashed.__file__))
+
+
+def test_missing_file_is_seeded_and_saved(tmp_path):
+    path = str(tmp_path / "weights.npy")
+    weights = load_weights(path, DIM)
+    assert weights.shape == (DIM + 1, len(LABELS))
+    assert isinstance(weights, np.memmap)
+    # Без временных файлов после записи
+    assert os.listdir(tmp_path) == ["weights.npy"]
+    np.testing.assert_array_equal(load_weights(path, DIM), weights)
+
+
+def test_failed_write_leaves_no_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "weights.npy")
+
+    def broken_save(file, array):
+        file.write(b"\x93NUMPY")  # Начало заголовка, дальше - ошибка
+        raise OSError("диск заполнен")
+
+    monkeypatch.setattr(nlp_hashed.np, "save", broken_save)
+    with pytest.raises(OSError):
+        save_weights(path, np.zeros((3, 3), dtype=np.float32))
+    assert os.listdir(tmp_path) == []
+
+
+def test_concurrent_first_load_never_reads_partial_file(tmp_path, monkeypatch):
+    path = str(tmp_path / "weights.npy")
+    save = np.save
+
+    def slow_save(file, array):
+        # Запись растянута: другие загрузчики проверяют файл, пока он записан наполовину
+        buffer = io.BytesIO()
+        save(buffer, array)
+        data = buffer.getvalue()
+        target = open(file, "wb") if isinstance(file, str) else file
+        target.write(data[:len(data) // 2])
+        target.flush()
+        threading.Event().wait(0.1)
+        target.write(data[len(data) // 2:])
+        if target is not file:
+            target.close()
+
+    monkeypatch.setattr(nlp_hashed.np, "save", slow_save)
+    results, errors = [], []
+
+    def loader():
+        try:
+            results.append(load_weights(path, DIM).shape)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=loader) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert errors == []
+    assert results == [(DIM + 1, len(LABELS))] * 4
+    assert os.listdir(tmp_path) == ["weights.npy"]
@@ -0,0 +1,74 @@
+"""Статистика за период по дневным итогам и кнопки периода"""
+
+import asyncio
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+import database
+from message_handlers import handle_stats_period
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def _backdated(db, user_id, days_ago, scores):
+    """Записи в прошлом: сразу через пакетную вставку, минуя очередь"""
+    rows = []
+    for score in scores:
+        row = database._mood_log_row(user_id, score, f"{days_ago} дней назад")
+        row["created_at"] = datetime.utcnow() - timedelta(days=days_ago)
+        rows.append(row)
+    with db.get_db_session() as session:
+        database._flush_mood_logs_tx(session, rows)
+
+
+@pytest.fixture(scope="module")
+def user_id(db):
+    user_id = db.add_user(800401, "period", "Period")["id"]
+    _backdated(db, user_id, 20, [2])
+    _backdated(db, user_id, 3, [4, None])
+    db.add_mood_log(user_id, 8, "сегодня")
+    db.add_mood_log(user_id, 6, "сегодня")
+    return user_id
+
+
+@pytest.mark.parametrize("period, total, avg, low, high", [
+    ("today", 2, 7.0, 6, 8),
+    ("week", 4, 6.0, 4, 8),
+    ("month", 5, 5.0, 2, 8),
+    ("all", 5, 5.0, 2, 8),
+])
+def test_period_bounds(db, user_id, period, total, avg, low, high):
+    stats = db.get_period_stats(user_id, period)
+    assert stats["period"] == period
+    assert stats["total_records"] == total
+    assert stats["avg_mood"] == pytest.approx(avg)
+    assert (stats["min_mood"], stats["max_mood"]) == (low, high)
+
+
+def test_daily_rows_match_rebuild(db, user_id):
+    before = db.get_period_stats(user_id, "month")
+    assert [day["message_count"] for day in before["days"]] == [1, 2, 2]
+    db.rebuild_mood_aggregates()
+    assert db.get_period_stats(user_id, "month") == before
+
+
+def test_period_button_replies_with_period_stats(db, user_id):
+    replies = []
+
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    update = SimpleNamespace(
+        message=SimpleNamespace(text="📆 Неделя", reply_text=reply_text),
+        effective_user=SimpleNamespace(id=800401, username="period", first_name="Period")
+    )
+    asyncio.run(handle_stats_period(update, SimpleNamespace(user_data={})))
+    assert len(replies) == 1
+    assert "ЗА НЕДЕЛЮ" in replies[0] and "Записей: 4" in replies[0]
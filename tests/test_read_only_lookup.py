@@ -0,0 +1,87 @@
+"""Статистика и история находят users.id без записи в БД"""
+
+import asyncio
+import math
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import event
+
+import database
+from database import known_users
+from message_handlers import handle_history_more, handle_stats_button, handle_stats_period, show_history
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+@contextmanager
+def _statements(db):
+    seen = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        seen.append(statement.lstrip().split(None, 1)[0].upper())
+
+    event.listen(db.engine, "before_cursor_execute", record)
+    try:
+        yield seen
+    finally:
+        event.remove(db.engine, "before_cursor_execute", record)
+
+
+def _update(telegram_id, text="", replies=None, data=None):
+    async def reply_text(text, **kwargs):
+        replies.append(text)
+
+    async def noop(*args, **kwargs):
+        pass
+
+    message = SimpleNamespace(text=text, reply_text=reply_text)
+    query = SimpleNamespace(data=data, answer=noop, edit_message_reply_markup=noop, message=message)
+    return SimpleNamespace(message=message, callback_query=query,
+                           effective_user=SimpleNamespace(id=telegram_id, username="ro", first_name="RO"))
+
+
+def _run_readers(telegram_id, replies):
+    context = SimpleNamespace(user_data={})
+    asyncio.run(handle_stats_button(_update(telegram_id, replies=replies), context))
+    asyncio.run(handle_stats_period(_update(telegram_id, "📆 Неделя", replies), context))
+    asyncio.run(show_history(_update(telegram_id, replies=replies), context))
+    asyncio.run(handle_history_more(_update(telegram_id, replies=replies, data="history_more:x|1"), context))
+
+
+def test_readers_do_not_write_for_known_user(db):
+    user_id = db.add_user(800701, "ro", "RO")["id"]
+    db.add_mood_log(user_id, 6, "запись")
+    db.flush()
+    # Процесс перезапущен: кэша нет, id читается из users
+    known_users.pop(800701)
+
+    replies = []
+    with _statements(db) as seen:
+        _run_readers(800701, replies)
+    assert "Всего записей: 1" in replies[0] and "Записей: 1" in replies[1]
+    assert not {"INSERT", "UPDATE", "DELETE"} & set(seen)
+
+    # Найденный при чтении id кэширован, но первая запись все равно обновит last_active
+    assert known_users.get(800701)[0] == user_id
+    with _statements(db) as seen:
+        db.record_mood({"id": 800701, "username": "ro"}, 5, "новая запись")
+    assert "INSERT" in seen
+    assert math.isfinite(known_users.get(800701)[1])
+
+
+def test_readers_do_not_create_unknown_user(db):
+    replies = []
+    with _statements(db) as seen:
+        _run_readers(800702, replies)
+    assert "пока нет записей" in replies[0]
+    assert "записей нет" in replies[1]
+    assert replies[2:] == ["📜 У вас пока нет записей настроения.", "📜 Записей больше нет."]
+    assert not {"INSERT", "UPDATE", "DELETE"} & set(seen)
+    assert db.get_user_id(800702) is None
@@ -0,0 +1,63 @@
+"""Встроенная SQLite вместо заглушки, когда DATABASE_URL не задан"""
+
+import os
+import sqlite3
+
+import pytest
+
+import database
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def test_empty_database_url_uses_sqlite_file(db):
+    assert isinstance(db, database.DatabaseManager)
+    assert database.DATABASE_URL == f"sqlite:///{os.environ['SQLITE_PATH']}"
+    assert database.IS_SQLITE
+
+
+def test_connection_pragmas(db):
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        pragmas = {}
+        for name in ("journal_mode", "synchronous", "mmap_size", "cache_size", "temp_store", "busy_timeout"):
+            cursor.execute(f"PRAGMA {name}")
+            pragmas[name] = cursor.fetchone()[0]
+    finally:
+        connection.close()
+    assert pragmas == {
+        "journal_mode": "wal",
+        "synchronous": 1,  # NORMAL
+        "mmap_size": database.SQLITE_MMAP_SIZE,
+        "cache_size": -database.SQLITE_CACHE_KB,
+        "temp_store": 2,  # MEMORY
+        "busy_timeout": int(database.DB_CALL_TIMEOUT * 1000),
+    }
+
+
+def test_records_are_written_to_the_file(db):
+    user_id = db.add_user(800601, "durable", "Durable")["id"]
+    db.add_mood_log(user_id, 7, "сохранится в файле")
+    db.flush()
+
+    # Отдельное соединение к тому же файлу видит запись (заглушка ее теряла)
+    with sqlite3.connect(os.environ["SQLITE_PATH"]) as connection:
+        rows = connection.execute(
+            "SELECT mood_score, user_message FROM mood_logs WHERE user_id = ?", (user_id,)
+        ).fetchall()
+    assert rows == [(7, "сохранится в файле")]
+
+
+def test_stub_has_the_same_api():
+    # Заглушка остается запасным вариантом без SQLAlchemy и должна подменять менеджер целиком
+    public = {name for name in dir(database.DatabaseManager) if not name.startswith("_")}
+    # rebuild_mood_aggregates - разовый пересчет существующих данных, которых у заглушки нет
+    missing = {name for name in public - {"rebuild_mood_aggregates"}
+               if not hasattr(database.DummyDBManager, name)}
+    assert missing == set()
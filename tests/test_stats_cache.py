@@ -0,0 +1,139 @@
+"""Кэш статистики: инвалидация при записи и при сбросе очереди настроения"""
+
+import asyncio
+import threading
+
+import pytest
+
+import database
+from database import StatsCache, stats_cache
+
+
+def test_put_after_invalidate_is_dropped():
+    cache = StatsCache(maxsize=10, ttl=60)
+    token = cache.token()
+    cache.invalidate(1)
+    # Чтение началось до записи - его результат устарел
+    cache.put(1, {"total_records": 0}, token)
+    assert cache.get(1) is None
+
+    token = cache.token()
+    cache.put(1, {"total_records": 1}, token)
+    assert cache.get(1) == {"total_records": 1}
+
+
+def test_invalidate_other_user_keeps_entry():
+    cache = StatsCache(maxsize=10, ttl=60)
+    token = cache.token()
+    cache.invalidate(2)
+    cache.put(1, {"total_records": 3}, token)
+    assert cache.get(1) == {"total_records": 3}
+
+
+def test_evicted_invalidation_still_rejects_stale_put():
+    cache = StatsCache(maxsize=2, ttl=60)
+    token = cache.token()
+    for user_id in (1, 2, 3):
+        cache.invalidate(user_id)
+    # Запись о сбросе пользователя 1 вытеснена, но чтение началось до него
+    cache.put(1, {"total_records": 0}, token)
+    assert cache.get(1) is None
+
+    # Чтение, начатое после вытеснения, кэшируется
+    token = cache.token()
+    cache.put(1, {"total_records": 1}, token)
+    assert cache.get(1) == {"total_records": 1}
+
+
+def test_invalidate_during_put_is_not_lost():
+    cache = StatsCache(maxsize=10, ttl=60)
+    store = cache._cache.set
+    writer = []
+
+    def set_with_concurrent_write(key, value):
+        # Запись настроения приходит между проверкой поколения и сохранением
+        thread = threading.Thread(target=cache.invalidate, args=(key,))
+        thread.start()
+        writer.append(thread)
+        thread.join(0.2)
+        store(key, value)
+
+    cache._cache.set = set_with_concurrent_write
+    cache.put(1, {"total_records": 0}, cache.token())
+    writer[0].join(5)
+    assert cache.get(1) is None
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def _pause_flush(monkeypatch, started, release):
+    """Сброс пачки останавливается после drain и до записи в БД"""
+    flush_tx = database._flush_mood_logs_tx
+
+    def paused(session, rows):
+        started.set()
+        release.wait(5)
+        return flush_tx(session, rows)
+
+    monkeypatch.setattr(database, "_flush_mood_logs_tx", paused)
+
+
+def test_stats_read_during_flush_is_not_cached(db, monkeypatch):
+    user_id = db.add_user(800001, "flush", "Flush")["id"]
+    db.add_mood_log(user_id, 6, "первая запись")
+    db.flush()
+    assert db.get_user_stats(user_id)["total_records"] == 1
+
+    db.add_mood_log(user_id, 2, "вторая запись")
+    started, release = threading.Event(), threading.Event()
+    _pause_flush(monkeypatch, started, release)
+    flusher = threading.Thread(target=db.flush)
+    flusher.start()
+    try:
+        assert started.wait(5)
+        # Очередь уже пуста, строка еще не записана - чтение видит старые данные
+        assert not db.mood_queue.has_pending(user_id)
+        assert db.get_user_stats(user_id)["total_records"] == 1
+    finally:
+        release.set()
+        flusher.join(5)
+
+    assert db.get_user_stats(user_id)["total_records"] == 2
+
+
+def test_async_stats_read_during_flush_is_not_cached(db):
+    async def scenario():
+        manager = database.AsyncDatabaseManager(database.DATABASE_URL)
+        assert await manager.init_db()
+        user_id = (await manager.add_user(800002, "flush", "Flush"))["id"]
+        await manager.add_mood_log(user_id, 6, "первая запись")
+        await manager.flush()
+        assert (await manager.get_user_stats(user_id))["total_records"] == 1
+
+        await manager.add_mood_log(user_id, 2, "вторая запись")
+        started, release = asyncio.Event(), asyncio.Event()
+        run_tx = manager._run_tx
+
+        async def paused(tx, *args, **kwargs):
+            if tx is database._flush_mood_logs_tx:
+                started.set()
+                await release.wait()
+            return await run_tx(tx, *args, **kwargs)
+
+        manager._run_tx = paused
+        flush = asyncio.ensure_future(manager.flush())
+        await started.wait()
+        assert (await manager.get_user_stats(user_id))["total_records"] == 1
+        release.set()
+        await flush
+
+        assert (await manager.get_user_stats(user_id))["total_records"] == 2
+        await manager.close()
+
+    asyncio.run(scenario())
+    stats_cache.clear()
@@ -0,0 +1,54 @@
+"""Словари NLP совпадают целыми словами в любой словоформе"""
+
+import pytest
+
+from nlp_analyzer import SimpleNLPAnalyzer
+from tokenizer import stem
+
+
+@pytest.fixture(scope="module")
+def analyzer():
+    return SimpleNLPAnalyzer(cache_size=0)
+
+
+def _topics(analyzer, text):
+    return {name for name, _ in analyzer.analyze_text(text).topic_hits}
+
+
+@pytest.mark.parametrize("text, topic", [
+    ("Сегодня более-менее нормально", "здоровье"),
+    ("Долго не мог уснуть", "финансы"),
+    ("Это был долгий день", "финансы"),
+    ("Попробую в другой раз", "отношения"),
+    ("Думаю о других вещах", "отношения"),
+])
+def test_words_sharing_a_short_root_do_not_match(analyzer, text, topic):
+    assert topic not in _topics(analyzer, text)
+
+
+@pytest.mark.parametrize("text, topic", [
+    ("Сильная боль в спине", "здоровье"),
+    ("Мучают головные боли", "здоровье"),
+    ("Взял кредит, долги растут", "финансы"),
+    ("Не могу вернуть долг", "финансы"),
+    ("Поссорился с другом", "отношения"),
+    ("Жду друга в гости", "отношения"),
+])
+def test_word_forms_still_match(analyzer, text, topic):
+    assert topic in _topics(analyzer, text)
+
+
+def test_radio_is_not_joy(analyzer):
+    assert "радость" not in analyzer.analyze_text("Весь вечер слушал радио").emotions
+    assert "радость" in analyzer.analyze_text("Я так рада тебя видеть").emotions
+
+
+def test_world_record_is_not_calm(analyzer):
+    assert "спокойствие" not in analyzer.analyze_text("Побил мировой рекорд").emotions
+    assert "спокойствие" in analyzer.analyze_text("На душе мир и тишина").emotions
+
+
+def test_collisions_keep_their_own_stem():
+    assert stem("боли") == stem("боль") != stem("более")
+    assert stem("долги") == stem("долг") != stem("долго")
+    assert stem("друга") == stem("друг") != stem("другой")
@@ -0,0 +1,79 @@
+"""Потоковый ответ DeepSeek: события SSE на границах фрагментов сети"""
+
+import asyncio
+import json
+from types import SimpleNamespace
+from unittest import mock
+
+import aiohttp
+import pytest
+
+from deepseek_chat import DeepSeekChatRender, DeepSeekError
+
+
+def _event(text):
+    return "data: " + json.dumps({"choices": [{"delta": {"content": text}}]}, ensure_ascii=False) + "\n\n"
+
+
+BODY = (
+    ": keep-alive\n\n"
+    + _event("Привет")
+    + "data: {\"choices\": [{\"delta\": {\"role\": \"assistant\"}}]}\n\n"
+    + _event(", как ты?")
+    + "data: [DONE]\n\n"
+    + _event("после конца")
+).encode("utf-8")
+
+
+class _Response:
+    def __init__(self, chunks, status=200):
+        self.chunks = chunks
+        self.status = status
+        self.content = None
+
+    async def __aenter__(self):
+        # Настоящий StreamReader: строки собираются из фрагментов, как в aiohttp
+        self.content = aiohttp.StreamReader(mock.Mock(_reading_paused=False), 2 ** 16,
+                                            loop=asyncio.get_running_loop())
+        for chunk in self.chunks:
+            self.content.feed_data(chunk)
+        self.content.feed_eof()
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def text(self):
+        return b"".join(self.chunks).decode("utf-8")
+
+
+def _client(response):
+    client = DeepSeekChatRender()
+    client._session = SimpleNamespace(closed=False, post=lambda *args, **kwargs: response)
+    return client
+
+
+async def _collect(client):
+    return [text async for text in client.stream_chunks("привет")]
+
+
+def test_events_split_at_every_byte():
+    # Граница фрагмента в любом месте, в том числе внутри символа UTF-8
+    for cut in range(1, len(BODY)):
+        chunks = [BODY[:cut], BODY[cut:]]
+        assert asyncio.run(_collect(_client(_Response(chunks)))) == ["Привет", ", как ты?"], cut
+
+
+def test_events_in_single_byte_chunks():
+    chunks = [BODY[i:i + 1] for i in range(len(BODY))]
+    assert asyncio.run(_collect(_client(_Response(chunks)))) == ["Привет", ", как ты?"]
+
+
+def test_bad_event_is_skipped():
+    body = ("data: {не json\n\n" + _event("текст")).encode("utf-8")
+    assert asyncio.run(_collect(_client(_Response([body])))) == ["текст"]
+
+
+def test_api_error_is_raised():
+    with pytest.raises(DeepSeekError):
+        asyncio.run(_collect(_client(_Response([b"rate limited"], status=429))))
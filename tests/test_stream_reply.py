@@ -0,0 +1,47 @@
+"""Итоговая отправка потокового ответа не пробрасывает ошибки Telegram"""
+
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, NetworkError
+
+from stream_reply import StreamingReply
+
+
+class _Message:
+    """reply_text/edit_text, которые отвечают заранее заданными ошибками"""
+
+    def __init__(self, errors):
+        self.errors = list(errors)
+        self.calls = []
+
+    async def reply_text(self, text, parse_mode=None):
+        return await self.edit_text(text, parse_mode=parse_mode)
+
+    async def edit_text(self, text, parse_mode=None):
+        self.calls.append((text, parse_mode))
+        error = self.errors.pop(0) if self.errors else None
+        if error is not None:
+            raise error
+        return self
+
+
+@pytest.mark.parametrize("sent", [False, True])
+@pytest.mark.parametrize("error", [BadRequest("Message is too long"), NetworkError("connection reset")])
+def test_failed_fallback_is_logged_not_raised(sent, error, caplog):
+    message = _Message([BadRequest("Can't parse entities"), error])
+    reply = StreamingReply(message, edit_interval=0)
+    if sent:
+        reply.sent = message
+
+    asyncio.run(reply.finish("<b>ответ", fallback_text="ответ"))
+
+    assert message.calls == [("<b>ответ", "HTML"), ("ответ", None)]
+    assert "Не удалось отправить ответ без разметки" in caplog.text
+
+
+def test_fallback_is_sent_without_markup():
+    message = _Message([BadRequest("Can't parse entities")])
+    reply = StreamingReply(message, edit_interval=0)
+    asyncio.run(reply.finish("<b>ответ", fallback_text="ответ"))
+    assert message.calls[-1] == ("ответ", None) and reply.sent is message
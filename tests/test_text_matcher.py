@@ -0,0 +1,46 @@
+"""Однопроходный поиск по словарям совпадает с проверкой `pattern in text`"""
+
+import random
+
+from text_matcher import LexiconMatcher
+
+PATTERNS = ["суицид", "суи", "убить", "убит", "бить", "само", "самоубийств", "конец", "нец", "ц"]
+
+
+def _brute(patterns, text):
+    return {p for p in patterns if p in text}
+
+
+def test_find_matches_substring_semantics():
+    matcher = LexiconMatcher((p, p) for p in PATTERNS).compile()
+    texts = ["мысли о самоубийстве", "хочу убить время", "суицидальные", "конец", "", "ничего такого"]
+    for text in texts:
+        assert matcher.find(text) == _brute(PATTERNS, text), text
+
+
+def test_random_texts_against_brute_force():
+    rng = random.Random(0)
+    alphabet = "субитцамоенйвк "
+    matcher = LexiconMatcher((p, p) for p in PATTERNS).compile()
+    for _ in range(500):
+        text = "".join(rng.choice(alphabet) for _ in range(rng.randint(0, 30)))
+        assert matcher.find(text) == _brute(PATTERNS, text), text
+
+
+def test_match_returns_tags_in_insertion_order():
+    matcher = LexiconMatcher([("бить", "b"), ("убить", "a"), ("бить", "c")])
+    # Несколько меток одного шаблона, порядок добавления, без повторов вхождений
+    assert matcher.match("убить бить") == ["b", "a", "c"]
+    assert len(matcher) == 2
+
+
+def test_match_positions_reports_every_occurrence():
+    matcher = LexiconMatcher([("суи", 1), ("суицид", 2)])
+    text = "суицид\nсуи"
+    assert sorted(matcher.match_positions(text)) == [(0, 1), (0, 2), (7, 1)]
+
+
+def test_empty_matcher_and_pattern():
+    matcher = LexiconMatcher([("", "пусто")])
+    assert matcher.find("что угодно") == set()
+    assert matcher.match_positions("что угодно") == []
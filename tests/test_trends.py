@@ -0,0 +1,80 @@
+"""Динамика настроения: EWMA и обнаружение спада"""
+
+import asyncio
+
+import pytest
+
+import trends
+from trends import describe_trend, emit_drops, ewma_update, new_trend_state, update_trend
+
+
+def _feed(scores):
+    state, drops = new_trend_state(), []
+    for score in scores:
+        drop = update_trend(state, score)
+        if drop:
+            drops.append(drop)
+    return state, drops
+
+
+def test_ewma_update():
+    assert ewma_update(None, None, 7, 0.3) == (7.0, 0.0)
+    mean, var = ewma_update(7.0, 0.0, 3, 0.5)
+    assert mean == pytest.approx(5.0) and var == pytest.approx(4.0)
+
+
+def test_no_drop_before_min_samples():
+    _, drops = _feed([9] * (trends.MOOD_DROP_MIN_SAMPLES - 1) + [1])
+    assert drops == []
+
+
+def test_small_dip_after_flat_history_is_not_a_drop():
+    # При ровной истории отклонение ограничено снизу MIN_STD
+    _, drops = _feed([8] * 10 + [6])
+    assert drops == []
+
+
+def test_sudden_drop():
+    _, drops = _feed([8] * 10 + [3])
+    assert [drop['kind'] for drop in drops] == ['sudden']
+    assert drops[0]['mood_ewma'] == 8.0 and drops[0]['deviation'] == -5.0
+
+
+def test_decline_is_reported_once():
+    state, drops = _feed([8] * 10 + [5] * 10)
+    # Первая пятерка - резкий спад, затем один раз - устойчивый
+    assert [drop['kind'] for drop in drops] == ['sudden', 'decline']
+    assert drops[1]['mood_ewma'] < drops[1]['baseline'] - trends.MOOD_DROP_DELTA
+
+    trend = describe_trend(state)
+    assert trend['direction'] == 'down' and trend['mood_delta'] < 0
+
+
+def test_describe_trend():
+    assert describe_trend(new_trend_state()) is None
+    state = new_trend_state()
+    update_trend(state, 6, stress_level=4)
+    assert describe_trend(state) == {
+        'mood_ewma': 6.0, 'mood_std': 0.0, 'mood_baseline': 6.0, 'mood_delta': 0.0,
+        'direction': 'flat', 'stress_ewma': 4.0, 'stress_std': 0.0
+    }
+
+
+def test_emit_drops_runs_hooks_in_their_loop():
+    async def scenario():
+        seen = []
+
+        async def hook(event):
+            seen.append(event['user_id'])
+
+        trends.register_drop_hook(hook)
+        trends.register_drop_hook(lambda event: 1 / 0)
+        try:
+            # Ошибка одного обработчика не мешает остальным
+            emit_drops([{'kind': 'sudden', 'user_id': 7}])
+            await asyncio.sleep(0)
+        finally:
+            trends.clear_drop_hooks()
+        return seen
+
+    assert asyncio.run(scenario()) == [7]
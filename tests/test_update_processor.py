@@ -0,0 +1,61 @@
+"""Параллельная обработка обновлений: порядок внутри пользователя"""
+
+import asyncio
+from types import SimpleNamespace
+
+from update_processor import PerUserUpdateProcessor
+
+
+def _update(user_id, text=""):
+    return SimpleNamespace(effective_user=SimpleNamespace(id=user_id), text=text)
+
+
+def test_same_user_in_order_other_users_in_parallel():
+    async def scenario():
+        processor = PerUserUpdateProcessor(10)
+        events = []
+        release = asyncio.Event()
+
+        async def handler(name, wait=False):
+            events.append(f"{name}:start")
+            if wait:
+                await release.wait()
+            events.append(f"{name}:end")
+
+        first = asyncio.ensure_future(processor.process_update(_update(1), handler("a1", wait=True)))
+        second = asyncio.ensure_future(processor.process_update(_update(1), handler("a2")))
+        other = asyncio.ensure_future(processor.process_update(_update(2), handler("b1")))
+        await asyncio.sleep(0.01)
+        # Второй пользователь не ждет первого, второе сообщение первого - ждет
+        assert events == ["a1:start", "b1:start", "b1:end"]
+
+        release.set()
+        await asyncio.gather(first, second, other)
+        assert events[3:] == ["a1:end", "a2:start", "a2:end"]
+        assert processor._locks == {} and processor._pending == {}
+
+    asyncio.run(scenario())
+
+
+def test_urgent_update_skips_user_queue():
+    async def scenario():
+        processor = PerUserUpdateProcessor(10, is_urgent=lambda update: "помогите" in update.text)
+        release = asyncio.Event()
+        done = []
+
+        async def slow():
+            await release.wait()
+            done.append("slow")
+
+        async def urgent():
+            done.append("urgent")
+
+        slow_task = asyncio.ensure_future(processor.process_update(_update(1), slow()))
+        await asyncio.sleep(0)
+        await asyncio.wait_for(processor.process_update(_update(1, "помогите"), urgent()), 1)
+        assert done == ["urgent"]
+
+        release.set()
+        await slow_task
+
+    asyncio.run(scenario())
@@ -0,0 +1,82 @@
+"""Очередь отложенной записи: порядок, возврат после ошибки, переполнение"""
+
+import pytest
+
+import database
+from write_behind import WriteBehindQueue
+
+
+def _row(user_id, n):
+    return {"user_id": user_id, "n": n}
+
+
+def test_put_signals_full_batch_and_drain_empties():
+    queue = WriteBehindQueue("test_wb_batch", batch_size=2)
+    assert queue.put(_row(1, 1)) is False
+    assert queue.put(_row(2, 2)) is True
+    assert queue.has_pending(1) and queue.has_pending(2)
+
+    assert [row["n"] for row in queue.drain()] == [1, 2]
+    assert queue.depth == 0 and not queue.has_pending(1)
+    assert not queue.is_due()
+
+
+def test_requeue_puts_rows_before_newer_ones():
+    queue = WriteBehindQueue("test_wb_requeue", flush_interval=0)
+    queue.put(_row(1, 1))
+    queue.put(_row(1, 2))
+    rows = queue.drain()
+    # Пока пачка записывалась, пришла новая строка
+    queue.put(_row(2, 3))
+    queue.requeue(rows)
+
+    assert queue.has_pending(1) and queue.has_pending(2)
+    assert queue.is_due()
+    assert [row["n"] for row in queue.drain()] == [1, 2, 3]
+
+
+def test_requeue_over_capacity_drops_oldest():
+    queue = WriteBehindQueue("test_wb_overflow", max_size=3)
+    for n in range(3):
+        queue.put(_row(1, n))
+    rows = queue.drain()
+    queue.put(_row(2, 3))
+    queue.put(_row(2, 4))
+    queue.requeue(rows)
+
+    assert queue.dropped_rows == 2
+    assert [row["n"] for row in queue.drain()] == [2, 3, 4]
+
+
+def test_put_over_capacity_drops_oldest():
+    queue = WriteBehindQueue("test_wb_put_overflow", max_size=2)
+    for n in range(3):
+        queue.put(_row(n, n))
+    assert queue.dropped_rows == 1
+    assert not queue.has_pending(0) and queue.has_pending(2)
+    assert [row["n"] for row in queue.drain()] == [1, 2]
+
+
+@pytest.fixture(scope="module")
+def db():
+    manager = database.db_manager
+    assert manager.init_db()
+    return manager
+
+
+def test_failed_flush_requeues_rows(db, monkeypatch):
+    user_id = db.add_user(800101, "requeue", "Requeue")["id"]
+    db.add_mood_log(user_id, 5, "запись до ошибки")
+
+    def failing(session, rows):
+        raise RuntimeError("БД недоступна")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(database, "_flush_mood_logs_tx", failing)
+        assert db.flush() == 0
+    assert db.mood_queue.has_pending(user_id)
+
+    # Следующий сброс записывает возвращенные строки
+    assert db.flush() == 1
+    assert not db.mood_queue.has_pending(user_id)
+    assert db.get_user_stats(user_id)["total_records"] == 1
@@ -0,0 +1,195 @@
+"""
+Многошаблонный поиск по словарям для NLP анализатора
+LexiconMatcher - поиск подстрок: все слова словарей собираются в один
+префиксный автомат (trie), который компилируется в одно регулярное выражение.
+StemIndex - поиск по границам слов: текст токенизируется один раз,
+основы слов проверяются по хэш-индексу.
+"""
+
+import re
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Pattern, Set, Tuple
+
+from tokenizer import stem, tokenize
+
+logger = logging.getLogger(__name__)
+
+
+def _trie_regex(node: Dict[str, Any]) -> str:
+    """Рекурсивно собрать регулярное выражение из узла trie"""
+    terminal = '' in node
+    branches = [
+        re.escape(ch) + _trie_regex(child)
+        for ch, child in sorted(node.items())
+        if ch != ''
+    ]
+    if not branches:
+        return ''
+
+    body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+    if terminal:
+        # Жадный опциональный хвост: сначала пробуем более длинное слово
+        body = '(?:' + body + ')?'
+    return body
+
+
+class LexiconMatcher:
+    """
+    Автомат для поиска всех вхождений набора шаблонов за один проход.
+    Семантика совпадает с проверкой `pattern in text` для каждого шаблона.
+    """
+
+    def __init__(self, patterns: Optional[Iterable[tuple]] = None):
+        self._tags: Dict[str, List[tuple]] = {}
+        self._order = 0
+        self._regex: Optional[Pattern] = None
+        self._prefixes: Dict[str, tuple] = {}
+        if patterns:
+            for pattern, tag in patterns:
+                self.add(pattern, tag)
+
+    def add(self, pattern: str, tag: Any):
+        """Добавить шаблон с меткой (один шаблон может иметь несколько меток)"""
+        if not pattern:
+            return
+        self._tags.setdefault(pattern, []).append((self._order, tag))
+        self._order += 1
+        self._regex = None
+
+    def compile(self) -> 'LexiconMatcher':
+        """Построить trie и скомпилировать его в регулярное выражение"""
+        root: Dict[str, Any] = {}
+        for pattern in self._tags:
+            node = root
+            for ch in pattern:
+                node = node.setdefault(ch, {})
+            node[''] = True
+
+        # На позиции находится самое длинное слово; более короткие слова,
+        # начинающиеся там же, - его префиксы. Считаем их заранее.
+        self._prefixes = {
+            pattern: tuple(p for p in self._tags if pattern.startswith(p))
+            for pattern in self._tags
+        }
+        self._regex = re.compile('(?=(' + _trie_regex(root) + '))') if root else None
+        logger.debug(f"✅ Автомат словарей скомпилирован: {len(self._tags)} шаблонов")
+        return self
+
+    def find(self, text: str) -> Set[str]:
+        """Множество шаблонов, встречающихся в тексте"""
+        if self._regex is None:
+            if not self._tags:
+                return set()
+            self.compile()
+
+        found: Set[str] = set()
+        prefixes = self._prefixes
+        for match in self._regex.finditer(text):
+            found.update(prefixes[match.group(1)])
+        return found
+
+    def match(self, text: str) -> List[Any]:
+        """Метки всех найденных шаблонов в порядке их добавления"""
+        tagged = [item for pattern in self.find(text) for item in self._tags[pattern]]
+        tagged.sort(key=lambda item: item[0])
+        return [tag for _, tag in tagged]
+
+    def match_positions(self, text: str) -> List[Tuple[int, Any]]:
+        """
+        Пары (позиция, метка) для всех вхождений: один проход по склеенной
+        пачке текстов, документ определяется по позиции
+        """
+        if self._regex is None:
+            if not self._tags:
+                return []
+            self.compile()
+        tags = self._tags
+        prefixes = self._prefixes
+        return [
+            (match.start(), tag)
+            for match in self._regex.finditer(text)
+            for pattern in prefixes[match.group(1)]
+            for _, tag in tags[pattern]
+        ]
+
+    def __len__(self) -> int:
+        return len(self._tags)
+
+
+class StemIndex:
+    """
+    Индекс словаря по основам слов. Шаблоны (в том числе фразы из нескольких
+    слов) совпадают только целыми словами в любой словоформе: 'рад' находит
+    'рада', но не 'радио'; 'мир' находит 'мира', но не 'мировой'.
+    """
+
+    def __init__(self, patterns: Optional[Iterable[tuple]] = None):
+        self._tags: Dict[tuple, List[tuple]] = {}
+        self._lengths: Dict[str, Tuple[int, ...]] = {}
+        self._order = 0
+        if patterns:
+            for pattern, tag in patterns:
+                self.add(pattern, tag)
+
+    def add(self, pattern: str, tag: Any):
+        """Добавить слово или фразу с меткой"""
+        tokens = tokenize(pattern)
+        if not tokens:
+            return
+        item = (self._order, tag)
+        self._order += 1
+        # Стеммер иногда режет словарную форму глубже, чем ее же словоформы
+        # (счастлив -> счастл, но счастлива -> счастлив), поэтому словарная форма
+        # тоже служит ключом
+        for key in {tuple(stem(t) for t in tokens), tuple(tokens)}:
+            self._tags.setdefault(key, []).append(item)
+            lengths = set(self._lengths.get(key[0], ())) | {len(key)}
+            self._lengths[key[0]] = tuple(sorted(lengths, reverse=True))
+
+    def compile(self) -> 'StemIndex':
+        """Индекс строится при добавлении; метод для единообразия с LexiconMatcher"""
+        logger.debug(f"✅ Индекс основ построен: {len(self._tags)} ключей")
+        return self
+
+    def match_stems(self, stems: List[str]) -> List[Any]:
+        """Метки шаблонов, найденных в последовательности основ, в порядке добавления"""
+        found: Dict[int, Any] = {}
+        tags = self._tags
+        lengths = self._lengths
+        for i, current in enumerate(stems):
+            sizes = lengths.get(current)
+            if not sizes:
+                continue
+            for size in sizes:
+                key = (current,) if size == 1 else tuple(stems[i:i + size])
+                for order, tag in tags.get(key, ()):
+                    found[order] = tag
+        return [found[order] for order in sorted(found)]
+
+    def match(self, text: str) -> List[Any]:
+        """Метки всех шаблонов, найденных в тексте, в порядке добавления"""
+        return self.match_stems([stem(token) for token in tokenize(text)])
+
+    def word_tags(self, current: str) -> Tuple[List[Any], bool]:
+        """
+        Метки однословных шаблонов для основы и признак того, что с нее
+        начинается фраза (для пакетного поиска: слова пачки проверяются по
+        одному разу, фразы - только там, где они могут начинаться)
+        """
+        sizes = self._lengths.get(current, ())
+        single = [tag for _, tag in self._tags.get((current,), ())] if 1 in sizes else []
+        return single, any(size > 1 for size in sizes)
+
+    def match_phrases_at(self, stems: List[str], i: int) -> List[Any]:
+        """Метки фраз из нескольких слов, начинающихся с позиции i"""
+        found = []
+        for size in self._lengths.get(stems[i], ()):
+            if size > 1:
+                found += [tag for _, tag in self._tags.get(tuple(stems[i:i + size]), ())]
+        return found
+
+    def __len__(self) -> int:
+        return self._order
+
+
+__all__ = ['LexiconMatcher', 'StemIndex']
@@ -0,0 +1,163 @@
+"""
+Токенизация и стемминг русского текста
+Облегченная версия алгоритма Snowball (Porter) для русского языка:
+без словарей и внешних зависимостей, достаточно для поиска по словарям NLP.
+"""
+
+import re
+from functools import lru_cache
+from typing import List
+
+# Токен - последовательность букв или цифр (дефис и пунктуация разделяют слова)
+TOKEN_RE = re.compile(r"[^\W_]+")
+
+VOWELS = set("аеиоуыэюя")
+
+# Окончания по группам алгоритма Snowball, от длинных к коротким
+PERFECTIVE_GERUND_1 = ("вшись", "вши", "в")  # после а/я
+PERFECTIVE_GERUND_2 = ("ившись", "ывшись", "ивши", "ывши", "ив", "ыв")
+REFLEXIVE = ("ся", "сь")
+ADJECTIVE = (
+    "ими", "ыми", "его", "ого", "ему", "ому",
+    "ее", "ие", "ые", "ое", "ей", "ий", "ый", "ой", "ем", "им", "ым", "ом",
+    "их", "ых", "ую", "юю", "ая", "яя", "ою", "ею"
+)
+PARTICIPLE_1 = ("ем", "нн", "вш", "ющ", "щ")  # после а/я
+PARTICIPLE_2 = ("ивш", "ывш", "ующ")
+VERB_1 = ("ете", "йте", "ешь", "нно", "ла", "на", "ли", "ем", "ло", "но", "ет", "ют", "ны", "ть", "й", "л", "н")  # после а/я
+VERB_2 = (
+    "ейте", "уйте", "ила", "ыла", "ена", "ите", "или", "ыли", "ило", "ыло", "ено",
+    "ует", "уют", "ены", "ить", "ыть", "ишь", "ей", "уй", "ил", "ыл", "им", "ым",
+    "ен", "ят", "ит", "ыт", "ую", "ю"
+)
+NOUN = (
+    "иями", "ями", "ами", "ией", "иям", "ием", "иях",
+    "ев", "ов", "ие", "ье", "еи", "ии", "ей", "ой", "ий", "ям", "ем", "ам", "ом",
+    "ах", "ях", "ию", "ью", "ия", "ья",
+    "а", "е", "и", "й", "о", "у", "ы", "ь", "ю", "я"
+)
+DERIVATIONAL = ("ость", "ост")
+SUPERLATIVE = ("ейше", "ейш")
+
+# Более короткие основы неоднозначны (боюсь -> бо), такие слова не обрезаются
+MIN_STEM_LENGTH = 3
+
+# Несклоняемые слова, которые стеммер иначе обрезал бы до чужой основы (радио -> рад)
+STEM_EXCEPTIONS = frozenset({
+    "радио", "кино", "метро", "пальто", "кофе", "такси", "кафе", "видео", "фото", "интервью"
+})
+
+# Другие слова с той же основой, что и короткие слова словарей NLP:
+# более -> бол (боль), долго -> долг (долг), другой -> друг (друг).
+# Не обрезаются, поэтому не совпадают со словарем. Неоднозначные формы
+# (друга, другом, долгом) остаются: чаще это формы существительного
+STEM_COLLISIONS = frozenset({
+    "более",
+    "долго", "долгий", "долгая", "долгое", "долгие", "долгую", "долгой",
+    "долгих", "долгим", "долгими", "долгого", "долгому",
+    "другой", "другая", "другое", "другие", "другую",
+    "других", "другим", "другими", "другого", "другому",
+})
+
+
+def tokenize(text: str) -> List[str]:
+    """Разбить текст на слова в нижнем регистре (ё заменяется на е)"""
+    return TOKEN_RE.findall(text.lower().replace('ё', 'е'))
+
+
+def _regions(word: str) -> tuple:
+    """Начала областей RV и R2 алгоритма Snowball"""
+    rv = len(word)
+    for i, ch in enumerate(word):
+        if ch in VOWELS:
+            rv = i + 1
+            break
+
+    def next_region(start: int) -> int:
+        for i in range(start + 1, len(word)):
+            if word[i] not in VOWELS and word[i - 1] in VOWELS:
+                return i + 1
+        return len(word)
+
+    r1 = next_region(0)
+    r2 = next_region(r1)
+    return rv, r2
+
+
+def _strip(word: str, rv: int, suffixes: tuple, preceded: bool = False) -> str:
+    """Отрезать первое подходящее окончание внутри RV (или вернуть слово как есть)"""
+    for suffix in suffixes:
+        if word.endswith(suffix) and len(word) - len(suffix) >= rv:
+            if preceded:
+                # Окончания первой группы отрезаются только после а/я
+                start = len(word) - len(suffix)
+                if start - 1 < rv or word[start - 1] not in "ая":
+                    continue
+            return word[:len(word) - len(suffix)]
+    return word
+
+
+def _strip_adjectival(word: str, rv: int) -> str:
+    """Прилагательное или причастие + окончание прилагательного"""
+    stripped = _strip(word, rv, ADJECTIVE)
+    if stripped == word:
+        return word
+    participle = _strip(stripped, rv, PARTICIPLE_2)
+    if participle == stripped:
+        participle = _strip(stripped, rv, PARTICIPLE_1, preceded=True)
+    return participle
+
+
+@lru_cache(maxsize=65536)
+def stem(word: str) -> str:
+    """Основа слова (ожидается слово в нижнем регистре)"""
+    if len(word) <= 2 or word in STEM_EXCEPTIONS or word in STEM_COLLISIONS:
+        return word
+
+    rv, r2 = _regions(word)
+
+    # Шаг 1: деепричастие, иначе возвратность и прилагательное / глагол / существительное
+    stemmed = _strip(word, rv, PERFECTIVE_GERUND_2)
+    if stemmed == word:
+        stemmed = _strip(word, rv, PERFECTIVE_GERUND_1, preceded=True)
+    if stemmed == word:
+        stemmed = _strip(word, rv, REFLEXIVE)
+        for step in (
+            lambda w: _strip_adjectival(w, rv),
+            lambda w: _strip(w, rv, VERB_2),
+            lambda w: _strip(w, rv, VERB_1, preceded=True),
+            lambda w: _strip(w, rv, NOUN),
+        ):
+            result = step(stemmed)
+            if result != stemmed:
+                stemmed = result
+                break
+
+    # Шаг 2: конечное и
+    if stemmed.endswith("и") and len(stemmed) - 1 >= rv:
+        stemmed = stemmed[:-1]
+
+    # Шаг 3: словообразовательные окончания в R2
+    for suffix in DERIVATIONAL:
+        if stemmed.endswith(suffix) and len(stemmed) - len(suffix) >= r2:
+            stemmed = stemmed[:-len(suffix)]
+            break
+
+    # Шаг 4: превосходная степень, двойное н, мягкий знак
+    superlative = _strip(stemmed, rv, SUPERLATIVE)
+    had_superlative = superlative != stemmed
+    stemmed = superlative
+    if stemmed.endswith("нн") and len(stemmed) - 1 >= rv:
+        stemmed = stemmed[:-1]
+    elif not had_superlative and stemmed.endswith("ь") and len(stemmed) - 1 >= rv:
+        stemmed = stemmed[:-1]
+
+    return stemmed if len(stemmed) >= MIN_STEM_LENGTH else word
+
+
+def stem_tokens(text: str) -> List[str]:
+    """Токенизировать текст и вернуть основы слов"""
+    return [stem(token) for token in tokenize(text)]
+
+
+__all__ = ['tokenize', 'stem', 'stem_tokens', 'STEM_EXCEPTIONS', 'STEM_COLLISIONS']
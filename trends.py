@@ -0,0 +1,177 @@
+"""
+Динамика настроения и стресса пользователя (EWMA)
+Экспоненциально взвешенные среднее и дисперсия обновляются за O(1) на каждую
+запись вместе с агрегатами пользователя, поэтому тренд в /stats и обнаружение
+спада настроения не требуют чтения истории mood_logs.
+
+Спад настроения:
+- резкий (sudden) - оценка ниже среднего больше чем на MOOD_DROP_Z отклонений;
+- устойчивый (decline) - быстрое среднее опустилось ниже медленной базовой
+  линии на MOOD_DROP_DELTA баллов.
+Обработчики спада регистрируются через register_drop_hook и вызываются после
+сохранения записей.
+"""
+
+import os
+import math
+import asyncio
+import logging
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    MOOD_EWMA_ALPHA = settings.MOOD_EWMA_ALPHA
+    MOOD_BASELINE_ALPHA = settings.MOOD_BASELINE_ALPHA
+    MOOD_DROP_Z = settings.MOOD_DROP_Z
+    MOOD_DROP_DELTA = settings.MOOD_DROP_DELTA
+    MOOD_DROP_MIN_SAMPLES = settings.MOOD_DROP_MIN_SAMPLES
+except Exception:
+    MOOD_EWMA_ALPHA = float(os.getenv("MOOD_EWMA_ALPHA", "0.3"))
+    MOOD_BASELINE_ALPHA = float(os.getenv("MOOD_BASELINE_ALPHA", "0.05"))
+    MOOD_DROP_Z = float(os.getenv("MOOD_DROP_Z", "2.0"))
+    MOOD_DROP_DELTA = float(os.getenv("MOOD_DROP_DELTA", "1.5"))
+    MOOD_DROP_MIN_SAMPLES = int(os.getenv("MOOD_DROP_MIN_SAMPLES", "5"))
+
+# Нижняя граница отклонения: при ровной истории оценка 6 после пятерок - еще не спад
+MIN_STD = 1.0
+
+# Изменение среднего, которое считается трендом, а не шумом (баллы)
+TREND_THRESHOLD = 0.5
+
+
+def ewma_update(mean: Optional[float], var: Optional[float], value: float,
+                alpha: float) -> Tuple[float, float]:
+    """Шаг экспоненциально взвешенных среднего и дисперсии (первое значение - начальное)"""
+    if mean is None:
+        return float(value), 0.0
+    diff = value - mean
+    increment = alpha * diff
+    return mean + increment, (1 - alpha) * ((var or 0.0) + diff * increment)
+
+
+def new_trend_state() -> Dict[str, Any]:
+    """Пустое состояние тренда пользователя"""
+    return {
+        'mood_ewma': None, 'mood_ewvar': None, 'mood_baseline': None, 'mood_samples': 0,
+        'stress_ewma': None, 'stress_ewvar': None
+    }
+
+
+def update_trend(state: Dict[str, Any], mood_score: Optional[int] = None,
+                 stress_level: Optional[int] = None) -> Optional[Dict[str, Any]]:
+    """
+    Обновить состояние (словарь с полями new_trend_state) новой записью.
+    Возвращает описание спада настроения или None.
+    """
+    drop = None
+    if mood_score is not None:
+        mean, var = state['mood_ewma'], state['mood_ewvar']
+        baseline = state['mood_baseline']
+        samples = state['mood_samples'] or 0
+
+        if samples >= MOOD_DROP_MIN_SAMPLES:
+            std = max(math.sqrt(var or 0.0), MIN_STD)
+            if mood_score < mean - MOOD_DROP_Z * std:
+                drop = {'kind': 'sudden', 'mood_score': mood_score,
+                        'mood_ewma': round(mean, 2), 'deviation': round((mood_score - mean) / std, 2)}
+
+        new_mean, new_var = ewma_update(mean, var, mood_score, MOOD_EWMA_ALPHA)
+        new_baseline, _ = ewma_update(baseline, 0.0, mood_score, MOOD_BASELINE_ALPHA)
+
+        # Устойчивый спад отмечается один раз - при пересечении порога
+        if drop is None and samples >= MOOD_DROP_MIN_SAMPLES:
+            was_below = mean - baseline <= -MOOD_DROP_DELTA
+            if not was_below and new_mean - new_baseline <= -MOOD_DROP_DELTA:
+                drop = {'kind': 'decline', 'mood_score': mood_score,
+                        'mood_ewma': round(new_mean, 2), 'baseline': round(new_baseline, 2)}
+
+        state['mood_ewma'], state['mood_ewvar'] = new_mean, new_var
+        state['mood_baseline'] = new_baseline
+        state['mood_samples'] = samples + 1
+
+    if stress_level is not None:
+        state['stress_ewma'], state['stress_ewvar'] = ewma_update(
+            state['stress_ewma'], state['stress_ewvar'], stress_level, MOOD_EWMA_ALPHA
+        )
+    return drop
+
+
+def describe_trend(state: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Тренд для статистики: текущее среднее против базовой линии"""
+    if state.get('mood_ewma') is None:
+        return None
+    delta = state['mood_ewma'] - state['mood_baseline']
+    direction = 'up' if delta >= TREND_THRESHOLD else 'down' if delta <= -TREND_THRESHOLD else 'flat'
+    stress = state.get('stress_ewma')
+    return {
+        'mood_ewma': round(state['mood_ewma'], 2),
+        'mood_std': round(math.sqrt(state['mood_ewvar'] or 0.0), 2),
+        'mood_baseline': round(state['mood_baseline'], 2),
+        'mood_delta': round(delta, 2),
+        'direction': direction,
+        'stress_ewma': round(stress, 2) if stress is not None else None,
+        'stress_std': round(math.sqrt(state['stress_ewvar'] or 0.0), 2) if stress is not None else None
+    }
+
+
+# ============ ОБРАБОТЧИКИ СПАДА НАСТРОЕНИЯ ============
+
+_drop_hooks: List[Tuple[Callable[[Dict[str, Any]], Any], Optional[asyncio.AbstractEventLoop]]] = []
+
+
+def register_drop_hook(hook: Callable[[Dict[str, Any]], Any]):
+    """
+    Зарегистрировать обработчик спада настроения.
+    Корутины выполняются в event loop, в котором вызвана регистрация,
+    даже если запись сохранил поток фонового сброса.
+    """
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        loop = None
+    _drop_hooks.append((hook, loop))
+    return hook
+
+
+def clear_drop_hooks():
+    """Удалить все обработчики (при остановке бота)"""
+    _drop_hooks.clear()
+
+
+def emit_drops(events: List[Dict[str, Any]]):
+    """Передать события спада обработчикам (вызывается после фиксации транзакции)"""
+    for event in events:
+        metrics.inc(f"mood_drop.{event['kind']}")
+        logger.info(f"📉 Спад настроения ({event['kind']}): user={event['user_id']}")
+        for hook, loop in _drop_hooks:
+            try:
+                result = hook(event)
+                if asyncio.iscoroutine(result):
+                    _schedule(result, loop)
+            except Exception as e:
+                logger.error(f"❌ Ошибка обработчика спада настроения: {e}")
+
+
+def _schedule(coro, loop: Optional[asyncio.AbstractEventLoop]):
+    """Запустить корутину обработчика в своем event loop"""
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        running = None
+    if running is not None and (loop is None or loop is running):
+        running.create_task(coro)
+    elif loop is not None and not loop.is_closed():
+        asyncio.run_coroutine_threadsafe(coro, loop)
+    else:
+        coro.close()
+        logger.warning("⚠️ Обработчик спада настроения пропущен: нет event loop")
+
+
+__all__ = [
+    'ewma_update', 'new_trend_state', 'update_trend', 'describe_trend',
+    'register_drop_hook', 'clear_drop_hooks', 'emit_drops'
+]
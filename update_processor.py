@@ -0,0 +1,115 @@
+"""
+Параллельная обработка обновлений Telegram
+По умолчанию PTB обрабатывает обновления строго по одному, и медленный
+обработчик задерживает всех пользователей. Здесь обновления разных
+пользователей обрабатываются одновременно (до UPDATE_CONCURRENCY), а
+обновления одного пользователя - по очереди: режимы в context.user_data
+("Чат с ИИ", оценка настроения) рассчитаны на то, что нажатие кнопки и
+следующее сообщение не поменяются местами. Лимит одновременных обновлений
+занимается уже после очереди пользователя, поэтому сообщения, ждущие своей
+очереди, не занимают места других пользователей. Срочные обновления
+(is_urgent, кризисные сообщения) не ждут ни очереди, ни лимита.
+"""
+
+import os
+import time
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram.ext import BaseUpdateProcessor
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+try:
+    from config import settings
+    UPDATE_CONCURRENCY = settings.UPDATE_CONCURRENCY
+except Exception:
+    UPDATE_CONCURRENCY = int(os.getenv("UPDATE_CONCURRENCY", "64"))
+
+# Предел для семафора PTB (фактический лимит - UPDATE_CONCURRENCY)
+UNBOUNDED_UPDATES = 2 ** 20
+
+
+def update_user_id(update) -> Optional[int]:
+    """Пользователь обновления (None - служебное обновление без пользователя)"""
+    user = getattr(update, "effective_user", None)
+    return user.id if user is not None else None
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Одновременная обработка разных пользователей, последовательная - одного"""
+
+    def __init__(self, max_concurrent_updates: int = UPDATE_CONCURRENCY,
+                 is_urgent: Callable[[object], bool] = None):
+        # Семафор PTB захватывается до do_process_update и задержал бы срочные
+        # обновления - его предел не ограничивает, лимит применяется ниже
+        super().__init__(UNBOUNDED_UPDATES)
+        self.limit = max(1, max_concurrent_updates)
+        self.is_urgent = is_urgent
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._locks: Dict[int, asyncio.Lock] = {}
+        # Сколько обновлений пользователя в обработке или ждут: замок удаляется при нуле
+        self._pending: Dict[int, int] = {}
+        # id(update) -> время получения (perf_counter), пока обновление обрабатывается
+        self._received: Dict[int, float] = {}
+        metrics.gauge("updates.users_in_progress", lambda: len(self._pending))
+
+    def received_at(self, update: object) -> Optional[float]:
+        """Когда обновление получено (для времени ответа с учетом ожидания)"""
+        return self._received.get(id(update))
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        self._received[id(update)] = time.perf_counter()
+        if self._slots is None:
+            await self.initialize()
+        try:
+            user_id = update_user_id(update)
+            if self._urgent(update):
+                metrics.inc("updates.urgent")
+                await coroutine
+            elif user_id is None:
+                async with self._slots:
+                    await coroutine
+            else:
+                await self._process_in_order(user_id, coroutine)
+        finally:
+            del self._received[id(update)]
+
+    async def _process_in_order(self, user_id: int, coroutine: Awaitable) -> None:
+        lock = self._locks.get(user_id)
+        if lock is None:
+            lock = self._locks[user_id] = asyncio.Lock()
+        self._pending[user_id] = self._pending.get(user_id, 0) + 1
+        if lock.locked():
+            metrics.inc("updates.queued_behind_user")
+        try:
+            async with lock:
+                async with self._slots:
+                    await coroutine
+        finally:
+            self._pending[user_id] -= 1
+            if not self._pending[user_id]:
+                del self._pending[user_id]
+                del self._locks[user_id]
+
+    def _urgent(self, update) -> bool:
+        if self.is_urgent is None:
+            return False
+        try:
+            return bool(self.is_urgent(update))
+        except Exception as e:
+            logger.error(f"❌ Ошибка проверки срочности обновления: {e}")
+            return False
+
+    async def initialize(self) -> None:
+        """Семафор создается в цикле событий, в котором будет использоваться"""
+        self._slots = asyncio.Semaphore(self.limit)
+
+    async def shutdown(self) -> None:
+        """Ресурсов не требуется"""
+
+
+__all__ = ['PerUserUpdateProcessor', 'UPDATE_CONCURRENCY']
@@ -0,0 +1,108 @@
+"""
+Очередь отложенной записи (write-behind)
+Накапливает строки и отдает их пачкой, когда набран размер пачки
+или истек интервал ожидания. Сам сброс выполняет менеджер БД.
+"""
+
+import logging
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+from metrics import metrics
+
+logger = logging.getLogger(__name__)
+
+
+class WriteBehindQueue:
+    """Буфер строк для пакетной вставки"""
+
+    def __init__(self, name: str, batch_size: int = 100, flush_interval: float = 1.0,
+                 max_size: int = 10000, key_field: str = "user_id"):
+        self.name = name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_size = max_size
+        self.key_field = key_field
+        self._rows: List[Dict[str, Any]] = []
+        self._pending = Counter()
+        self._oldest: Optional[float] = None
+        self._lock = threading.Lock()
+        self.flushed_rows = 0
+        self.flushes = 0
+        self.dropped_rows = 0
+
+        metrics.gauge(f"{name}.queue_depth", lambda: self.depth)
+        metrics.histogram(f"{name}.flush_size", buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+
+    @property
+    def depth(self) -> int:
+        """Количество строк, ожидающих записи"""
+        return len(self._rows)
+
+    def put(self, row: Dict[str, Any]) -> bool:
+        """Добавить строку. Возвращает True, если пора сбрасывать пачку"""
+        with self._lock:
+            if len(self._rows) >= self.max_size:
+                dropped = self._rows.pop(0)
+                self._pending[dropped.get(self.key_field)] -= 1
+                self.dropped_rows += 1
+                logger.error(f"❌ Очередь {self.name} переполнена, старая запись отброшена")
+            self._rows.append(row)
+            self._pending[row.get(self.key_field)] += 1
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+            return len(self._rows) >= self.batch_size
+
+    def is_due(self) -> bool:
+        """Истек ли интервал ожидания для самой старой строки"""
+        oldest = self._oldest
+        return oldest is not None and time.monotonic() - oldest >= self.flush_interval
+
+    def has_pending(self, key: Any) -> bool:
+        """Есть ли незаписанные строки для ключа (например, пользователя)"""
+        return self._pending.get(key, 0) > 0
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Забрать все накопленные строки"""
+        with self._lock:
+            rows, self._rows = self._rows, []
+            self._pending.clear()
+            self._oldest = None
+        return rows
+
+    def requeue(self, rows: List[Dict[str, Any]]):
+        """Вернуть строки в начало очереди после неудачного сброса"""
+        with self._lock:
+            room = max(0, self.max_size - len(self._rows))
+            if len(rows) > room:
+                self.dropped_rows += len(rows) - room
+                logger.error(f"❌ Очередь {self.name}: потеряно {len(rows) - room} строк")
+                rows = rows[len(rows) - room:]
+            self._rows = rows + self._rows
+            for row in rows:
+                self._pending[row.get(self.key_field)] += 1
+            if self._rows and self._oldest is None:
+                self._oldest = time.monotonic()
+
+    def record_flush(self, count: int, seconds: float):
+        """Учесть выполненный сброс в метриках"""
+        self.flushes += 1
+        self.flushed_rows += count
+        metrics.observe(f"{self.name}.flush_latency", seconds)
+        metrics.observe(f"{self.name}.flush_size", count)
+        logger.debug(f"💾 {self.name}: записано {count} строк за {seconds * 1000:.1f} мс")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Состояние очереди"""
+        return {
+            'queue_depth': self.depth,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'dropped_rows': self.dropped_rows,
+            'flush_latency': metrics.histogram(f"{self.name}.flush_latency").snapshot()
+        }
+
+
+__all__ = ['WriteBehindQueue']